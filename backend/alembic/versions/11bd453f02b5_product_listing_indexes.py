@@ -0,0 +1,40 @@
+"""Product listing indexes
+
+Revision ID: 11bd453f02b5
+Revises: da82dbe0e423
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '11bd453f02b5'
+down_revision: Union[str, Sequence[str], None] = 'da82dbe0e423'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_products_price_id', 'products', ['discount_price', 'id'], unique=False)
+    op.create_index('ix_products_rating_id', 'products', ['rating', 'id'], unique=False)
+    op.create_index('ix_products_category_id', 'products', ['category', 'id'], unique=False)
+    op.create_index('ix_products_category_price_id', 'products', ['category', 'discount_price', 'id'], unique=False)
+    op.create_index('ix_products_category_rating_id', 'products', ['category', 'rating', 'id'], unique=False)
+    op.create_index('ix_products_color_price_id', 'products', ['color', 'discount_price', 'id'], unique=False)
+    op.create_index('ix_products_fabric_price_id', 'products', ['fabric', 'discount_price', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_products_fabric_price_id', table_name='products')
+    op.drop_index('ix_products_color_price_id', table_name='products')
+    op.drop_index('ix_products_category_rating_id', table_name='products')
+    op.drop_index('ix_products_category_price_id', table_name='products')
+    op.drop_index('ix_products_category_id', table_name='products')
+    op.drop_index('ix_products_rating_id', table_name='products')
+    op.drop_index('ix_products_price_id', table_name='products')
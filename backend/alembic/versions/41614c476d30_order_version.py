@@ -0,0 +1,29 @@
+"""Order version
+
+Revision ID: 41614c476d30
+Revises: 8e39a1d8e676
+Create Date: 2026-10-18 12:21:07.690314
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '41614c476d30'
+down_revision: Union[str, Sequence[str], None] = '8e39a1d8e676'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('orders', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.drop_column('version')
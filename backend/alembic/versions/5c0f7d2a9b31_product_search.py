@@ -0,0 +1,74 @@
+"""Product search
+
+Revision ID: 5c0f7d2a9b31
+Revises: 41614c476d30
+Create Date: 2026-10-18 13:05:37.418206
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c0f7d2a9b31'
+down_revision: Union[str, Sequence[str], None] = '41614c476d30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FTS_COLUMNS = "name, description, category, tags, color, fabric"
+NEW_VALUES = "new.name, new.description, new.category, new.tags, new.color, new.fabric"
+OLD_VALUES = "old.name, old.description, old.category, old.tags, old.color, old.fabric"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("""
+            ALTER TABLE products ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(category, '') || ' ' || coalesce(tags, '')), 'B') ||
+                setweight(to_tsvector('english', coalesce(color, '') || ' ' || coalesce(fabric, '')), 'C') ||
+                setweight(to_tsvector('english', coalesce(description, '')), 'D')
+            ) STORED
+        """)
+        op.create_index('ix_products_search_vector', 'products', ['search_vector'], unique=False, postgresql_using='gin')
+    elif dialect == 'sqlite':
+        op.execute(f"""
+            CREATE VIRTUAL TABLE products_fts USING fts5(
+                {FTS_COLUMNS},
+                content='products', content_rowid='id', tokenize='porter unicode61', prefix='2 3'
+            )
+        """)
+        op.execute(f"""
+            CREATE TRIGGER products_fts_ai AFTER INSERT ON products BEGIN
+                INSERT INTO products_fts(rowid, {FTS_COLUMNS}) VALUES (new.id, {NEW_VALUES});
+            END
+        """)
+        op.execute(f"""
+            CREATE TRIGGER products_fts_ad AFTER DELETE ON products BEGIN
+                INSERT INTO products_fts(products_fts, rowid, {FTS_COLUMNS}) VALUES ('delete', old.id, {OLD_VALUES});
+            END
+        """)
+        op.execute(f"""
+            CREATE TRIGGER products_fts_au AFTER UPDATE OF {FTS_COLUMNS} ON products BEGIN
+                INSERT INTO products_fts(products_fts, rowid, {FTS_COLUMNS}) VALUES ('delete', old.id, {OLD_VALUES});
+                INSERT INTO products_fts(rowid, {FTS_COLUMNS}) VALUES (new.id, {NEW_VALUES});
+            END
+        """)
+        op.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.drop_index('ix_products_search_vector', table_name='products', postgresql_using='gin')
+        op.drop_column('products', 'search_vector')
+    elif dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS products_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS products_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS products_fts_ai")
+        op.execute("DROP TABLE IF EXISTS products_fts")
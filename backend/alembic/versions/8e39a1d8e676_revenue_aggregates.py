@@ -0,0 +1,62 @@
+"""Revenue aggregates
+
+Revision ID: 8e39a1d8e676
+Revises: e238c67802bc
+Create Date: 2026-10-18 11:40:52.274391
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e39a1d8e676'
+down_revision: Union[str, Sequence[str], None] = 'e238c67802bc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    order_stats = op.create_table('order_stats_daily',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'status')
+    )
+    category_revenue = op.create_table('category_revenue_daily',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('category', sa.String(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'category')
+    )
+
+    # Backfill from existing order history
+    orders = sa.table('orders', sa.column('id'), sa.column('status'), sa.column('total_amount'), sa.column('created_at'))
+    items = sa.table('order_items', sa.column('order_id'), sa.column('product_id'), sa.column('quantity'), sa.column('price'))
+    products = sa.table('products', sa.column('id'), sa.column('category'))
+    day = sa.func.date(orders.c.created_at)
+    category = sa.func.coalesce(products.c.category, '')
+    op.execute(order_stats.insert().from_select(
+        ['day', 'status', 'order_count', 'revenue'],
+        sa.select(day, orders.c.status, sa.func.count(orders.c.id), sa.func.coalesce(sa.func.sum(orders.c.total_amount), 0.0))
+        .where(orders.c.created_at.isnot(None), orders.c.status.isnot(None))
+        .group_by(day, orders.c.status),
+    ))
+    op.execute(category_revenue.insert().from_select(
+        ['day', 'category', 'units', 'revenue'],
+        sa.select(day, category, sa.func.coalesce(sa.func.sum(items.c.quantity), 0), sa.func.coalesce(sa.func.sum(items.c.price * items.c.quantity), 0.0))
+        .select_from(items.join(orders, items.c.order_id == orders.c.id).join(products, items.c.product_id == products.c.id))
+        .where(orders.c.created_at.isnot(None))
+        .group_by(day, category),
+    ))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('category_revenue_daily')
+    op.drop_table('order_stats_daily')
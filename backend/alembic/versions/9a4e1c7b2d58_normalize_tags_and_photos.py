@@ -0,0 +1,135 @@
+"""Normalize tags and photos
+
+Revision ID: 9a4e1c7b2d58
+Revises: 5c0f7d2a9b31
+Create Date: 2026-10-18 14:22:09.731554
+
+"""
+from typing import Sequence, Union
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4e1c7b2d58'
+down_revision: Union[str, Sequence[str], None] = '5c0f7d2a9b31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+THUMBNAIL_WIDTH = 400
+MEDIUM_WIDTH = 800
+
+
+def _resized(url, width):
+    # Frozen copy of models._resized
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if not any(key == 'w' and value.isdigit() and int(value) > width for key, value in query):
+        return url
+    query = [(key, str(width) if key == 'w' else value) for key, value in query]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    tags = op.create_table('tags',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('slug', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_tags_id'), 'tags', ['id'], unique=False)
+    op.create_index(op.f('ix_tags_slug'), 'tags', ['slug'], unique=True)
+    product_tags = op.create_table('product_tags',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('tag_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['tag_id'], ['tags.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('product_id', 'tag_id')
+    )
+    op.create_index('ix_product_tags_tag_id_product_id', 'product_tags', ['tag_id', 'product_id'], unique=False)
+    product_photos = op.create_table('product_photos',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('url', sa.String(), nullable=False),
+    sa.Column('medium_url', sa.String(), nullable=False),
+    sa.Column('thumbnail_url', sa.String(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_product_photos_id'), 'product_photos', ['id'], unique=False)
+    op.create_index('ix_product_photos_product_id_position', 'product_photos', ['product_id', 'position'], unique=False)
+
+    # Move the comma-joined tags and the JSON photo arrays into the new tables
+    conn = op.get_bind()
+    products = sa.table('products', sa.column('id'), sa.column('tags'), sa.column('photos', sa.JSON()))
+    tag_ids = {}
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(products.c.id, products.c.tags, products.c.photos)
+            .where(products.c.id > last_id).order_by(products.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        links, photos = [], []
+        for product_id, tag_string, urls in rows:
+            slugs = set()
+            for name in (tag_string or '').split(','):
+                name = name.strip()
+                slug = name.lower()
+                if not name or slug in slugs:
+                    continue
+                slugs.add(slug)
+                if slug not in tag_ids:
+                    tag_ids[slug] = conn.execute(tags.insert().values(name=name, slug=slug)).inserted_primary_key[0]
+                links.append({'product_id': product_id, 'tag_id': tag_ids[slug]})
+            for position, url in enumerate(url for url in (urls or []) if url):
+                photos.append({
+                    'product_id': product_id,
+                    'position': position,
+                    'url': url,
+                    'medium_url': _resized(url, MEDIUM_WIDTH),
+                    'thumbnail_url': _resized(url, THUMBNAIL_WIDTH),
+                })
+        if links:
+            conn.execute(product_tags.insert(), links)
+        if photos:
+            conn.execute(product_photos.insert(), photos)
+        last_id = rows[-1][0]
+
+    # A LIKE '%tag%' filter could never use this index; product_tags serves tag filters now
+    op.drop_index(op.f('ix_products_tags'), table_name='products')
+    # Native DROP COLUMN (SQLite 3.35+) rather than a batch copy, which would drop the search triggers
+    op.drop_column('products', 'photos')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('products', sa.Column('photos', sa.JSON(), nullable=True))
+    op.create_index(op.f('ix_products_tags'), 'products', ['tags'], unique=False)
+
+    conn = op.get_bind()
+    products = sa.table('products', sa.column('id'), sa.column('photos', sa.JSON()))
+    product_photos = sa.table('product_photos', sa.column('product_id'), sa.column('position'), sa.column('url'))
+    photos = {}
+    for product_id, url in conn.execute(
+        sa.select(product_photos.c.product_id, product_photos.c.url)
+        .order_by(product_photos.c.product_id, product_photos.c.position)
+    ):
+        photos.setdefault(product_id, []).append(url)
+    for product_id, urls in photos.items():
+        conn.execute(products.update().where(products.c.id == product_id).values(photos=urls))
+
+    op.drop_index('ix_product_photos_product_id_position', table_name='product_photos')
+    op.drop_index(op.f('ix_product_photos_id'), table_name='product_photos')
+    op.drop_table('product_photos')
+    op.drop_index('ix_product_tags_tag_id_product_id', table_name='product_tags')
+    op.drop_table('product_tags')
+    op.drop_index(op.f('ix_tags_slug'), table_name='tags')
+    op.drop_index(op.f('ix_tags_id'), table_name='tags')
+    op.drop_table('tags')
@@ -0,0 +1,35 @@
+"""Order stats_recorded marker
+
+Revision ID: a3c6e08b5d19
+Revises: f7a2d91c4e65
+Create Date: 2026-10-19 17:21:03.508916
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c6e08b5d19'
+down_revision: Union[str, Sequence[str], None] = 'f7a2d91c4e65'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('orders', sa.Column('stats_recorded', sa.Boolean(), server_default=sa.true(), nullable=False))
+    # Orders whose order.placed job has not run yet are not in the aggregates
+    op.execute(
+        "UPDATE orders SET stats_recorded = false WHERE EXISTS ("
+        "SELECT 1 FROM jobs WHERE jobs.idempotency_key = 'order-placed:' || orders.id "
+        "AND jobs.status IN ('queued', 'running'))"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.drop_column('stats_recorded')
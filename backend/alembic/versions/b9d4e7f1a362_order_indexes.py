@@ -0,0 +1,37 @@
+"""Order indexes
+
+Revision ID: b9d4e7f1a362
+Revises: a7e5c2d94b18
+Create Date: 2026-10-18 19:41:05.873214
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9d4e7f1a362'
+down_revision: Union[str, Sequence[str], None] = 'a7e5c2d94b18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ('ix_orders_user_id_id', 'orders', ['user_id', 'id']),
+    ('ix_orders_created_at', 'orders', ['created_at']),
+    ('ix_order_items_order_id', 'order_items', ['order_id']),
+    ('ix_order_items_product_id', 'order_items', ['product_id']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
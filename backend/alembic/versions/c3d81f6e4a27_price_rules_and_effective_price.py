@@ -0,0 +1,63 @@
+"""Price rules and effective price
+
+Revision ID: c3d81f6e4a27
+Revises: 9a4e1c7b2d58
+Create Date: 2026-10-18 15:47:52.108334
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d81f6e4a27'
+down_revision: Union[str, Sequence[str], None] = '9a4e1c7b2d58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (old name, new name, leading columns); both end in the price and id
+PRICE_INDEXES = [
+    ('ix_products_price_id', 'ix_products_effective_price_id', []),
+    ('ix_products_category_price_id', 'ix_products_category_effective_price_id', ['category']),
+    ('ix_products_color_price_id', 'ix_products_color_effective_price_id', ['color']),
+    ('ix_products_fabric_price_id', 'ix_products_fabric_effective_price_id', ['fabric']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('price_rules',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('discount_percentage', sa.Float(), nullable=False),
+    sa.Column('category', sa.String(), nullable=True),
+    sa.Column('tag_id', sa.Integer(), nullable=True),
+    sa.Column('min_mrp', sa.Float(), nullable=True),
+    sa.Column('max_mrp', sa.Float(), nullable=True),
+    sa.Column('starts_at', sa.DateTime(), nullable=False),
+    sa.Column('ends_at', sa.DateTime(), nullable=True),
+    sa.Column('priority', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['tag_id'], ['tags.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_price_rules_id'), 'price_rules', ['id'], unique=False)
+
+    op.add_column('products', sa.Column('effective_price', sa.Float(), nullable=True))
+    # No rules exist yet, so every product sells at its discount price
+    op.execute('UPDATE products SET effective_price = discount_price')
+    for old, new, columns in PRICE_INDEXES:
+        op.drop_index(old, table_name='products')
+        op.create_index(new, 'products', columns + ['effective_price', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for old, new, columns in PRICE_INDEXES:
+        op.drop_index(new, table_name='products')
+        op.create_index(old, 'products', columns + ['discount_price', 'id'], unique=False)
+    op.drop_column('products', 'effective_price')
+    op.drop_index(op.f('ix_price_rules_id'), table_name='price_rules')
+    op.drop_table('price_rules')
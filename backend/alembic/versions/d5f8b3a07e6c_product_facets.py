@@ -0,0 +1,81 @@
+"""Product facets
+
+Revision ID: d5f8b3a07e6c
+Revises: b9d4e7f1a362
+Create Date: 2026-10-18 20:16:48.302957
+
+"""
+from bisect import bisect_right
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5f8b3a07e6c'
+down_revision: Union[str, Sequence[str], None] = 'b9d4e7f1a362'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+# Frozen copies of facets.PRICE_BUCKETS and facets.SEPARATOR
+PRICE_BUCKETS = (0, 500, 1000, 2000, 5000)
+SEPARATOR = '\x1f'
+
+
+def _bucket(price):
+    if price is None or price < PRICE_BUCKETS[0]:
+        return -1
+    return bisect_right(PRICE_BUCKETS, price) - 1
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    facets = op.create_table('product_facets',
+    sa.Column('category', sa.String(), nullable=False),
+    sa.Column('color', sa.String(), nullable=False),
+    sa.Column('fabric', sa.String(), nullable=False),
+    sa.Column('price_bucket', sa.Integer(), nullable=False),
+    sa.Column('tags', sa.String(), nullable=False),
+    sa.Column('product_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('category', 'color', 'fabric', 'price_bucket', 'tags')
+    )
+    op.add_column('products', sa.Column('facet_key', sa.String(), nullable=True))
+
+    products = sa.table('products',
+        sa.column('id', sa.Integer), sa.column('category', sa.String), sa.column('color', sa.String),
+        sa.column('fabric', sa.String), sa.column('effective_price', sa.Float), sa.column('tags', sa.String),
+        sa.column('facet_key', sa.String),
+    )
+    conn = op.get_bind()
+    counts = {}
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(products.c.id, products.c.category, products.c.color, products.c.fabric, products.c.effective_price, products.c.tags)
+            .where(products.c.id > last_id).order_by(products.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        keys = []
+        for product_id, category, color, fabric, price, tags in rows:
+            values = (category or '', color or '', fabric or '', _bucket(price), tags or '')
+            counts[values] = counts.get(values, 0) + 1
+            keys.append({'b_id': product_id, 'b_key': SEPARATOR.join(str(v) for v in values)})
+        conn.execute(
+            products.update().where(products.c.id == sa.bindparam('b_id')).values(facet_key=sa.bindparam('b_key')),
+            keys,
+        )
+        last_id = rows[-1][0]
+    if counts:
+        conn.execute(facets.insert(), [
+            {'category': c, 'color': co, 'fabric': f, 'price_bucket': b, 'tags': t, 'product_count': n}
+            for (c, co, f, b, t), n in counts.items()
+        ])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('products', 'facet_key')
+    op.drop_table('product_facets')
@@ -0,0 +1,28 @@
+"""Order status index
+
+Revision ID: e1c7a4f8b203
+Revises: d5f8b3a07e6c
+Create Date: 2026-10-19 10:12:44.318502
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1c7a4f8b203'
+down_revision: Union[str, Sequence[str], None] = 'd5f8b3a07e6c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_orders_status_created_at', 'orders', ['status', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_orders_status_created_at', table_name='orders')
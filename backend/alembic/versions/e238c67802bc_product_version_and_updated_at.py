@@ -0,0 +1,31 @@
+"""Product version and updated_at
+
+Revision ID: e238c67802bc
+Revises: 11bd453f02b5
+Create Date: 2026-10-18 10:02:11.583920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e238c67802bc'
+down_revision: Union[str, Sequence[str], None] = '11bd453f02b5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('products', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('products', sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('version')
@@ -0,0 +1,43 @@
+"""Null-safe listing sort indexes
+
+Revision ID: f7a2d91c4e65
+Revises: e1c7a4f8b203
+Create Date: 2026-10-19 16:05:27.640118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7a2d91c4e65'
+down_revision: Union[str, Sequence[str], None] = 'e1c7a4f8b203'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (name, leading columns, sort column); each ends in the sort column and id
+SORT_INDEXES = [
+    ('ix_products_effective_price_id', [], 'effective_price'),
+    ('ix_products_rating_id', [], 'rating'),
+    ('ix_products_category_effective_price_id', ['category'], 'effective_price'),
+    ('ix_products_category_rating_id', ['category'], 'rating'),
+    ('ix_products_color_effective_price_id', ['color'], 'effective_price'),
+    ('ix_products_fabric_effective_price_id', ['fabric'], 'effective_price'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The listing sorts on coalesce(column, 0) so that NULLs take part in the keyset
+    for name, columns, column in SORT_INDEXES:
+        op.drop_index(name, table_name='products')
+        op.create_index(name, 'products', columns + [sa.text(f'coalesce({column}, 0)'), 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, columns, column in SORT_INDEXES:
+        op.drop_index(name, table_name='products')
+        op.create_index(name, 'products', columns + [column, 'id'], unique=False)
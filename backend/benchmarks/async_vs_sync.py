@@ -0,0 +1,69 @@
+"""Compare sync and async (ASYNC_DB=true) serving of the catalog read paths.
+
+Seeds a throwaway SQLite file (or uses DATABASE_URL as-is), starts uvicorn once
+per mode with the product cache disabled so every request reaches the
+database, and reports requests/sec and p50/p99 latency at rising concurrency.
+From backend/:
+
+    python benchmarks/async_vs_sync.py --products 2000 --concurrency 1 8 32 64 --seconds 5
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from common import database_url_from_env, seed_catalog, start_server, stop_server, summarize
+
+
+async def drive(base_url: str, ids: list, concurrency: int, seconds: float) -> dict:
+    import httpx
+
+    latencies = []
+    errors = 0
+    stop_at = time.perf_counter() + seconds
+
+    async def worker(client):
+        nonlocal errors
+        while time.perf_counter() < stop_at:
+            if random.random() < 0.5:
+                url = f"/products/page?limit=24&sort=-rating&category={random.choice(['Men', 'Women', 'Kids'])}"
+            else:
+                url = f"/products/{random.choice(ids)}"
+            started = time.perf_counter()
+            response = await client.get(url)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {"concurrency": concurrency, **summarize(latencies, elapsed, errors)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--seconds", type=float, default=5.0, help="duration of each concurrency step")
+    args = parser.parse_args()
+
+    database_url = database_url_from_env()
+    ids = seed_catalog(database_url, args.products)
+
+    results = {}
+    for mode, async_db in (("sync", False), ("async", True)):
+        proc, base_url = start_server(database_url, async_db=str(async_db).lower(), product_cache_size=0)
+        try:
+            results[mode] = [asyncio.run(drive(base_url, ids, c, args.seconds)) for c in args.concurrency]
+        finally:
+            stop_server(proc)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Fire parallel checkouts at a single product and verify stock never goes negative.
+
+Runs against a throwaway SQLite file unless DATABASE_URL points elsewhere
+(e.g. a disposable local Postgres). From backend/:
+
+    python benchmarks/checkout_concurrency.py --stock 50 --buyers 200 --workers 32
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stock", type=int, default=50, help="initial stock of the contested product")
+    parser.add_argument("--buyers", type=int, default=200, help="number of checkout requests to fire")
+    parser.add_argument("--quantity", type=int, default=1, help="units per checkout")
+    parser.add_argument("--workers", type=int, default=32, help="concurrent client threads")
+    args = parser.parse_args()
+
+    if "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/checkout_concurrency.db"
+    sys.path.insert(0, BACKEND_DIR)
+
+    from fastapi.testclient import TestClient
+    import main as app_module
+    import models
+    from database import SessionLocal
+
+    client = TestClient(app_module.app)
+    email = f"buyer-{int(time.time() * 1000)}@qmexai-bench.com"
+    client.post("/auth/register", json={"email": email, "password": "bench-password"})
+    token = client.post("/auth/login", data={"username": email, "password": "bench-password"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    db = SessionLocal()
+    product = models.Product(
+        name=f"Contested item {email}", description="checkout concurrency check", category="Bench",
+        mrp=100.0, discount_price=100.0, stock=args.stock,
+    )
+    db.add(product)
+    db.commit()
+    product_id = product.id
+    db.close()
+
+    body = {"items": [{"product_id": product_id, "quantity": args.quantity}], "shipping_address": "Bench street"}
+
+    def attempt(_):
+        return client.post("/orders/checkout", json=body, headers=headers).status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        codes = list(pool.map(attempt, range(args.buyers)))
+    elapsed = time.perf_counter() - started
+
+    db = SessionLocal()
+    final_stock = db.query(models.Product.stock).filter(models.Product.id == product_id).scalar()
+    orders = db.query(models.OrderItem).filter(models.OrderItem.product_id == product_id).count()
+    db.close()
+
+    succeeded = codes.count(200)
+    result = {
+        "buyers": args.buyers,
+        "workers": args.workers,
+        "initial_stock": args.stock,
+        "final_stock": final_stock,
+        "succeeded": succeeded,
+        "rejected": {str(code): codes.count(code) for code in sorted(set(codes)) if code != 200},
+        "order_lines": orders,
+        "seconds": round(elapsed, 3),
+    }
+    print(json.dumps(result, indent=2))
+
+    problems = []
+    if final_stock < 0:
+        problems.append(f"stock went negative ({final_stock})")
+    if succeeded * args.quantity != args.stock - final_stock:
+        problems.append("units sold do not match the stock decrement")
+    if orders != succeeded:
+        problems.append("order lines do not match successful checkouts")
+    if succeeded > args.stock // args.quantity:
+        problems.append("more checkouts succeeded than stock allows")
+    if problems:
+        print("FAILED: " + "; ".join(problems), file=sys.stderr)
+        sys.exit(1)
+    print("OK: no overselling")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""Shared helpers for the benchmark scripts: seeding, starting uvicorn, summarising latencies."""
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_PASSWORD = "bench-password"
+
+# Vocabulary for synthetic product names and descriptions, so text search has something to rank
+ADJECTIVES = ["Midnight", "Classic", "Urban", "Vintage", "Slim", "Relaxed", "Premium", "Everyday", "Cropped", "Oversized"]
+GARMENTS = ["Bomber Jacket", "Wrap Dress", "Runner Sneakers", "Oxford Shirt", "Chino Trousers", "Hoodie", "Denim Jeans", "Knit Sweater", "Polo Tee", "Trench Coat"]
+DETAILS = ["tailored for comfort", "built to last", "with a brushed finish", "for cooler evenings", "with contrast stitching", "cut for layering"]
+
+
+def database_url_from_env(name: str = "bench.db") -> str:
+    """DATABASE_URL if set (e.g. a throwaway Postgres), otherwise a fresh SQLite file."""
+    return os.environ.get("DATABASE_URL") or f"sqlite:///{tempfile.mkdtemp()}/{name}"
+
+
+def use_database(database_url: str):
+    """Point the app modules at `database_url`; must run before `database` is imported."""
+    os.environ["DATABASE_URL"] = database_url
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+
+
+def synthetic_product(i: int) -> dict:
+    garment, fabric = random.choice(GARMENTS), random.choice(["Cotton", "Silk", "Leather"])
+    return {
+        "name": f"{random.choice(ADJECTIVES)} {garment} {i}",
+        "description": f"{fabric} {garment.lower()} {random.choice(DETAILS)}.",
+        "category": random.choice(["Men", "Women", "Kids"]),
+        "tags": random.choice(["New Arrival", "Trending", "New Arrival, Trending"]),
+        "color": random.choice(["Black", "White", "Navy", "Crimson"]),
+        "fabric": fabric,
+        "rating": round(random.uniform(1, 5), 1),
+        "mrp": 1000.0,
+        "discount_percentage": 10.0,
+        "discount_price": round(random.uniform(200, 900), 2),
+        "photos": [f"https://example.com/{i}/{n}.jpg?w=1200" for n in range(4)],
+        "stock": 100,
+    }
+
+
+def _photo_row(photo, product_id: int) -> dict:
+    columns = ("position", "url", "medium_url", "thumbnail_url")
+    return {"product_id": product_id, **{c: getattr(photo, c) for c in columns}}
+
+
+def seed_catalog(database_url: str, products: int) -> list:
+    """Top the catalog up to `products` synthetic rows and return every product id."""
+    use_database(database_url)
+    from sqlalchemy import insert
+    import facets, models
+    from database import Base, SessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    existing = db.query(models.Product).count()
+    if existing < products:
+        tag_ids = {}
+        for name in ("New Arrival", "Trending"):
+            tag = db.query(models.Tag).filter(models.Tag.slug == name.lower()).first()
+            if tag is None:
+                tag = models.Tag(name=name, slug=name.lower())
+                db.add(tag)
+                db.flush()
+            tag_ids[name] = tag.id
+
+        rows = [synthetic_product(i) for i in range(existing, products)]
+        photos = [row.pop("photos") for row in rows]
+        for row in rows:
+            # No price rules here, so the effective price is the discount price
+            row["effective_price"] = row["discount_price"]
+        new_ids = db.scalars(insert(models.Product).returning(models.Product.id, sort_by_parameter_order=True), rows).all()
+        db.execute(insert(models.ProductPhoto), [
+            _photo_row(models.ProductPhoto.from_url(url, position), product_id)
+            for product_id, urls in zip(new_ids, photos)
+            for position, url in enumerate(urls)
+        ])
+        db.execute(insert(models.product_tags), [
+            {"product_id": product_id, "tag_id": tag_ids[name.strip()]}
+            for product_id, row in zip(new_ids, rows)
+            for name in row["tags"].split(",")
+        ])
+        facets.sync(db, models.Product.id.in_(new_ids))
+        db.commit()
+    ids = [row[0] for row in db.query(models.Product.id).all()]
+    db.close()
+    return ids
+
+
+def seed_users(database_url: str, users: int) -> list:
+    """Ensure `users` bench accounts exist (password BENCH_PASSWORD) and return their emails."""
+    use_database(database_url)
+    from sqlalchemy import insert
+    import models
+    from database import Base, SessionLocal, engine
+    from routers.auth import pwd_context
+
+    Base.metadata.create_all(bind=engine)
+    emails = [f"bench-user-{i}@qmexai-bench.com" for i in range(users)]
+    db = SessionLocal()
+    existing = {row[0] for row in db.query(models.User.email).filter(models.User.email.in_(emails)).all()}
+    missing = [e for e in emails if e not in existing]
+    if missing:
+        # One hash shared by every bench account keeps seeding fast
+        hashed = pwd_context.hash(BENCH_PASSWORD)
+        db.execute(insert(models.User), [{"email": e, "name": "Bench", "hashed_password": hashed, "is_admin": False} for e in missing])
+        db.commit()
+    db.close()
+    return emails
+
+
+def seed_admin(database_url: str) -> str:
+    """Ensure an admin bench account exists and return its email."""
+    use_database(database_url)
+    import models
+    from database import SessionLocal
+    from routers.auth import pwd_context
+
+    email = "bench-admin@qmexai-bench.com"
+    db = SessionLocal()
+    if not db.query(models.User).filter(models.User.email == email).first():
+        db.add(models.User(email=email, name="Bench Admin", hashed_password=pwd_context.hash(BENCH_PASSWORD), is_admin=True))
+        db.commit()
+    db.close()
+    return email
+
+
+def seed_orders(database_url: str, product_ids: list, emails: list, orders: int, days: int = 90) -> list:
+    """Top the bench users up to `orders` orders in total, spread over the last `days` days; returns their ids.
+
+    The revenue aggregates are rebuilt afterwards so the admin dashboard sees them.
+    """
+    use_database(database_url)
+    from datetime import datetime, timedelta
+    from sqlalchemy import func, insert, select
+    import models, stats
+    from database import SessionLocal
+
+    db = SessionLocal()
+    user_ids = db.scalars(select(models.User.id).where(models.User.email.in_(emails))).all()
+    existing = db.scalar(select(func.count()).select_from(models.Order).where(models.Order.user_id.in_(user_ids)))
+    if existing < orders:
+        prices = dict(db.execute(select(models.Product.id, models.Product.discount_price).where(models.Product.id.in_(product_ids))).all())
+        now = datetime.utcnow()
+        for n in range(existing, orders):
+            lines = [(pid, random.randint(1, 3)) for pid in random.sample(product_ids, min(len(product_ids), random.randint(1, 4)))]
+            order = models.Order(
+                user_id=user_ids[n % len(user_ids)],
+                total_amount=round(sum(prices[pid] * quantity for pid, quantity in lines), 2),
+                status=random.choice(["Pending", "Processing", "Shipped", "Delivered"]),
+                shipping_address=f"{n} Bench Street",
+                created_at=now - timedelta(days=random.uniform(0, days)),
+            )
+            db.add(order)
+            db.flush()
+            db.execute(insert(models.OrderItem), [
+                {"order_id": order.id, "product_id": pid, "quantity": quantity, "price": prices[pid]}
+                for pid, quantity in lines
+            ])
+        stats.rebuild(db)
+        db.commit()
+    ids = db.scalars(select(models.Order.id).where(models.Order.user_id.in_(user_ids)).order_by(models.Order.id)).all()
+    db.close()
+    return ids
+
+
+def bench_token(email: str, is_admin: bool = False) -> str:
+    """A bearer token for a bench account, minted directly instead of paying for a bcrypt login.
+
+    The server under test must share SECRET_KEY with this process (true for start_server).
+    """
+    from datetime import timedelta
+    from routers.auth import create_access_token
+
+    return create_access_token({"sub": email, "is_admin": is_admin}, expires_delta=timedelta(hours=6))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(database_url: str, **env_overrides):
+    """Start `uvicorn main:app` on a free port; returns (process, base_url) once it answers."""
+    import httpx
+
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=database_url, **{k.upper(): str(v) for k, v in env_overrides.items()})
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(base_url + "/").status_code == 200:
+                return proc, base_url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("uvicorn did not start")
+
+
+def stop_server(proc):
+    proc.terminate()
+    proc.wait()
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: list, elapsed: float, errors: int = 0) -> dict:
+    """Throughput and p50/p95/p99 (milliseconds) for a list of per-request latencies in seconds."""
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "rps": round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+    }
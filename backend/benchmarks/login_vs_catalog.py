@@ -0,0 +1,88 @@
+"""Measure how a burst of logins affects catalog latency.
+
+Runs the catalog workload alone, then again alongside login workers, and
+reports catalog p50/p99 for both phases plus login throughput and how many
+logins were shed with 429 by the bcrypt pool. From backend/:
+
+    python benchmarks/login_vs_catalog.py --catalog-workers 16 --login-workers 32 --seconds 10
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from common import BENCH_PASSWORD, database_url_from_env, seed_catalog, seed_users, start_server, stop_server, summarize
+
+
+async def run_phase(base_url: str, ids: list, emails: list, catalog_workers: int, login_workers: int, seconds: float) -> dict:
+    import httpx
+
+    catalog, logins = [], []
+    catalog_errors = 0
+    login_codes = {}
+    stop_at = time.perf_counter() + seconds
+
+    async def browse(client):
+        nonlocal catalog_errors
+        while time.perf_counter() < stop_at:
+            url = random.choice([f"/products/{random.choice(ids)}", "/products/page?limit=24&sort=price"])
+            started = time.perf_counter()
+            response = await client.get(url)
+            catalog.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                catalog_errors += 1
+
+    async def login(client):
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            response = await client.post("/auth/login", data={"username": random.choice(emails), "password": BENCH_PASSWORD})
+            logins.append(time.perf_counter() - started)
+            login_codes[response.status_code] = login_codes.get(response.status_code, 0) + 1
+            if response.status_code == 429:
+                await asyncio.sleep(float(response.headers.get("retry-after", "1")) / 10)
+
+    workers = catalog_workers + login_workers
+    limits = httpx.Limits(max_connections=workers, max_keepalive_connections=workers)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(browse(client) for _ in range(catalog_workers)),
+            *(login(client) for _ in range(login_workers)),
+        )
+        elapsed = time.perf_counter() - started
+
+    result = {"catalog": summarize(catalog, elapsed, catalog_errors)}
+    if login_workers:
+        result["login"] = {**summarize(logins, elapsed), "status_codes": {str(k): v for k, v in sorted(login_codes.items())}}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--catalog-workers", type=int, default=16)
+    parser.add_argument("--login-workers", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--async-db", action="store_true", help="serve with ASYNC_DB=true")
+    args = parser.parse_args()
+
+    database_url = database_url_from_env()
+    ids = seed_catalog(database_url, args.products)
+    emails = seed_users(database_url, args.users)
+
+    # Keep the product cache off so catalog requests reach the database as they would on a cold page
+    proc, base_url = start_server(database_url, async_db=str(args.async_db).lower(), product_cache_size=0)
+    try:
+        results = {
+            "catalog_only": asyncio.run(run_phase(base_url, ids, emails, args.catalog_workers, 0, args.seconds)),
+            "catalog_with_logins": asyncio.run(run_phase(base_url, ids, emails, args.catalog_workers, args.login_workers, args.seconds)),
+        }
+    finally:
+        stop_server(proc)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
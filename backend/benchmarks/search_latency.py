@@ -0,0 +1,91 @@
+"""Latency of GET /products/search on a large synthetic catalog.
+
+Seeds a throwaway SQLite file (or uses DATABASE_URL as-is, e.g. a Postgres
+with the migrations applied), starts uvicorn with the product cache disabled,
+and reports p50/p95/p99 per query shape: a common word, a rare prefix, several
+terms, filters, and facets off. For reference it also times the substring scan
+the search index replaces. From backend/:
+
+    python benchmarks/search_latency.py --products 100000 --requests 200
+"""
+import argparse
+import json
+import time
+
+from common import database_url_from_env, seed_catalog, start_server, stop_server, summarize
+
+QUERIES = {
+    "common_word": "q=jacket",
+    "prefix": "q=trenc",
+    "multi_term": "q=vintage+silk+dress",
+    "filtered": "q=sneakers&category=Women&color=Navy&max_price=500",
+    "no_facets": "q=jacket&facets=false",
+    "deep_page": "q=cotton&offset=480&facets=false",
+}
+
+
+def time_requests(base_url: str, query: str, requests: int) -> dict:
+    import httpx
+
+    latencies = []
+    errors = 0
+    with httpx.Client(base_url=base_url, timeout=60) as client:
+        client.get(f"/products/search?{query}")
+        started = time.perf_counter()
+        for _ in range(requests):
+            t = time.perf_counter()
+            response = client.get(f"/products/search?{query}")
+            latencies.append(time.perf_counter() - t)
+            if response.status_code != 200:
+                errors += 1
+        elapsed = time.perf_counter() - started
+        total = response.json().get("total")
+    return {"total_matches": total, **summarize(latencies, elapsed, errors)}
+
+
+def time_substring_scan(requests: int) -> dict:
+    """The multi-term lookup as LIKE '%term%' over the text columns: one page plus the match count, no ranking."""
+    from sqlalchemy import func, or_, select
+    import models
+    from database import SessionLocal
+
+    columns = [models.Product.name, models.Product.description, models.Product.category, models.Product.tags]
+    statement = select(models.Product)
+    for term in ("vintage", "silk", "dress"):
+        statement = statement.where(or_(*(c.ilike(f"%{term}%") for c in columns)))
+
+    latencies = []
+    db = SessionLocal()
+    started = time.perf_counter()
+    for _ in range(requests):
+        t = time.perf_counter()
+        db.scalars(statement.limit(24)).all()
+        db.scalar(statement.with_only_columns(func.count()))
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - started
+    db.close()
+    return summarize(latencies, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=200, help="requests per query shape")
+    args = parser.parse_args()
+
+    database_url = database_url_from_env()
+    started = time.perf_counter()
+    seed_catalog(database_url, args.products)
+    results = {"products": args.products, "seed_seconds": round(time.perf_counter() - started, 1)}
+
+    proc, base_url = start_server(database_url, product_cache_size=0)
+    try:
+        results["search"] = {name: time_requests(base_url, query, args.requests) for name, query in QUERIES.items()}
+    finally:
+        stop_server(proc)
+    results["substring_scan_without_index"] = time_substring_scan(min(args.requests, 50))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
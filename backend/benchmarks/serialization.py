@@ -0,0 +1,133 @@
+"""Per-page serialization cost of the catalog and order listings, ORM path vs column rows.
+
+The ORM path is what the listings did before: load entities with selectinload,
+validate them into the response models and dump to JSON. The column path is
+what they do now: select only the response columns, build dicts and encode
+with serialization.dumps (orjson when installed). Both paths are checked to
+produce the same JSON. Also reports the gzip/brotli size and cost of a page.
+Runs in-process against a throwaway SQLite file (or DATABASE_URL). From backend/:
+
+    python benchmarks/serialization.py --products 5000 --orders 300 --repeat 50
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+from common import database_url_from_env, seed_catalog, seed_orders, seed_users, summarize
+
+
+def time_calls(fn, repeat: int) -> dict:
+    """Run the coroutine factory `fn` `repeat` times after one warm-up; returns latency stats and the last body."""
+    async def run():
+        body = await fn()
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(repeat):
+            t = time.perf_counter()
+            body = await fn()
+            latencies.append(time.perf_counter() - t)
+        return body, summarize(latencies, time.perf_counter() - started)
+
+    body, stats = asyncio.run(run())
+    stats.pop("errors")
+    stats["bytes"] = len(body)
+    return body, stats
+
+
+def compare(name: str, before, after, repeat: int) -> dict:
+    old_body, old_stats = time_calls(before, repeat)
+    new_body, new_stats = time_calls(after, repeat)
+    if json.loads(old_body) != json.loads(new_body):
+        raise SystemExit(f"{name}: the column path produced different JSON than the ORM path")
+    return {
+        "orm_validate": old_stats,
+        "column_rows": new_stats,
+        "speedup_p50": round(old_stats["p50_ms"] / new_stats["p50_ms"], 2) if new_stats["p50_ms"] else None,
+    }
+
+
+def compression(body: bytes, repeat: int) -> dict:
+    import serialization
+
+    results = {"identity_bytes": len(body)}
+    encodings = ["gzip"] + (["br"] if serialization.brotli is not None else [])
+    for encoding in encodings:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            encoded = serialization.compress(body, encoding)
+        results[encoding] = {
+            "bytes": len(encoded),
+            "ms": round((time.perf_counter() - started) / repeat * 1000, 3),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--orders", type=int, default=300)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=50, help="timed runs per path")
+    args = parser.parse_args()
+
+    database_url = database_url_from_env()
+    ids = seed_catalog(database_url, args.products)
+    emails = seed_users(database_url, 1)
+    seed_orders(database_url, ids, emails, args.orders)
+
+    from pydantic import TypeAdapter
+    from sqlalchemy import select
+    from sqlalchemy.orm import selectinload
+    import models, schemas, serialization
+    from database import SessionLocal, fetch_rows, fetch_scalars
+    from routers.orders import fetch_order_page
+    from routers.products import PRIMARY_PHOTO, product_rows, serialize_product_rows
+
+    db = SessionLocal()
+    user_id = db.scalar(select(models.User.id).where(models.User.email == emails[0]))
+    limit = args.page_size
+    order_page = TypeAdapter(List[schemas.OrderResponse])
+
+    def products_orm(full_photos: bool):
+        async def run():
+            loader = selectinload(models.Product.images if full_photos else PRIMARY_PHOTO)
+            products = await fetch_scalars(db, select(models.Product).options(loader).order_by(models.Product.id).limit(limit))
+            payload = [schemas.ProductResponse.model_validate(p, from_attributes=True).model_dump(mode="json") for p in products]
+            return json.dumps(payload).encode()
+        return run
+
+    def products_rows(full_photos: bool):
+        async def run():
+            rows = await fetch_rows(db, product_rows().order_by(models.Product.id).limit(limit))
+            return serialization.dumps(await serialize_product_rows(db, rows, full_photos))
+        return run
+
+    async def orders_orm():
+        loader = selectinload(models.Order.items).selectinload(models.OrderItem.product).selectinload(PRIMARY_PHOTO)
+        statement = select(models.Order).options(loader).where(models.Order.user_id == user_id).order_by(models.Order.id).limit(limit)
+        # What FastAPI does with response_model=List[OrderResponse]
+        return order_page.dump_json(order_page.validate_python(await fetch_scalars(db, statement), from_attributes=True))
+
+    async def orders_rows():
+        return serialization.dumps(await fetch_order_page(db, models.Order.user_id == user_id, limit=limit))
+
+    try:
+        results = {
+            "products": args.products,
+            "page_size": limit,
+            "json_encoder": "orjson" if serialization.orjson is not None else "json",
+            "product_page": compare("product_page", products_orm(False), products_rows(False), args.repeat),
+            "product_page_full_photos": compare("product_page_full_photos", products_orm(True), products_rows(True), args.repeat),
+            "order_page": compare("order_page", orders_orm, orders_rows, args.repeat),
+        }
+        body, _ = time_calls(products_rows(True), 1)
+        results["compression_full_photo_page"] = compression(body, args.repeat)
+    finally:
+        db.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
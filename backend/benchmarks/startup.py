@@ -0,0 +1,106 @@
+"""Cold start benchmark: process spawn to first response, to GET /ready, and the first catalog request.
+
+Migrates a throwaway SQLite file with `alembic upgrade head` (or only
+create_all with --schema create_all, the path a database without Alembic
+takes) and seeds a catalog. It then starts uvicorn --runs times in two
+modes. "warmup" uses the default WARMUP_PATHS. "cold" sets WARMUP_PATHS
+empty, so nothing is cached before the first visitor. For each start it
+records seconds until `/` answers, seconds until /ready answers 200, and the
+latency of the first and second GET /products/ after that. From backend/:
+
+    python benchmarks/startup.py --runs 5 --products 2000
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from common import BACKEND_DIR, database_url_from_env, free_port, seed_catalog
+
+HOT_PATH = "/products/"
+
+
+def _wait_for(client, url: str, deadline: float) -> float:
+    import httpx
+
+    while time.perf_counter() < deadline:
+        try:
+            if client.get(url).status_code == 200:
+                return time.perf_counter()
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.005)
+    raise RuntimeError(f"{url} did not answer 200 in time")
+
+
+def one_start(database_url: str, env_overrides: dict) -> dict:
+    import httpx
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, DATABASE_URL=database_url, JOB_WORKER_IN_APP="false", **env_overrides)
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    try:
+        with httpx.Client(base_url=base_url, timeout=30) as client:
+            deadline = started + 60
+            first_response = _wait_for(client, "/", deadline) - started
+            ready = _wait_for(client, "/ready", deadline) - started
+            readiness = client.get("/ready").json()
+            latencies = []
+            for _ in range(2):
+                request_started = time.perf_counter()
+                client.get(HOT_PATH).raise_for_status()
+                latencies.append(time.perf_counter() - request_started)
+    finally:
+        proc.terminate()
+        proc.wait()
+    return {
+        "first_response_s": first_response,
+        "ready_s": ready,
+        "first_hot_request_ms": latencies[0] * 1000,
+        "second_hot_request_ms": latencies[1] * 1000,
+        "warmup_s": readiness["warmup_seconds"],
+        "schema_revision": readiness["schema_revision"],
+    }
+
+
+def summarize_runs(runs: list) -> dict:
+    summary = {}
+    for key in ("first_response_s", "ready_s", "first_hot_request_ms", "second_hot_request_ms", "warmup_s"):
+        values = [run[key] for run in runs]
+        summary[key] = {"median": round(statistics.median(values), 4), "min": round(min(values), 4), "max": round(max(values), 4)}
+    summary["schema_revision"] = runs[-1]["schema_revision"]
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--schema", choices=["alembic", "create_all"], default="alembic")
+    args = parser.parse_args()
+
+    database_url = database_url_from_env("startup.db")
+    if args.schema == "alembic":
+        subprocess.run(
+            [sys.executable, "-m", "alembic", "upgrade", "head"],
+            cwd=BACKEND_DIR, env=dict(os.environ, DATABASE_URL=database_url), check=True, capture_output=True,
+        )
+    seed_catalog(database_url, args.products)
+
+    modes = {"warmup": {}, "cold": {"WARMUP_PATHS": ""}}
+    results = {}
+    for mode, env_overrides in modes.items():
+        results[mode] = summarize_runs([one_start(database_url, env_overrides) for _ in range(args.runs)])
+    print(json.dumps({"schema": args.schema, "products": args.products, "runs": args.runs, "modes": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""Scenario benchmark suite: seed a catalog, drive the real app, compare runs.
+
+Seeds users, products and orders through the real models into a throwaway
+SQLite file (or DATABASE_URL, e.g. a migrated throwaway Postgres), then runs
+each scenario for --seconds at --concurrency against main.app, either under
+uvicorn (--target uvicorn, the default) or in-process over ASGI (--target asgi):
+
+    browse     catalog pages, product detail, search and facet counts, anonymous
+    login      POST /auth/login with the bench accounts; bcrypt bound, 429s are shed load
+    checkout   checkout storm: 1-4 random products per order, a random user each
+    admin      dashboard reads: /admin/stats, /admin/stats/revenue, /admin/orders
+    invoice    GET /admin/orders/{id}/invoice for random orders; a 202 is a render queued for a worker
+
+Reports throughput, p50/p95/p99 and status counts per scenario as JSON.
+With --compare, or --diff on two saved runs, flags any scenario whose
+throughput dropped or whose p50/p95 rose by more than --tolerance and exits
+with status 1. From backend/:
+
+    python benchmarks/suite.py --users 200 --products 5000 --orders 2000 --output base.json
+    python benchmarks/suite.py --users 200 --products 5000 --orders 2000 --compare base.json
+    python benchmarks/suite.py --diff base.json new.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import time
+from datetime import datetime
+
+from common import (
+    BACKEND_DIR, BENCH_PASSWORD, GARMENTS, bench_token, database_url_from_env, seed_admin, seed_catalog,
+    seed_orders, seed_users, start_server, stop_server, summarize,
+)
+
+SORTS = ["id", "price", "-price", "-rating"]
+CATEGORIES = ["Men", "Women", "Kids"]
+SEARCH_WORDS = [garment.split()[0].lower() for garment in GARMENTS]
+# Higher is better for these; the rest are latencies where lower is better
+THROUGHPUT_KEYS = ("rps",)
+LATENCY_KEYS = ("p50_ms", "p95_ms")
+
+
+class Context:
+    def __init__(self, product_ids: list, order_ids: list, emails: list, admin_email: str):
+        self.product_ids = product_ids
+        self.order_ids = order_ids
+        self.emails = emails
+        self.user_headers = [{"Authorization": f"Bearer {bench_token(email)}"} for email in emails]
+        self.admin_headers = {"Authorization": f"Bearer {bench_token(admin_email, is_admin=True)}"}
+
+
+def browse(ctx: Context):
+    roll = random.random()
+    if roll < 0.4:
+        return "GET", f"/products/page?limit=24&sort={random.choice(SORTS)}&category={random.choice(CATEGORIES)}", {}
+    if roll < 0.8:
+        return "GET", f"/products/{random.choice(ctx.product_ids)}", {}
+    if roll < 0.95:
+        return "GET", f"/products/search?q={random.choice(SEARCH_WORDS)}&limit=24", {}
+    return "GET", f"/products/facets?category={random.choice(CATEGORIES)}", {}
+
+
+def login(ctx: Context):
+    return "POST", "/auth/login", {"data": {"username": random.choice(ctx.emails), "password": BENCH_PASSWORD}}
+
+
+def checkout(ctx: Context):
+    products = random.sample(ctx.product_ids, random.randint(1, 4))
+    body = {
+        "items": [{"product_id": pid, "quantity": random.randint(1, 2)} for pid in products],
+        "shipping_address": "1 Bench Street",
+    }
+    return "POST", "/orders/checkout", {"json": body, "headers": random.choice(ctx.user_headers)}
+
+
+def admin(ctx: Context):
+    url = random.choice([
+        "/admin/stats",
+        "/admin/stats/revenue",
+        f"/admin/orders?limit=50&skip={random.randrange(max(1, len(ctx.order_ids) - 50))}",
+    ])
+    return "GET", url, {"headers": ctx.admin_headers}
+
+
+def invoice(ctx: Context):
+    return "GET", f"/admin/orders/{random.choice(ctx.order_ids)}/invoice", {"headers": ctx.admin_headers}
+
+
+SCENARIOS = {"browse": browse, "login": login, "checkout": checkout, "admin": admin, "invoice": invoice}
+
+
+async def drive(client, scenario, ctx: Context, concurrency: int, seconds: float) -> dict:
+    latencies = []
+    statuses = {}
+    errors = 0
+    stop_at = time.perf_counter() + seconds
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < stop_at:
+            method, url, kwargs = scenario(ctx)
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {**summarize(latencies, time.perf_counter() - started, errors), "statuses": statuses}
+
+
+async def run_scenarios(base_url, app, names: list, ctx: Context, concurrency: int, seconds: float) -> dict:
+    import httpx
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    transport = httpx.ASGITransport(app=app) if app is not None else None
+    results = {}
+    async with httpx.AsyncClient(base_url=base_url, transport=transport, limits=limits, timeout=60) as client:
+        for name in names:
+            # One warm-up request so first-hit costs (imports, pool connects) stay out of the numbers
+            method, url, kwargs = SCENARIOS[name](ctx)
+            await client.request(method, url, **kwargs)
+            results[name] = await drive(client, SCENARIOS[name], ctx, concurrency, seconds)
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> dict:
+    """Per-scenario relative changes against `baseline`, and which of them count as regressions."""
+    report = {}
+    for name, now in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        changes, regressions = {}, []
+        for key in THROUGHPUT_KEYS + LATENCY_KEYS:
+            if not before.get(key):
+                continue
+            change = (now[key] - before[key]) / before[key]
+            changes[key] = round(change * 100, 1)
+            worse = -change if key in THROUGHPUT_KEYS else change
+            if worse > tolerance:
+                regressions.append(key)
+        report[name] = {"change_pct": changes, "regressed": regressions}
+    return report
+
+
+def mismatched_settings(baseline: dict, current: dict) -> list:
+    keys = ("database", "target", "users", "products", "orders", "concurrency", "seconds")
+    return [key for key in keys if baseline.get("meta", {}).get(key) != current.get("meta", {}).get(key)]
+
+
+def print_comparison(report: dict, mismatched: list):
+    if mismatched:
+        print(f"warning: the runs differ in {', '.join(mismatched)}; the comparison may not mean much")
+    for name, entry in report.items():
+        changes = ", ".join(f"{key} {value:+.1f}%" for key, value in entry["change_pct"].items())
+        flag = f"  REGRESSED: {', '.join(entry['regressed'])}" if entry["regressed"] else ""
+        print(f"{name:<10} {changes}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--orders", type=int, default=500)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10.0, help="duration of each scenario")
+    parser.add_argument("--target", choices=["uvicorn", "asgi"], default="uvicorn")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the data and the request mix")
+    parser.add_argument("--output", help="also write the results to this file")
+    parser.add_argument("--compare", metavar="BASELINE", help="results file to compare this run against")
+    parser.add_argument("--diff", nargs=2, metavar=("BASELINE", "CURRENT"), help="only compare two saved runs")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="relative change that counts as a regression")
+    args = parser.parse_args()
+
+    if args.diff:
+        with open(args.diff[0]) as f_base, open(args.diff[1]) as f_now:
+            baseline, current = json.load(f_base), json.load(f_now)
+        report = compare(baseline, current, args.tolerance)
+        print_comparison(report, mismatched_settings(baseline, current))
+        raise SystemExit(1 if any(entry["regressed"] for entry in report.values()) else 0)
+
+    random.seed(args.seed)
+    database_url = database_url_from_env()
+    started = time.perf_counter()
+    product_ids = seed_catalog(database_url, args.products)
+    emails = seed_users(database_url, args.users)
+    admin_email = seed_admin(database_url)
+    order_ids = seed_orders(database_url, product_ids, emails, args.orders)
+    if "checkout" in args.scenarios:
+        # The storm measures contention on the stock reservation, not sold-out products
+        from sqlalchemy import update
+        import models
+        from database import SessionLocal
+
+        with SessionLocal() as db:
+            db.execute(update(models.Product).values(stock=1_000_000))
+            db.commit()
+    seed_seconds = round(time.perf_counter() - started, 1)
+    ctx = Context(product_ids, order_ids, emails, admin_email)
+
+    if args.target == "asgi":
+        import main as app_module
+
+        scenarios = asyncio.run(run_scenarios("http://bench", app_module.app, args.scenarios, ctx, args.concurrency, args.seconds))
+    else:
+        proc, base_url = start_server(database_url)
+        try:
+            scenarios = asyncio.run(run_scenarios(base_url, None, args.scenarios, ctx, args.concurrency, args.seconds))
+        finally:
+            stop_server(proc)
+
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "started_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "database": database_url.split(":", 1)[0],
+            "target": args.target,
+            "users": args.users,
+            "products": args.products,
+            "orders": args.orders,
+            "concurrency": args.concurrency,
+            "seconds": args.seconds,
+            "seed": args.seed,
+            "seed_seconds": seed_seconds,
+        },
+        "scenarios": scenarios,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        report = compare(baseline, results, args.tolerance)
+        print_comparison(report, mismatched_settings(baseline, results))
+        raise SystemExit(1 if any(entry["regressed"] for entry in report.values()) else 0)
+
+
+if __name__ == "__main__":
+    main()
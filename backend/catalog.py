@@ -0,0 +1,305 @@
+"""Bulk catalog import and export (CSV or NDJSON).
+
+Imports are read row by row from the uploaded file and validated with
+ProductCreate. Valid rows are written in batches: rows that carry an `id`
+are upserted with a single executemany INSERT ... ON CONFLICT (id) DO
+UPDATE, new rows go through one INSERT ... RETURNING, and then the batch's
+tags and photos are replaced and its effective prices recomputed. When a
+batch lists the same id more than once, its last row is the one written.
+Each batch commits on its own, so an invalid row only costs itself and a
+batch the database rejects only its own rows.
+
+Exports stream from a server-side cursor in id order, a chunk at a time.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import bindparam, delete, insert, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+import models, schemas, pricing
+from database import SessionLocal
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+COLUMNS = (
+    "id", "name", "description", "category", "tags", "color", "fabric", "rating",
+    "mrp", "discount_percentage", "discount_price", "stock", "photos",
+)
+# Columns written straight to the products table
+PRODUCT_FIELDS = ("name", "description", "category", "color", "fabric", "rating", "mrp", "discount_percentage", "discount_price", "stock")
+PHOTO_SEPARATOR = "|"
+BATCH_SIZE = 500
+EXPORT_CHUNK = 1000
+MAX_REPORTED_ERRORS = 1000
+
+
+def detect_format(fmt: Optional[str], filename: Optional[str]) -> Optional[str]:
+    """Explicit format, else the file extension (.csv, .ndjson, .jsonl)."""
+    if fmt:
+        return fmt.lower() if fmt.lower() in FORMATS else None
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    return {"csv": "csv", "ndjson": "ndjson", "jsonl": "ndjson"}.get(extension)
+
+
+def _from_csv(row: dict) -> dict:
+    # Blank cells fall back to the schema defaults; photos are pipe separated
+    raw = {key: value.strip() for key, value in row.items() if key and value is not None and value.strip()}
+    if "photos" in raw:
+        raw["photos"] = [url.strip() for url in raw["photos"].split(PHOTO_SEPARATOR) if url.strip()]
+    return raw
+
+
+def read_rows(stream, fmt: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """Yield (line number, raw row, parse error) one row at a time from a binary file object."""
+    text_stream = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        if fmt == "csv":
+            reader = csv.DictReader(text_stream)
+            try:
+                for row in reader:
+                    yield reader.line_num, _from_csv(row), None
+            except csv.Error as exc:
+                yield reader.line_num, None, f"Malformed CSV: {exc}"
+            return
+        for line_number, line in enumerate(text_stream, 1):
+            if not line.strip():
+                continue
+            try:
+                raw = json.loads(line)
+            except ValueError as exc:
+                yield line_number, None, f"Invalid JSON: {exc}"
+                continue
+            if isinstance(raw, dict):
+                yield line_number, raw, None
+            else:
+                yield line_number, None, "Each line must be a JSON object"
+    except UnicodeDecodeError:
+        yield 0, None, "File is not valid UTF-8"
+    finally:
+        # Leave the upload itself open for its owner to close
+        text_stream.detach()
+
+
+def validate_row(raw: dict) -> Tuple[Optional[int], schemas.ProductCreate]:
+    """Split off the optional id and validate the rest; raises ValueError with readable messages."""
+    product_id = raw.pop("id", None)
+    if product_id is not None:
+        try:
+            product_id = int(product_id)
+        except (TypeError, ValueError):
+            raise ValueError("id: must be an integer")
+        if product_id <= 0:
+            raise ValueError("id: must be positive")
+    # As with create_product, a missing or zero discount_price is derived
+    raw.setdefault("discount_price", 0)
+    try:
+        return product_id, schemas.ProductCreate.model_validate(raw)
+    except ValidationError as exc:
+        raise ValueError("; ".join(f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in exc.errors()))
+
+
+def _resolve_tags(db: Session, products: List[schemas.ProductCreate]) -> dict:
+    """Slug -> Tag id for every tag named in the batch, creating the missing ones."""
+    slugs = {}
+    for product in products:
+        for name in (product.tags or "").split(","):
+            if name.strip():
+                slugs.setdefault(name.strip().lower(), name.strip())
+    if not slugs:
+        return {}
+    tags = {slug: (tag_id, name) for tag_id, slug, name in db.execute(
+        select(models.Tag.id, models.Tag.slug, models.Tag.name).where(models.Tag.slug.in_(slugs))
+    )}
+    missing = [{"slug": slug, "name": name} for slug, name in slugs.items() if slug not in tags]
+    if missing:
+        db.execute(insert(models.Tag), missing)
+        tags.update({slug: (tag_id, name) for tag_id, slug, name in db.execute(
+            select(models.Tag.id, models.Tag.slug, models.Tag.name).where(models.Tag.slug.in_([m["slug"] for m in missing]))
+        )})
+    return tags
+
+
+def save_products(db: Session, items: List[Tuple[Optional[int], schemas.ProductCreate]]) -> Tuple[int, int]:
+    """Write one batch of (id or None, product) without committing; returns (created, updated)."""
+    table = models.Product.__table__
+    # ON CONFLICT cannot touch a row twice in one statement, so of rows sharing an id the last one wins
+    last = {product_id: index for index, (product_id, _) in enumerate(items) if product_id is not None}
+    items = [item for index, item in enumerate(items) if item[0] is None or last[item[0]] == index]
+    tags = _resolve_tags(db, [product for _, product in items])
+    now = datetime.utcnow()
+
+    def values(product: schemas.ProductCreate) -> dict:
+        slugs = list(dict.fromkeys(n.strip().lower() for n in (product.tags or "").split(",") if n.strip()))
+        row = {field: getattr(product, field) for field in PRODUCT_FIELDS}
+        row["discount_price"] = product.resolved_discount_price()
+        row["tags"] = ", ".join(tags[slug][1] for slug in slugs) or None
+        row["updated_at"] = now
+        return row
+
+    explicit = [dict(values(product), id=product_id) for product_id, product in items if product_id is not None]
+    fresh = [values(product) for product_id, product in items if product_id is None]
+
+    existing = set()
+    if explicit:
+        existing = set(db.scalars(select(table.c.id).where(table.c.id.in_([row["id"] for row in explicit]))))
+        dialect = db.get_bind().dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            insert_fn = pg_insert if dialect == "postgresql" else sqlite_insert
+            statement = insert_fn(table)
+            statement = statement.on_conflict_do_update(
+                index_elements=["id"],
+                set_={
+                    **{column: statement.excluded[column] for column in PRODUCT_FIELDS + ("tags", "updated_at")},
+                    "version": table.c.version + 1,
+                },
+            )
+            db.execute(statement, explicit)
+        else:
+            updates = [row for row in explicit if row["id"] in existing]
+            if updates:
+                # The remaining keys of each row become the SET clause
+                db.execute(
+                    update(table).where(table.c.id == bindparam("b_id")).values(version=table.c.version + 1),
+                    [{**{k: v for k, v in row.items() if k != "id"}, "b_id": row["id"]} for row in updates],
+                )
+            inserts = [row for row in explicit if row["id"] not in existing]
+            if inserts:
+                db.execute(insert(table), inserts)
+
+    fresh_ids = []
+    if fresh:
+        fresh_ids = db.scalars(insert(table).returning(table.c.id, sort_by_parameter_order=True), fresh).all()
+
+    ids = [row["id"] for row in explicit] + list(fresh_ids)
+    ordered = [product for product_id, product in items if product_id is not None] + [product for product_id, product in items if product_id is None]
+
+    # Tags and photos are replaced wholesale, as update_product does
+    db.execute(delete(models.product_tags).where(models.product_tags.c.product_id.in_(ids)))
+    db.execute(delete(models.ProductPhoto).where(models.ProductPhoto.product_id.in_(ids)))
+    links = [
+        {"product_id": product_id, "tag_id": tags[slug][0]}
+        for product_id, product in zip(ids, ordered)
+        for slug in dict.fromkeys(n.strip().lower() for n in (product.tags or "").split(",") if n.strip())
+    ]
+    if links:
+        db.execute(insert(models.product_tags), links)
+    photos = []
+    for product_id, product in zip(ids, ordered):
+        for position, url in enumerate(product.photos):
+            photo = models.ProductPhoto.from_url(url, position)
+            photos.append({
+                "product_id": product_id,
+                "position": position,
+                "url": photo.url,
+                "medium_url": photo.medium_url,
+                "thumbnail_url": photo.thumbnail_url,
+            })
+    if photos:
+        db.execute(insert(models.ProductPhoto), photos)
+    pricing.refresh_effective_prices(db, models.Product.id.in_(ids))
+
+    updated = len(existing)
+    return len(ids) - updated, updated
+
+
+def _sync_id_sequence(db: Session):
+    # Explicit ids bypass the Postgres sequence; move it past them so later inserts don't collide
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT setval(pg_get_serial_sequence('products', 'id'), (SELECT coalesce(max(id), 1) FROM products))"))
+        db.commit()
+
+
+def import_products(db: Session, stream, fmt: str, batch_size: int = BATCH_SIZE) -> dict:
+    result = {"created": 0, "updated": 0, "failed": 0, "errors": [], "errors_truncated": False}
+
+    def fail(line: int, message: str):
+        result["failed"] += 1
+        if len(result["errors"]) < MAX_REPORTED_ERRORS:
+            result["errors"].append({"row": line, "error": message})
+        else:
+            result["errors_truncated"] = True
+
+    batch, lines = [], []
+    explicit_ids = False
+
+    def flush():
+        try:
+            created, updated = save_products(db, batch)
+            db.commit()
+        except SQLAlchemyError as exc:
+            db.rollback()
+            reason = str(getattr(exc, "orig", exc))
+            for line in lines:
+                fail(line, f"Batch rejected by the database: {reason}")
+        else:
+            result["created"] += created
+            result["updated"] += updated
+        batch.clear()
+        lines.clear()
+
+    for line, raw, error in read_rows(stream, fmt):
+        if error is not None:
+            fail(line, error)
+            continue
+        try:
+            product_id, product = validate_row(raw)
+        except ValueError as exc:
+            fail(line, str(exc))
+            continue
+        explicit_ids = explicit_ids or product_id is not None
+        batch.append((product_id, product))
+        lines.append(line)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    if explicit_ids:
+        _sync_id_sequence(db)
+    return result
+
+
+def _export_row(row, photos: list) -> dict:
+    data = {column: getattr(row, column) for column in COLUMNS if column != "photos"}
+    data["photos"] = photos
+    return data
+
+
+def export_products(fmt: str) -> Iterator[bytes]:
+    """Yield the whole catalog as CSV or NDJSON, EXPORT_CHUNK products per chunk."""
+    table = models.Product.__table__
+    photo_table = models.ProductPhoto.__table__
+    db = SessionLocal()
+    try:
+        statement = select(*(table.c[c] for c in COLUMNS if c != "photos")).order_by(table.c.id)
+        result = db.execute(statement, execution_options={"yield_per": EXPORT_CHUNK})
+        if fmt == "csv":
+            yield (",".join(COLUMNS) + "\r\n").encode()
+        for rows in result.partitions():
+            photos = {}
+            for product_id, url in db.execute(
+                select(photo_table.c.product_id, photo_table.c.url)
+                .where(photo_table.c.product_id.in_([row.id for row in rows]))
+                .order_by(photo_table.c.product_id, photo_table.c.position)
+            ):
+                photos.setdefault(product_id, []).append(url)
+
+            buffer = io.StringIO()
+            if fmt == "csv":
+                writer = csv.writer(buffer)
+                for row in rows:
+                    data = _export_row(row, photos.get(row.id, []))
+                    data["photos"] = PHOTO_SEPARATOR.join(data["photos"])
+                    writer.writerow([data[c] for c in COLUMNS])
+            else:
+                for row in rows:
+                    buffer.write(json.dumps(_export_row(row, photos.get(row.id, []))) + "\n")
+            yield buffer.getvalue().encode()
+    finally:
+        db.close()
@@ -1,13 +1,82 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from sqlalchemy.orm import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from fastapi.concurrency import run_in_threadpool
 from pydantic_settings import BaseSettings
+from contextlib import contextmanager
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
 
 class Settings(BaseSettings):
     secret_key: str = "yoursecretkeyhere_keepitasecret"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 1440
     database_url: str = "sqlite:///./qmexai_dev.db"
+    product_cache_size: int = 2048
+    product_cache_ttl_seconds: float = 300.0
+    auth_cache_size: int = 10000
+    auth_cache_ttl_seconds: float = 60.0
+    # How cache invalidations reach the other workers (see invalidation.py):
+    # auto (postgres on a Postgres DATABASE_URL, else local), local, unix or postgres
+    cache_bus: str = "auto"
+    cache_bus_channel: str = "cache_invalidation"
+    cache_bus_socket_dir: str = "/tmp/qmexai-cache-bus"
+    # Background warm-up at startup (see startup.py): pool connections to open and
+    # comma separated catalog paths to request before GET /ready reports ready
+    warmup_connections: int = 2
+    warmup_paths: str = "/products/,/products/page"
+    # bcrypt runs in its own bounded pool; requests beyond workers + queue get a 429
+    password_hash_workers: int = 2
+    password_hash_queue_size: int = 32
+    # Rendered invoice PDFs, named by content digest
+    invoice_cache_dir: str = ".invoice_cache"
+    invoice_cache_max_files: int = 5000
+    invoice_workers: int = 2
+    invoice_export_max_orders: int = 5000
+    # Responses at least this large are gzip (or brotli) compressed when the client accepts it; 0 disables
+    compression_min_bytes: int = 1024
+    # Log the SQL of any request slower than this (milliseconds); 0 disables
+    slow_request_ms: float = 0.0
+    # Bearer token a Prometheus scrape of /metrics must send; empty turns /metrics off
+    metrics_token: str = ""
+    # Background jobs (jobs.py). Turn the in-app worker off when running `python jobs.py` separately.
+    job_worker_in_app: bool = True
+    job_poll_seconds: float = 1.0
+    job_batch_size: int = 10
+    job_max_attempts: int = 5
+    job_retry_base_seconds: float = 2.0
+    # A running job whose worker has not finished it after this long is handed out again
+    job_lease_seconds: int = 300
+    job_retention_days: int = 7
+    # Checkout Idempotency-Key: responses are replayed for this long; an
+    # unfinished original request counts as abandoned after idempotency_lock_seconds
+    idempotency_ttl_seconds: int = 86400
+    idempotency_lock_seconds: float = 30.0
+    # Longest the price rule scheduler sleeps before checking for new rules; 0 disables it
+    price_rule_poll_seconds: float = 60.0
+    # Opt-in: serve the hot read paths through an AsyncEngine (asyncpg / aiosqlite)
+    async_db: bool = False
+    # Connection pool. pre-ping and recycle keep dead SSL connections left over
+    # from an idle period from reaching a request.
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout_seconds: float = 30.0
+    db_pool_recycle_seconds: int = 1800
+    db_pool_pre_ping: bool = True
+    # Postgres only; 0 disables the server-side statement timeout
+    db_statement_timeout_ms: int = 0
+    # Comma separated read replica URLs for the read-only endpoints (get_async_read_db).
+    # A replica that fails to connect is skipped for replica_retry_seconds.
+    database_replica_urls: str = ""
+    replica_retry_seconds: float = 30.0
+    # After an admin catalog change, read from the primary for this long so
+    # caches are not refilled from a replica that has not caught up yet
+    replica_lag_grace_seconds: float = 5.0
 
     class Config:
         env_file = ".env"
@@ -15,20 +84,109 @@ class Settings(BaseSettings):
 
 settings = Settings()
 
-# Render.com injects postgres:// but SQLAlchemy strictly requires postgresql://
-SQLALCHEMY_DATABASE_URL = settings.database_url
-if SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
-    SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgres://", "postgresql://", 1)
+def _normalize_url(url: str) -> str:
+    # Render.com injects postgres:// but SQLAlchemy strictly requires postgresql://
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+
+    # Ensure SSL is used for remote Postgres (Render requirement)
+    if "postgresql" in url and "localhost" not in url and "127.0.0.1" not in url:
+        if "sslmode" not in url:
+            separator = "&" if "?" in url else "?"
+            url += f"{separator}sslmode=require"
+    return url
+
+SQLALCHEMY_DATABASE_URL = _normalize_url(settings.database_url)
+REPLICA_URLS = [_normalize_url(url.strip()) for url in settings.database_replica_urls.split(",") if url.strip()]
+
+class PoolStats:
+    """Counters the instrumented pools below feed; read them through pool_status()."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def record_connect(self):
+        with self._lock:
+            self.connects += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "checkout_timeouts": self.timeouts,
+                "connections_opened": self.connects,
+                "checkout_wait_avg_ms": round(self.wait_total / attempts * 1000, 3) if attempts else 0.0,
+                "checkout_wait_max_ms": round(self.wait_max * 1000, 3),
+            }
+
+class _TimedCheckout:
+    """Pool mixin timing how long each checkout waits for a free connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        self.stats.record_wait(time.perf_counter() - started)
+        return conn
+
+    def _create_connection(self):
+        self.stats.record_connect()
+        return super()._create_connection()
 
-# Ensure SSL is used for remote Postgres (Render requirement)
-if "postgresql" in SQLALCHEMY_DATABASE_URL and "localhost" not in SQLALCHEMY_DATABASE_URL and "127.0.0.1" not in SQLALCHEMY_DATABASE_URL:
-    if "sslmode" not in SQLALCHEMY_DATABASE_URL:
-        separator = "&" if "?" in SQLALCHEMY_DATABASE_URL else "?"
-        SQLALCHEMY_DATABASE_URL += f"{separator}sslmode=require"
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+def _pool_options() -> dict:
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout_seconds,
+        "pool_recycle": settings.db_pool_recycle_seconds,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+def _connect_args(url: str) -> dict:
+    if url.startswith("sqlite"):
+        return {"check_same_thread": False}
+    if settings.db_statement_timeout_ms > 0:
+        return {"options": f"-c statement_timeout={settings.db_statement_timeout_ms}"}
+    return {}
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
+    connect_args=_connect_args(SQLALCHEMY_DATABASE_URL),
+    poolclass=TimedQueuePool,
+    **_pool_options(),
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -40,3 +198,210 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def _async_url(url: str) -> str:
+    if url.startswith("sqlite"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    # asyncpg spells libpq's sslmode as ssl
+    return url.replace("postgresql://", "postgresql+asyncpg://", 1).replace("sslmode=", "ssl=")
+
+class ReplicaSet:
+    """Round-robin over the replica engines, skipping any that recently failed to connect."""
+
+    def __init__(self, engines: list):
+        self.engines = engines
+        self._turn = itertools.count()
+        self._down_until = {}
+
+    def candidates(self) -> list:
+        if not self.engines:
+            return []
+        start = next(self._turn) % len(self.engines)
+        now = time.monotonic()
+        ordered = self.engines[start:] + self.engines[:start]
+        return [e for e in ordered if self._down_until.get(e, 0.0) <= now]
+
+    def mark_down(self, replica):
+        self._down_until[replica] = time.monotonic() + settings.replica_retry_seconds
+
+    def is_down(self, replica) -> bool:
+        return self._down_until.get(replica, 0.0) > time.monotonic()
+
+# Only get_async_read_db uses replicas, so ASYNC_DB needs just the async engines below
+replicas = ReplicaSet([] if settings.async_db else [
+    create_engine(url, connect_args=_connect_args(url), poolclass=TimedQueuePool, **_pool_options())
+    for url in REPLICA_URLS
+])
+
+async_engine = None
+AsyncSessionLocal = None
+async_replicas = ReplicaSet([])
+if settings.async_db:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    def _create_async_engine(url: str):
+        async_connect_args = {}
+        if not url.startswith("sqlite") and settings.db_statement_timeout_ms > 0:
+            async_connect_args = {"server_settings": {"statement_timeout": str(settings.db_statement_timeout_ms)}}
+        return create_async_engine(
+            _async_url(url),
+            connect_args=async_connect_args,
+            poolclass=TimedAsyncQueuePool,
+            **_pool_options(),
+        )
+
+    async_engine = _create_async_engine(SQLALCHEMY_DATABASE_URL)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    async_replicas = ReplicaSet([_create_async_engine(url) for url in REPLICA_URLS])
+
+async def get_async_db():
+    """Session for `async def` read handlers.
+
+    Yields an AsyncSession when ASYNC_DB is on, otherwise a regular Session whose
+    statements the fetch_* helpers below push to the threadpool, so the same
+    handler code runs in both modes.
+    """
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            await run_in_threadpool(db.close)
+
+_primary_reads_until = 0.0
+
+def read_from_primary(seconds: float = None):
+    """Send this process's replica reads to the primary for a while, e.g. after a write they must see."""
+    global _primary_reads_until
+    seconds = settings.replica_lag_grace_seconds if seconds is None else seconds
+    _primary_reads_until = max(_primary_reads_until, time.monotonic() + seconds)
+
+async def _replica_connection():
+    """A connection to the next healthy replica, or None to use the primary."""
+    if time.monotonic() < _primary_reads_until:
+        return None
+    use_async = AsyncSessionLocal is not None
+    for replica in (async_replicas if use_async else replicas).candidates():
+        try:
+            return await replica.connect() if use_async else await run_in_threadpool(replica.connect)
+        except exc.TimeoutError:
+            # Busy rather than broken: try the next one
+            continue
+        except (exc.DBAPIError, OSError) as e:
+            logger.warning("Read replica %s is unreachable, skipping it for %ss: %s", replica.url, settings.replica_retry_seconds, e)
+            (async_replicas if use_async else replicas).mark_down(replica)
+    return None
+
+def _close(db: Session, connection):
+    db.close()
+    if connection is not None:
+        connection.close()
+
+async def get_async_read_db():
+    """get_async_db for read-only handlers: a session on a healthy read replica.
+
+    Falls back to the primary when no replica is configured or reachable, and
+    for REPLICA_LAG_GRACE_SECONDS after read_from_primary(). Replicas lag the
+    primary, so anything that must see a write it just made stays on
+    get_db / get_async_db.
+    """
+    connection = await _replica_connection()
+    if AsyncSessionLocal is not None:
+        db = AsyncSessionLocal(bind=connection) if connection is not None else AsyncSessionLocal()
+        try:
+            yield db
+        finally:
+            await db.close()
+            if connection is not None:
+                await connection.close()
+    else:
+        db = SessionLocal(bind=connection) if connection is not None else SessionLocal()
+        try:
+            yield db
+        finally:
+            await run_in_threadpool(_close, db, connection)
+
+async def fetch_scalars(db, statement) -> list:
+    if isinstance(db, Session):
+        return await run_in_threadpool(lambda: db.scalars(statement).unique().all())
+    return (await db.scalars(statement)).unique().all()
+
+async def fetch_first(db, statement):
+    if isinstance(db, Session):
+        return await run_in_threadpool(lambda: db.scalars(statement).unique().first())
+    return (await db.scalars(statement)).unique().first()
+
+async def fetch_scalar(db, statement):
+    if isinstance(db, Session):
+        return await run_in_threadpool(db.scalar, statement)
+    return await db.scalar(statement)
+
+async def run_sync(db, fn, *args):
+    """Call `fn(session, *args)` with a sync Session in either mode, e.g. for writes from async handlers."""
+    if isinstance(db, Session):
+        return await run_in_threadpool(fn, db, *args)
+    return await db.run_sync(fn, *args)
+
+async def fetch_rows(db, statement) -> list:
+    if isinstance(db, Session):
+        return await run_in_threadpool(lambda: db.execute(statement).all())
+    return (await db.execute(statement)).all()
+
+def pool_status(bind=None) -> dict:
+    """Live occupancy plus checkout counters for an engine's pool (sync or async)."""
+    bind = bind if bind is not None else engine
+    pool = getattr(bind, "sync_engine", bind).pool
+    status = {
+        "pool_class": type(pool).__name__,
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "max_overflow": settings.db_max_overflow,
+        "pre_ping": settings.db_pool_pre_ping,
+        "recycle_seconds": settings.db_pool_recycle_seconds,
+    }
+    if isinstance(pool, _TimedCheckout):
+        status.update(pool.stats.snapshot())
+    return status
+
+def pool_statuses() -> dict:
+    statuses = {"engine": pool_status(engine)}
+    if async_engine is not None:
+        statuses["async_engine"] = pool_status(async_engine)
+    for name, replica_set in (("replica", replicas), ("async_replica", async_replicas)):
+        for i, replica in enumerate(replica_set.engines):
+            statuses[f"{name}_{i}"] = dict(pool_status(replica), healthy=not replica_set.is_down(replica))
+    return statuses
+
+@contextmanager
+def assert_max_queries(limit: int, bind=None):
+    """Fail with the captured SQL if the block runs more than `limit` statements on `bind`.
+
+    Meant for tests, e.g. to pin an endpoint's statement count regardless of page size:
+
+        with assert_max_queries(4):
+            client.get("/admin/orders?limit=100")
+    """
+    if bind is not None:
+        binds = [bind]
+    else:
+        binds = [engine] + ([async_engine.sync_engine] if async_engine is not None else [])
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    for target in binds:
+        event.listen(target, "after_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        for target in binds:
+            event.remove(target, "after_cursor_execute", record)
+    if len(statements) > limit:
+        listing = "\n".join(f"  {i}. {sql}" for i, sql in enumerate(statements, 1))
+        raise AssertionError(f"Expected at most {limit} queries, got {len(statements)}:\n{listing}")
@@ -0,0 +1,173 @@
+"""Facet counts for the catalog filter sidebar.
+
+product_facets holds how many products share each combination of category,
+color, fabric, price bucket and tags string. The table stays small because
+catalogs reuse the same few values. GET /products/facets sums its rows for
+any combination of filters instead of grouping the products table.
+
+Each product remembers the combination it is counted under in
+products.facet_key. sync() recounts the products whose values no longer
+match their key, moving each one from its old row to its new row. The move
+is conditional on the old key, so it is safe to run more than once and from
+concurrent writers. pricing.refresh_effective_prices() calls it, so every
+write path that already refreshes prices (create, update, import, bulk
+discount, price rules and the rule scheduler) keeps the counts current.
+Deletes call remove(). `python facets.py` rebuilds the table from scratch,
+e.g. after PRICE_BUCKETS changes.
+"""
+from bisect import bisect_right
+from typing import List, Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+import models, stats
+
+# Lower bounds of the price buckets; the last one is open ended
+PRICE_BUCKETS = (0, 500, 1000, 2000, 5000)
+SEPARATOR = "\x1f"
+KEY_FIELDS = ("category", "color", "fabric", "price_bucket", "tags")
+
+
+def price_bucket(price: Optional[float]) -> int:
+    if price is None or price < PRICE_BUCKETS[0]:
+        return -1
+    return bisect_right(PRICE_BUCKETS, price) - 1
+
+
+def bucket_label(bucket: int) -> str:
+    if bucket == len(PRICE_BUCKETS) - 1:
+        return f"{PRICE_BUCKETS[bucket]}+"
+    return f"{PRICE_BUCKETS[bucket]}-{PRICE_BUCKETS[bucket + 1]}"
+
+
+def buckets_between(min_price: Optional[float], max_price: Optional[float]) -> Optional[List[int]]:
+    """The buckets covering [min_price, max_price), or None if either is not a bucket boundary."""
+    bounds = PRICE_BUCKETS + (None,)
+    if min_price is not None and min_price not in PRICE_BUCKETS:
+        return None
+    if max_price is not None and max_price not in bounds[1:]:
+        return None
+    first = PRICE_BUCKETS.index(min_price) if min_price is not None else 0
+    last = bounds.index(max_price) if max_price is not None else len(PRICE_BUCKETS)
+    return list(range(first, last))
+
+
+def facet_key(category, color, fabric, price, tags) -> str:
+    return SEPARATOR.join([category or "", color or "", fabric or "", str(price_bucket(price)), tags or ""])
+
+
+def _apply(db: Session, deltas: dict):
+    table = models.ProductFacet
+    for key, delta in deltas.items():
+        if delta:
+            values = dict(zip(KEY_FIELDS, key.split(SEPARATOR)))
+            values["price_bucket"] = int(values["price_bucket"])
+            stats.increment(db, table, values, product_count=delta)
+    if any(delta < 0 for delta in deltas.values()):
+        db.execute(delete(table).where(table.product_count <= 0))
+
+
+def sync(db: Session, *where) -> int:
+    """Recount the products matching `where` (all by default) whose facet values changed; returns how many moved."""
+    product = models.Product
+    rows = db.execute(
+        select(product.id, product.facet_key, product.category, product.color, product.fabric, product.effective_price, product.tags)
+        .where(*where)
+    ).all()
+    table = product.__table__
+    deltas, moved = {}, 0
+    for row in rows:
+        key = facet_key(row.category, row.color, row.fabric, row.effective_price, row.tags)
+        if key == row.facet_key:
+            continue
+        # Only the writer that still sees the old key moves the product, so a
+        # concurrent sync of the same product cannot apply the delta twice
+        claimed = db.execute(
+            update(table).where(table.c.id == row.id, table.c.facet_key.is_not_distinct_from(row.facet_key))
+            # Bookkeeping only: leave updated_at (and so Last-Modified) alone
+            .values(facet_key=key, updated_at=table.c.updated_at)
+        ).rowcount
+        if claimed != 1:
+            continue
+        if row.facet_key is not None:
+            deltas[row.facet_key] = deltas.get(row.facet_key, 0) - 1
+        deltas[key] = deltas.get(key, 0) + 1
+        moved += 1
+    if moved:
+        _apply(db, deltas)
+    return moved
+
+
+def remove(db: Session, product: models.Product):
+    """Stop counting a product that is about to be deleted."""
+    if product.facet_key is not None:
+        _apply(db, {product.facet_key: -1})
+
+
+def counts(rows, tags: Optional[List[str]] = None) -> dict:
+    """Fold facet_rows() results into {"total", "facets"}, keeping only rows that have every tag in `tags`."""
+    wanted = {t.strip().lower() for t in tags or [] if t.strip()}
+    total = 0
+    fields = {"category": {}, "color": {}, "fabric": {}, "tags": {}, "price": {}}
+    by_bucket = {}
+    for category, color, fabric, bucket, tag_string, count in rows:
+        names = {}
+        for name in tag_string.split(","):
+            if name.strip():
+                names.setdefault(name.strip().lower(), name.strip())
+        if not wanted <= set(names):
+            continue
+        total += count
+        for field, value in (("category", category), ("color", color), ("fabric", fabric)):
+            if value:
+                fields[field][value] = fields[field].get(value, 0) + count
+        for name in names.values():
+            fields["tags"][name] = fields["tags"].get(name, 0) + count
+        if bucket >= 0:
+            by_bucket[bucket] = by_bucket.get(bucket, 0) + count
+
+    facets = {
+        field: dict(sorted(values.items(), key=lambda item: (-item[1], item[0])))
+        for field, values in fields.items() if field != "price"
+    }
+    facets["price"] = {bucket_label(bucket): by_bucket[bucket] for bucket in sorted(by_bucket)}
+    return {"total": total, "facets": facets}
+
+
+def facet_rows(category: Optional[str] = None, color: Optional[str] = None, fabric: Optional[str] = None, buckets: Optional[List[int]] = None):
+    """The product_facets rows for counts(), narrowed by the filters the table can apply itself."""
+    facet = models.ProductFacet
+    statement = select(facet.category, facet.color, facet.fabric, facet.price_bucket, facet.tags, facet.product_count)
+    if category:
+        statement = statement.where(facet.category == category)
+    if color:
+        statement = statement.where(facet.color == color)
+    if fabric:
+        statement = statement.where(facet.fabric == fabric)
+    if buckets is not None:
+        statement = statement.where(facet.price_bucket.in_(buckets))
+    return statement.where(facet.product_count > 0)
+
+
+def rebuild(db: Session) -> int:
+    db.execute(delete(models.ProductFacet))
+    db.execute(update(models.Product).values(facet_key=None, updated_at=models.Product.updated_at))
+    return sync(db)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Rebuild product_facets from the products table.")
+    parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        counted = rebuild(session)
+        session.commit()
+    finally:
+        session.close()
+    print(f"{counted} products counted")
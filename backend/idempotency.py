@@ -0,0 +1,117 @@
+"""Idempotency-Key handling for checkout.
+
+A client that retries POST /orders/checkout with the same Idempotency-Key
+gets the order the first attempt created instead of a second order. Keys
+are scoped to the user and kept for IDEMPOTENCY_TTL_SECONDS.
+
+begin() claims the key in its own short transaction, so a concurrent retry
+sees it at once. A retry while the original is still running gets a 409
+with Retry-After straight away; once the original has finished, a retry
+replays its order rather than reserving stock again. complete() marks the
+key done in the same transaction that creates the order, so a key is never
+done without its order or the other way round. A checkout that fails
+release()s the key, leaving the client free to retry. A claim older than
+IDEMPOTENCY_LOCK_SECONDS (its request most likely died) is taken over.
+"""
+import hashlib
+import json
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+from database import settings
+
+
+def fingerprint(body: dict) -> str:
+    return hashlib.sha256(json.dumps(body, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def begin(db: Session, user_id: int, key: str, request_hash: str) -> Tuple[Optional[str], Optional[int]]:
+    """Claim `key` for this request.
+
+    Returns (owner, None) when the caller should go ahead, passing `owner` to
+    complete() or release(), or (None, order_id) when the key is done and the
+    order should be replayed. Raises 422 if the key was used for a different
+    request and 409 if the original is still running.
+    """
+    table = models.IdempotencyKey.__table__
+    ours = [table.c.user_id == user_id, table.c.key == key]
+    while True:
+        now = datetime.utcnow()
+        owner = uuid.uuid4().hex
+        try:
+            db.execute(insert(table).values(
+                user_id=user_id, key=key, request_hash=request_hash, status="in_progress",
+                owner=owner, created_at=now, locked_at=now,
+            ))
+            db.commit()
+            return owner, None
+        except IntegrityError:
+            db.rollback()
+
+        row = db.execute(select(table).where(*ours)).first()
+        if row is None:
+            # Released between our insert and this read
+            continue
+        expired = row.created_at < now - timedelta(seconds=settings.idempotency_ttl_seconds)
+        abandoned = row.status == "in_progress" and row.locked_at < now - timedelta(seconds=settings.idempotency_lock_seconds)
+        # A replayable key whose order has since been deleted is as good as expired
+        orphaned = row.status == "done" and row.order_id is None
+        if expired or abandoned or orphaned:
+            taken = db.execute(
+                update(table).where(*ours, table.c.owner == row.owner, table.c.status == row.status)
+                .values(
+                    request_hash=request_hash, status="in_progress", owner=owner, order_id=None,
+                    created_at=now, locked_at=now,
+                )
+            ).rowcount
+            db.commit()
+            if taken:
+                return owner, None
+            continue
+        if row.request_hash != request_hash:
+            db.rollback()
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        if row.status == "done":
+            return None, row.order_id
+        db.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail="A request with this Idempotency-Key is still being processed",
+            headers={"Retry-After": "1"},
+        )
+
+
+def complete(db: Session, user_id: int, key: str, owner: str, order_id: int) -> bool:
+    """Record `order_id` as the key's result in the caller's transaction; False if the claim was lost."""
+    table = models.IdempotencyKey.__table__
+    return bool(db.execute(
+        update(table)
+        .where(table.c.user_id == user_id, table.c.key == key, table.c.owner == owner, table.c.status == "in_progress")
+        .values(status="done", order_id=order_id)
+    ).rowcount)
+
+
+def release(db: Session, user_id: int, key: str, owner: str):
+    """Drop a claim whose request failed, so the client can try again with the same key."""
+    table = models.IdempotencyKey.__table__
+    db.execute(delete(table).where(
+        table.c.user_id == user_id, table.c.key == key, table.c.owner == owner, table.c.status == "in_progress",
+    ))
+    db.commit()
+
+
+def prune(db: Session) -> int:
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.idempotency_ttl_seconds)
+    removed = db.execute(
+        delete(models.IdempotencyKey).where(models.IdempotencyKey.created_at < cutoff)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return removed
@@ -0,0 +1,265 @@
+"""Cache invalidation across worker processes.
+
+Every uvicorn worker keeps its own in-process caches (catalog reads, auth
+tokens), so a change made through one worker would leave the others serving
+stale entries until their TTL ran out. Code that changes cached data calls
+publish(). publish() applies the event to this worker's caches at once and
+broadcasts it on the bus. The other workers apply it as soon as their
+run_listener() receives it.
+
+An event is a small JSON object:
+{"entity", "ids", "data", "version", "origin"}. The handler registered for
+the entity decides what to drop. If ids is None, the handler drops
+everything for that entity. version is the publish time in nanoseconds,
+which gives the delivery lag reported by stats().
+
+Backends (CACHE_BUS):
+    local     this process only, for a single worker and for tests
+    unix      datagrams between the workers on one host, through sockets in
+              CACHE_BUS_SOCKET_DIR
+    postgres  NOTIFY on CACHE_BUS_CHANNEL, which every worker on every host
+              LISTENs to
+The default, auto, uses postgres when DATABASE_URL is Postgres and local
+otherwise.
+
+A listener that loses its connection reconnects and then drops everything
+it caches, because it may have missed events while it was gone. A lost
+broadcast is never worse than the cache TTLs.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Callable, Dict, Iterable, Optional
+
+from sqlalchemy import text
+
+from database import engine, settings
+
+logger = logging.getLogger(__name__)
+
+HANDLERS: Dict[str, Callable[[Optional[list], Optional[list]], Optional[int]]] = {}
+# Identifies this process's events, which the postgres backend echoes back to it
+ORIGIN = uuid.uuid4().hex
+# pg_notify payloads must stay under 8000 bytes; larger events become "drop everything"
+MAX_MESSAGE_BYTES = 7900
+RECONNECT_SECONDS = 1.0
+
+_stats = {"published": 0, "received": 0, "broadcast_errors": 0, "handler_errors": 0, "last_lag_ms": None, "max_lag_ms": 0.0}
+
+
+def handler(entity: str):
+    """Register the decorated `fn(ids, data)` to drop cached entries for events about `entity`."""
+    def register(fn):
+        HANDLERS[entity] = fn
+        return fn
+    return register
+
+
+def apply(entity: str, ids: Optional[Iterable] = None, data: Optional[list] = None) -> Optional[int]:
+    """Run the local handler for an event without broadcasting it."""
+    fn = HANDLERS.get(entity)
+    if fn is None:
+        return None
+    return fn(None if ids is None else list(ids), data)
+
+
+def publish(entity: str, ids: Optional[Iterable] = None, data: Optional[list] = None) -> Optional[int]:
+    """Apply an event here and broadcast it to the other workers; returns what the local handler returned.
+
+    Call it after the change has committed, so that no worker can refill its
+    cache with the old data once it has handled the event.
+    """
+    ids = None if ids is None else list(ids)
+    result = apply(entity, ids, data)
+    message = _encode(entity, ids, data)
+    if len(message) > MAX_MESSAGE_BYTES:
+        message = _encode(entity, None, None)
+    try:
+        get_bus().send(message)
+        _stats["published"] += 1
+    except Exception:
+        # This worker is already up to date; the others catch up on their TTLs
+        _stats["broadcast_errors"] += 1
+        logger.warning("Could not broadcast %s cache invalidation", entity, exc_info=True)
+    return result
+
+
+def _encode(entity: str, ids: Optional[list], data: Optional[list]) -> bytes:
+    event = {"entity": entity, "ids": ids, "data": data, "version": time.time_ns(), "origin": ORIGIN}
+    return json.dumps(event, separators=(",", ":")).encode()
+
+
+def deliver(message: bytes):
+    """Apply an event received from the bus."""
+    try:
+        event = json.loads(message)
+        if event["origin"] == ORIGIN:
+            return
+        lag_ms = max((time.time_ns() - event["version"]) / 1e6, 0.0)
+        _stats["received"] += 1
+        _stats["last_lag_ms"] = round(lag_ms, 3)
+        _stats["max_lag_ms"] = round(max(_stats["max_lag_ms"], lag_ms), 3)
+        apply(event["entity"], event["ids"], event["data"])
+    except Exception:
+        _stats["handler_errors"] += 1
+        logger.exception("Could not apply cache invalidation %r", message[:200])
+
+
+def reset():
+    """Drop everything every handler caches, e.g. after events may have been missed."""
+    for entity in HANDLERS:
+        apply(entity)
+
+
+class LocalBus:
+    name = "local"
+
+    def send(self, message: bytes):
+        pass
+
+    async def listen(self, ready: Callable[[], None]):
+        ready()
+        await asyncio.Future()
+
+
+class UnixBus:
+    """One datagram socket per worker in a shared directory; send() writes to all the others."""
+
+    name = "unix"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, f"{os.getpid()}-{ORIGIN[:8]}.sock")
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sender.setblocking(False)
+
+    def send(self, message: bytes):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if path == self.path or not name.endswith(".sock"):
+                continue
+            try:
+                self._sender.sendto(message, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Its worker exited without cleaning up
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            except BlockingIOError:
+                logger.warning("Cache invalidation socket %s is full; dropping an event for it", path)
+
+    async def listen(self, ready: Callable[[], None]):
+        os.makedirs(self.directory, exist_ok=True)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        try:
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            sock.bind(self.path)
+            ready()
+            loop = asyncio.get_running_loop()
+            while True:
+                deliver(await loop.sock_recv(sock, 65536))
+        finally:
+            sock.close()
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+
+class PostgresBus:
+    """NOTIFY to publish; a dedicated autocommit connection LISTENs, read from the event loop."""
+
+    name = "postgres"
+
+    def __init__(self, channel: str):
+        self.channel = channel
+
+    def send(self, message: bytes):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": self.channel, "payload": message.decode()})
+            conn.commit()
+
+    async def listen(self, ready: Callable[[], None]):
+        raw = await asyncio.to_thread(engine.raw_connection)
+        # Held for as long as the worker runs, so keep it out of the pool
+        raw.detach()
+        loop = asyncio.get_running_loop()
+        lost = loop.create_future()
+        conn = raw.driver_connection
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute('LISTEN "{}"'.format(self.channel.replace('"', '""')))
+
+            def readable():
+                try:
+                    conn.poll()
+                except Exception as e:
+                    if not lost.done():
+                        lost.set_exception(e)
+                    return
+                while conn.notifies:
+                    deliver(conn.notifies.pop(0).payload.encode())
+
+            loop.add_reader(conn.fileno(), readable)
+            try:
+                ready()
+                await lost
+            finally:
+                loop.remove_reader(conn.fileno())
+        finally:
+            raw.close()
+
+
+_bus = None
+
+
+def get_bus():
+    global _bus
+    if _bus is None:
+        kind = settings.cache_bus
+        if kind == "auto":
+            kind = "postgres" if engine.dialect.name == "postgresql" else "local"
+        if kind == "postgres":
+            _bus = PostgresBus(settings.cache_bus_channel)
+        elif kind == "unix":
+            _bus = UnixBus(settings.cache_bus_socket_dir)
+        elif kind == "local":
+            _bus = LocalBus()
+        else:
+            raise ValueError(f"Unknown CACHE_BUS {settings.cache_bus!r}")
+    return _bus
+
+
+async def run_listener():
+    """Apply events from the other workers until cancelled, reconnecting after failures."""
+    bus = get_bus()
+    connected = False
+
+    def ready():
+        nonlocal connected
+        if connected:
+            reset()
+        connected = True
+
+    while True:
+        try:
+            await bus.listen(ready)
+        except Exception:
+            logger.exception("Cache invalidation listener (%s) failed; reconnecting", bus.name)
+        await asyncio.sleep(RECONNECT_SECONDS)
+
+
+def stats() -> dict:
+    return {"backend": get_bus().name, "origin": ORIGIN, **_stats}
@@ -0,0 +1,273 @@
+"""Invoice rendering, a content-addressed on-disk PDF cache and streamed bulk exports.
+
+Rendering works on plain dicts (see invoice_data) so it can run in a worker
+process; the cache key is a digest of that dict, which includes the order
+version, so any change to the order yields a new file and stale PDFs are
+never served.
+"""
+import asyncio
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time, timedelta
+from typing import List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, selectinload
+
+import models
+from database import SessionLocal, settings
+
+# Bump when the layout changes so previously cached PDFs stop matching
+LAYOUT_VERSION = 2
+
+PAGE_TOP = 750
+BOTTOM_MARGIN = 72
+ROW_HEIGHT = 20
+
+# Invoices need the customer and every item's product; one query per order either way
+INVOICE_DETAIL_LOADER = (joinedload(models.Order.user), joinedload(models.Order.items).joinedload(models.OrderItem.product))
+INVOICE_BATCH_LOADER = (joinedload(models.Order.user), selectinload(models.Order.items).selectinload(models.OrderItem.product))
+
+
+def invoice_data(order: models.Order) -> dict:
+    """Everything an invoice shows, detached from the session and safe to pickle."""
+    return {
+        "id": order.id,
+        "version": order.version,
+        "created_at": order.created_at.strftime('%Y-%m-%d %H:%M:%S') if order.created_at else "",
+        "status": order.status,
+        "email": order.user.email if order.user else "",
+        "total_amount": order.total_amount or 0.0,
+        "items": [
+            [item.product.name if item.product else f"Product {item.product_id}", item.quantity, item.price]
+            for item in order.items
+        ],
+    }
+
+
+def invoice_digest(data: dict) -> str:
+    payload = json.dumps([LAYOUT_VERSION, data], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _draw_header(p, data: dict, page: int) -> int:
+    p.setFont("Helvetica-Bold", 20)
+    p.drawString(50, PAGE_TOP, "INVOICE")
+    p.setFont("Helvetica", 10)
+    p.drawRightString(560, PAGE_TOP, f"Page {page}")
+
+    y = PAGE_TOP - 30
+    p.setFont("Helvetica", 12)
+    if page == 1:
+        p.drawString(50, y, f"Order ID: {data['id']}")
+        p.drawString(50, y - 20, f"Date: {data['created_at']}")
+        p.drawString(50, y - 40, f"Status: {data['status']}")
+        p.drawString(50, y - 60, f"Customer Email: {data['email']}")
+        y -= 100
+    else:
+        p.drawString(50, y, f"Order ID: {data['id']} (continued)")
+        y -= 40
+
+    p.setFont("Helvetica-Bold", 12)
+    p.drawString(50, y, "Item")
+    p.drawString(300, y, "Qty")
+    p.drawString(400, y, "Price")
+    p.drawString(500, y, "Total")
+    p.setFont("Helvetica", 12)
+    return y - ROW_HEIGHT
+
+
+def render_invoice(data: dict) -> bytes:
+    """Lay the invoice out over as many pages as its items need."""
+    # Imported here, not at the top, to keep reportlab off the app's startup path
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer, pagesize=letter)
+    page = 1
+    y = _draw_header(p, data, page)
+
+    for name, quantity, price in data["items"]:
+        if y < BOTTOM_MARGIN:
+            p.showPage()
+            page += 1
+            y = _draw_header(p, data, page)
+        p.drawString(50, y, name if len(name) <= 38 else name[:37] + "…")
+        p.drawString(300, y, str(quantity))
+        p.drawString(400, y, f"${price:.2f}")
+        p.drawString(500, y, f"${(price * quantity):.2f}")
+        y -= ROW_HEIGHT
+
+    # The total needs two rows of space
+    if y - ROW_HEIGHT < BOTTOM_MARGIN:
+        p.showPage()
+        page += 1
+        y = _draw_header(p, data, page)
+    y -= ROW_HEIGHT
+    p.setFont("Helvetica-Bold", 14)
+    p.drawString(400, y, "Total Amount:")
+    p.drawString(500, y, f"${data['total_amount']:.2f}")
+
+    p.showPage()
+    p.save()
+    return buffer.getvalue()
+
+
+class InvoiceCache:
+    """PDFs on disk named by their content digest; oldest files are pruned past `max_files`."""
+
+    def __init__(self, directory: str, max_files: int):
+        self.directory = directory
+        self.max_files = max_files
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}.pdf")
+
+    def get(self, digest: str) -> Optional[str]:
+        path = self.path(digest)
+        return path if os.path.exists(path) else None
+
+    def put(self, digest: str, pdf: bytes) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(pdf)
+        path = self.path(digest)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._writes += 1
+            should_prune = self._writes % 100 == 0
+        if should_prune:
+            self.prune()
+        return path
+
+    def prune(self):
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith(".pdf")]
+        except FileNotFoundError:
+            return
+        if len(entries) <= self.max_files:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_files]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+invoice_cache = InvoiceCache(settings.invoice_cache_dir, settings.invoice_cache_max_files)
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+
+def render_pool() -> ProcessPoolExecutor:
+    """Worker processes for bulk rendering, started on first use."""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = ProcessPoolExecutor(
+                max_workers=settings.invoice_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _render_pool
+
+
+def cached_invoice(data: dict) -> str:
+    """Path of the PDF for `data`, rendering it on a cache miss."""
+    digest = invoice_digest(data)
+    return invoice_cache.get(digest) or invoice_cache.put(digest, render_invoice(data))
+
+
+def _load_batch(order_ids: Optional[List[int]], start: Optional[date], end: Optional[date], after_id: int, limit: int) -> list:
+    db = SessionLocal()
+    try:
+        statement = (
+            select(models.Order)
+            .options(*INVOICE_BATCH_LOADER)
+            .where(models.Order.id > after_id)
+            .order_by(models.Order.id)
+            .limit(limit)
+        )
+        if order_ids:
+            statement = statement.where(models.Order.id.in_(order_ids))
+        if start:
+            statement = statement.where(models.Order.created_at >= datetime.combine(start, time.min))
+        if end:
+            statement = statement.where(models.Order.created_at < datetime.combine(end + timedelta(days=1), time.min))
+        return [invoice_data(order) for order in db.scalars(statement).unique().all()]
+    finally:
+        db.close()
+
+
+class _ChunkBuffer:
+    """Write-only sink for ZipFile that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def stream_invoice_zip(order_ids: Optional[List[int]] = None, start: Optional[date] = None, end: Optional[date] = None, batch_size: int = 50):
+    """Yield a ZIP of invoices chunk by chunk; cache misses render in the process pool."""
+    buffer = _ChunkBuffer()
+    archive = zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED)
+    after_id = 0
+    exported = 0
+    while exported < settings.invoice_export_max_orders:
+        limit = min(batch_size, settings.invoice_export_max_orders - exported)
+        batch = await run_in_threadpool(_load_batch, order_ids, start, end, after_id, limit)
+        if not batch:
+            break
+
+        pending = []
+        for data in batch:
+            digest = invoice_digest(data)
+            path = invoice_cache.get(digest)
+            if path is None:
+                pending.append((data, digest, asyncio.wrap_future(render_pool().submit(render_invoice, data))))
+            else:
+                pending.append((data, digest, path))
+
+        for data, digest, source in pending:
+            if isinstance(source, str):
+                pdf = await run_in_threadpool(_read_file, source)
+            else:
+                pdf = await source
+                await run_in_threadpool(invoice_cache.put, digest, pdf)
+            archive.writestr(f"invoice_{data['id']}.pdf", pdf)
+            yield buffer.drain()
+
+        exported += len(batch)
+        after_id = batch[-1]["id"]
+
+    archive.close()
+    yield buffer.drain()
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
@@ -0,0 +1,384 @@
+"""Background jobs for the slow side-effects of requests, queued in the jobs table.
+
+A request calls enqueue() inside its own transaction, so the job exists if and
+only if the change that caused it commits, and returns without doing the work.
+Workers claim due jobs (FOR UPDATE SKIP LOCKED on Postgres), run the handler
+registered for the job's kind and mark the job done in the handler's own
+transaction. A failed job is retried with exponential backoff until it has
+used max_attempts, then left as failed for GET /admin/jobs to show. A worker
+that dies mid-job loses its lease after JOB_LEASE_SECONDS and the job runs
+again, so handlers must be safe to repeat.
+
+The app runs run_worker() in-process unless JOB_WORKER_IN_APP is off;
+`python jobs.py` runs a standalone worker.
+"""
+import asyncio
+import logging
+import os
+import random
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+import idempotency, invoices, models, stats
+from database import SessionLocal, settings
+
+logger = logging.getLogger(__name__)
+
+HANDLERS: Dict[str, Callable[[Session, dict], None]] = {}
+FINISHED = ("done", "failed")
+LATENCY_SAMPLE = 1000
+PRUNE_EVERY = timedelta(hours=1)
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler for a failure retrying cannot fix; the job fails at once."""
+
+
+def handler(kind: str):
+    """Register the decorated `fn(db, payload)` as the handler for jobs of `kind`."""
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def enqueue(
+    db: Session,
+    kind: str,
+    payload: Optional[dict] = None,
+    key: Optional[str] = None,
+    delay_seconds: float = 0,
+    max_attempts: Optional[int] = None,
+    rerun_finished: bool = False,
+) -> int:
+    """Queue a job in `db`'s transaction (the caller commits) and return its id.
+
+    With a `key`, a job already queued under that key is returned instead of
+    adding another; `rerun_finished` queues it again if it is done or failed.
+    """
+    now = datetime.utcnow()
+    values = {
+        "kind": kind,
+        "payload": payload or {},
+        "status": "queued",
+        "idempotency_key": key,
+        "attempts": 0,
+        "max_attempts": max_attempts or settings.job_max_attempts,
+        "run_at": now + timedelta(seconds=delay_seconds),
+        "created_at": now,
+    }
+    if key is None:
+        job = models.Job(**values)
+        db.add(job)
+        db.flush()
+        return job.id
+
+    table = models.Job.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert_fn = pg_insert if dialect == "postgresql" else sqlite_insert
+        statement = insert_fn(table).values(**values)
+        if rerun_finished:
+            statement = statement.on_conflict_do_update(
+                index_elements=["idempotency_key"],
+                set_={
+                    "status": "queued", "attempts": 0, "run_at": values["run_at"],
+                    "claimed_by": None, "started_at": None, "finished_at": None, "last_error": None,
+                },
+                where=table.c.status.in_(FINISHED),
+            )
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=["idempotency_key"])
+        db.execute(statement)
+    else:
+        existing = db.scalar(select(table.c.status).where(table.c.idempotency_key == key))
+        if existing is None:
+            db.execute(insert(table).values(**values))
+        elif rerun_finished and existing in FINISHED:
+            db.execute(update(table).where(table.c.idempotency_key == key).values(
+                status="queued", attempts=0, run_at=values["run_at"],
+                claimed_by=None, started_at=None, finished_at=None, last_error=None,
+            ))
+    return db.scalar(select(table.c.id).where(table.c.idempotency_key == key))
+
+
+def _reclaim_expired(db: Session, now: datetime):
+    """Requeue jobs running for longer than the lease (their worker most likely died), or fail them if out of attempts."""
+    job = models.Job
+    expired = [job.status == "running", job.started_at < now - timedelta(seconds=settings.job_lease_seconds)]
+    db.execute(
+        update(job).where(*expired, job.attempts >= job.max_attempts)
+        .values(status="failed", finished_at=now, claimed_by=None, last_error="Lease expired")
+        .execution_options(synchronize_session=False)
+    )
+    db.execute(
+        update(job).where(*expired)
+        .values(status="queued", claimed_by=None, last_error="Lease expired")
+        .execution_options(synchronize_session=False)
+    )
+
+
+def claim(db: Session, worker_id: str, limit: int) -> list:
+    """Lease up to `limit` due jobs to this worker; returns (id, kind, payload, attempts, max_attempts, token) rows."""
+    job = models.Job
+    now = datetime.utcnow()
+    _reclaim_expired(db, now)
+    token = f"{worker_id}:{uuid.uuid4().hex}"
+    due = (
+        select(job.id)
+        .where(job.status == "queued", job.run_at <= now)
+        .order_by(job.run_at, job.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    db.execute(
+        update(job)
+        .where(job.id.in_(due), job.status == "queued")
+        .values(status="running", claimed_by=token, started_at=now, attempts=job.attempts + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return db.execute(
+        select(job.id, job.kind, job.payload, job.attempts, job.max_attempts, job.claimed_by)
+        # status keeps this on ix_jobs_status_run_at rather than a scan for the token
+        .where(job.status == "running", job.claimed_by == token)
+        .order_by(job.run_at, job.id)
+    ).all()
+
+
+def retry_delay(attempts: int) -> float:
+    """Seconds before the next try: exponential in the attempts so far, with jitter so retries spread out."""
+    return settings.job_retry_base_seconds * 2 ** (attempts - 1) * random.uniform(0.5, 1.5)
+
+
+def run_job(row) -> bool:
+    """Run one claimed job in its own session; True if it finished."""
+    job = models.Job
+    job_id, kind, payload, attempts, max_attempts, token = row
+    leased = [job.id == job_id, job.claimed_by == token]
+    db = SessionLocal()
+    try:
+        fn = HANDLERS.get(kind)
+        if fn is None:
+            raise PermanentJobError(f"No handler for job kind {kind!r}")
+        fn(db, payload)
+        # Done in the handler's transaction, and only if the lease is still ours
+        finished = db.execute(
+            update(job).where(*leased)
+            .values(status="done", finished_at=datetime.utcnow(), claimed_by=None, last_error=None)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not finished:
+            db.rollback()
+            logger.warning("Job %s (%s) lost its lease; another worker will run it", job_id, kind)
+            return False
+        db.commit()
+        return True
+    except Exception as exc:
+        db.rollback()
+        error = f"{type(exc).__name__}: {exc}"[:2000]
+        now = datetime.utcnow()
+        if isinstance(exc, PermanentJobError) or attempts >= max_attempts:
+            logger.exception("Job %s (%s) failed for good after %d attempts", job_id, kind, attempts)
+            values = {"status": "failed", "finished_at": now}
+        else:
+            logger.warning("Job %s (%s) failed on attempt %d: %s", job_id, kind, attempts, error)
+            values = {"status": "queued", "run_at": now + timedelta(seconds=retry_delay(attempts))}
+        db.execute(
+            update(job).where(*leased).values(claimed_by=None, last_error=error, **values)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        return False
+    finally:
+        db.close()
+
+
+def prune(db: Session) -> int:
+    cutoff = datetime.utcnow() - timedelta(days=settings.job_retention_days)
+    removed = db.execute(
+        delete(models.Job).where(models.Job.status == "done", models.Job.finished_at < cutoff)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return removed
+
+
+def _housekeeping():
+    """Delete finished jobs and expired checkout idempotency keys."""
+    db = SessionLocal()
+    try:
+        prune(db)
+        idempotency.prune(db)
+    finally:
+        db.close()
+
+
+def work_batch(worker_id: str, limit: Optional[int] = None) -> int:
+    """Claim and run one batch of due jobs; returns how many were claimed."""
+    db = SessionLocal()
+    try:
+        rows = claim(db, worker_id, limit or settings.job_batch_size)
+    finally:
+        db.close()
+    for row in rows:
+        run_job(row)
+    return len(rows)
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def run_worker(poll_seconds: Optional[float] = None):
+    """Run due jobs until cancelled; each batch runs in the threadpool."""
+    poll_seconds = poll_seconds or settings.job_poll_seconds
+    name = worker_id()
+    last_prune = None
+    while True:
+        claimed = 0
+        try:
+            claimed = await run_in_threadpool(work_batch, name)
+            if last_prune is None or datetime.utcnow() - last_prune > PRUNE_EVERY:
+                last_prune = datetime.utcnow()
+                await run_in_threadpool(_housekeeping)
+        except Exception:
+            logger.exception("Job worker batch failed")
+        # Keep draining while there is a backlog
+        if not claimed:
+            await asyncio.sleep(poll_seconds)
+
+
+def _percentile(values: list, fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    return round(values[min(len(values) - 1, int(len(values) * fraction))], 3)
+
+
+def queue_stats(db: Session) -> dict:
+    """Queue depth by status and kind, the age of the oldest due job, and latencies of recent jobs."""
+    job = models.Job
+    now = datetime.utcnow()
+    by_status, by_kind = {}, {}
+    for status, kind, count in db.execute(select(job.status, job.kind, func.count()).group_by(job.status, job.kind)):
+        by_status[status] = by_status.get(status, 0) + count
+        by_kind.setdefault(kind, {})[status] = count
+    oldest_due = db.scalar(select(func.min(job.run_at)).where(job.status == "queued", job.run_at <= now))
+
+    recent = db.execute(
+        select(job.run_at, job.started_at, job.finished_at)
+        .where(job.status == "done", job.finished_at.is_not(None))
+        .order_by(job.finished_at.desc())
+        .limit(LATENCY_SAMPLE)
+    ).all()
+    # Waiting: due until picked up; total: due until done
+    waits = sorted(max((started - run_at).total_seconds(), 0) for run_at, started, _ in recent)
+    totals = sorted(max((finished - run_at).total_seconds(), 0) for run_at, _, finished in recent)
+    failures = db.execute(
+        select(job.id, job.kind, job.attempts, job.last_error, job.finished_at)
+        .where(job.status == "failed")
+        .order_by(job.finished_at.desc())
+        .limit(10)
+    ).all()
+    return {
+        "by_status": {status: by_status.get(status, 0) for status in ("queued", "running", "done", "failed")},
+        "by_kind": by_kind,
+        "oldest_due_seconds": round((now - oldest_due).total_seconds(), 3) if oldest_due else 0.0,
+        "latency_seconds": {
+            "sample": len(recent),
+            "wait_p50": _percentile(waits, 0.5),
+            "wait_p95": _percentile(waits, 0.95),
+            "total_p50": _percentile(totals, 0.5),
+            "total_p95": _percentile(totals, 0.95),
+        },
+        "recent_failures": [
+            {"id": id_, "kind": kind, "attempts": attempts, "error": error, "failed_at": failed_at}
+            for id_, kind, attempts, error, failed_at in failures
+        ],
+    }
+
+
+def retry(db: Session, job_id: int) -> bool:
+    """Queue a failed job again with fresh attempts; False if it is not failed."""
+    retried = db.execute(
+        update(models.Job)
+        .where(models.Job.id == job_id, models.Job.status == "failed")
+        .values(status="queued", attempts=0, run_at=datetime.utcnow(), finished_at=None, last_error=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return bool(retried)
+
+
+@handler("order.placed")
+def _order_placed(db: Session, payload: dict):
+    """Revenue aggregates for a new order; `lines` are as of checkout."""
+    order_id = payload["order_id"]
+    # Claiming the marker locks the row, so a concurrent status change either
+    # lands first (and is counted here) or sees the order as recorded
+    status = db.execute(
+        update(models.Order)
+        .where(models.Order.id == order_id, models.Order.stats_recorded.is_(False))
+        .values(stats_recorded=True)
+        .returning(models.Order.status)
+        .execution_options(synchronize_session=False)
+    ).scalar_one_or_none()
+    if status is None:
+        # Gone, or counted by an earlier run
+        return
+    stats.record_order(db, db.get(models.Order, order_id), payload["lines"], status=status)
+    enqueue(db, "invoice.render", {"order_id": order_id})
+
+
+@handler("order.mark_processing")
+def _mark_processing(db: Session, payload: dict):
+    order_id = payload["order_id"]
+    recorded = db.execute(
+        update(models.Order)
+        .where(models.Order.id == order_id, models.Order.status == "Pending")
+        .values(status="Processing", version=models.Order.version + 1)
+        .returning(models.Order.stats_recorded)
+        .execution_options(synchronize_session=False)
+    ).scalar_one_or_none()
+    if recorded is None:
+        # Already moved on, e.g. an admin set another status first
+        return
+    if recorded:
+        # Otherwise order.placed has yet to run and counts it as Processing
+        stats.record_status_change(db, db.get(models.Order, order_id), "Pending")
+    # The invoice shows the status, so the cached one is stale now
+    enqueue(db, "invoice.render", {"order_id": order_id})
+
+
+@handler("invoice.render")
+def _render_invoice(db: Session, payload: dict):
+    order = db.scalars(
+        select(models.Order).options(*invoices.INVOICE_DETAIL_LOADER).where(models.Order.id == payload["order_id"])
+    ).unique().first()
+    if order is not None:
+        invoices.cached_invoice(invoices.invoice_data(order))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run queued background jobs.")
+    parser.add_argument("--once", action="store_true", help="run the jobs that are due now, then exit")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.once:
+        total = 0
+        while claimed := work_batch(worker_id()):
+            total += claimed
+        print(f"{total} jobs run")
+    else:
+        asyncio.run(run_worker())
@@ -1,14 +1,47 @@
-from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request, Depends, Header, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from sqlalchemy.orm import Session
+from contextlib import asynccontextmanager, suppress
+from typing import Optional
+import asyncio
+import secrets
 import traceback
-from database import engine, Base
+import time
+from database import engine, async_engine, async_replicas, replicas, get_db, pool_statuses, settings
 from routers import auth, products, orders, admin
+import pricing, metrics, jobs, invalidation, startup
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Create database tables, unless Alembic manages them
+startup.ensure_schema(engine)
 
-app = FastAPI(title="Qmexai API", version="1.0.0")
+metrics.instrument_engine(engine)
+if async_engine is not None:
+    metrics.instrument_engine(async_engine)
+for replica in replicas.engines + async_replicas.engines:
+    metrics.instrument_engine(replica)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = [asyncio.create_task(startup.warm_up(app)), asyncio.create_task(invalidation.run_listener())]
+    if settings.price_rule_poll_seconds > 0:
+        # Every worker runs the scheduler and notices the boundary itself, so there is nothing to broadcast
+        tasks.append(asyncio.create_task(pricing.run_scheduler(on_change=lambda: invalidation.apply("product"))))
+    if settings.job_worker_in_app:
+        tasks.append(asyncio.create_task(jobs.run_worker()))
+    yield
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+app = FastAPI(title="Qmexai API", version="1.0.0", lifespan=lifespan)
+
+# Compress everything else that is large enough; cached catalog reads arrive
+# already encoded (see routers/products.py) and pass through untouched
+if settings.compression_min_bytes:
+    app.add_middleware(GZipMiddleware, minimum_size=settings.compression_min_bytes, compresslevel=6)
 
 # Configure CORS for frontend access
 app.add_middleware(
@@ -24,6 +57,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so the timings cover the other middleware too
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    with metrics.track_request(request.method) as profile:
+        try:
+            response = await call_next(request)
+        finally:
+            # The route template, not the raw path, keeps label cardinality bounded
+            route = request.scope.get("route")
+            if route is not None:
+                profile.route = route.path
+        profile.status = response.status_code
+        response.headers["Server-Timing"] = metrics.server_timing(profile)
+        return response
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     error_msg = str(exc)
@@ -52,16 +100,40 @@ async def global_exception_handler(request: Request, exc: Exception):
 @app.get("/debug-db")
 def debug_db(db: Session = Depends(get_db)):
     try:
-        # Try a simple query
+        # Round-trip through a pooled connection and report what the pool looks like
         from sqlalchemy import text
+        started = time.perf_counter()
         db.execute(text("SELECT 1"))
-        return {"status": "success", "message": "Database connection is working!"}
+        latency_ms = round((time.perf_counter() - started) * 1000, 3)
+        return {
+            "status": "success",
+            "message": "Database connection is working!",
+            "round_trip_ms": latency_ms,
+            "pools": pool_statuses(),
+        }
     except Exception as e:
         return JSONResponse(
             status_code=500,
-            content={"status": "error", "message": str(e), "traceback": traceback.format_exc()}
+            content={"status": "error", "message": str(e), "pools": pool_statuses(), "traceback": traceback.format_exc()}
         )
 
+@app.get("/ready", include_in_schema=False)
+def ready():
+    status = startup.readiness()
+    if status["ready"]:
+        return status
+    return JSONResponse(status_code=503, content=status, headers={"Retry-After": "1"})
+
+def require_metrics_token(authorization: Optional[str] = Header(None)):
+    if not settings.metrics_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest((authorization or "").encode(), f"Bearer {settings.metrics_token}".encode()):
+        raise HTTPException(status_code=401, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"})
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_metrics_token)])
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 app.include_router(auth.router)
 app.include_router(products.router)
 app.include_router(orders.router)
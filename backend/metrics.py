@@ -0,0 +1,217 @@
+"""Request timing, per-request SQL profiling and Prometheus metrics.
+
+main.py wraps every request in track_request(), which counts the request,
+times it and collects the SQL statements it runs through the cursor events
+instrument_engine() hooks on each engine. The totals go to:
+
+- /metrics, in the Prometheus text format (render()), for scrapers that
+  send METRICS_TOKEN as a bearer token;
+- a Server-Timing header on the response (server_timing());
+- the "slow_requests" log, with every statement, for requests slower than
+  SLOW_REQUEST_MS.
+
+Metrics are kept per process; with several workers each one reports its own.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+from sqlalchemy import event
+
+from database import pool_statuses, settings
+
+logger = logging.getLogger("slow_requests")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+MAX_LOGGED_STATEMENTS = 100
+
+
+class RequestProfile:
+    """What one request spent in the database; the cursor events add to it."""
+
+    def __init__(self, capture: bool):
+        self.started = time.perf_counter()
+        # Filled in by the middleware once routing has happened
+        self.route = "unmatched"
+        self.status = 500
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements: Optional[List[tuple]] = [] if capture else None
+
+    def record(self, statement: str, seconds: float):
+        self.queries += 1
+        self.db_seconds += seconds
+        if self.statements is not None and len(self.statements) < MAX_LOGGED_STATEMENTS:
+            self.statements.append((round(seconds * 1000, 3), statement))
+
+
+_profile: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+
+class Registry:
+    """Counters and histograms keyed by label tuples, guarded by one lock."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.requests = {}  # (method, route, status) -> count
+        self.latency = {}  # (method, route) -> Histogram of seconds
+        self.queries = {}  # (method, route) -> Histogram of statements per request
+        self.db_seconds = {}  # (method, route) -> seconds
+        self.slow_requests = 0
+
+    def start(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finish(self, method: str, route: str, status: int, seconds: float, profile: RequestProfile, slow: bool):
+        key = (method, route)
+        with self._lock:
+            self.in_flight -= 1
+            self.requests[key + (str(status),)] = self.requests.get(key + (str(status),), 0) + 1
+            self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.queries.setdefault(key, Histogram(QUERY_BUCKETS)).observe(profile.queries)
+            self.db_seconds[key] = self.db_seconds.get(key, 0.0) + profile.db_seconds
+            if slow:
+                self.slow_requests += 1
+
+
+registry = Registry()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    profile = _profile.get()
+    if profile is not None:
+        profile.record(statement, time.perf_counter() - started)
+
+
+def _handle_error(context):
+    # after_cursor_execute never fires for a failed statement; drop its start time
+    if context.connection is not None and context.connection.info.get("query_started"):
+        context.connection.info["query_started"].pop()
+
+
+def instrument_engine(engine):
+    """Attribute the statements run on `engine` (sync, or an AsyncEngine's sync_engine) to the current request."""
+    target = getattr(engine, "sync_engine", engine)
+    if not event.contains(target, "before_cursor_execute", _before_cursor_execute):
+        event.listen(target, "before_cursor_execute", _before_cursor_execute)
+        event.listen(target, "after_cursor_execute", _after_cursor_execute)
+        event.listen(target, "handle_error", _handle_error)
+
+
+@contextmanager
+def track_request(method: str):
+    """Profile the request running inside the block; set `.route` and `.status` on the yielded profile."""
+    profile = RequestProfile(capture=settings.slow_request_ms > 0)
+    token = _profile.set(profile)
+    registry.start()
+    try:
+        yield profile
+    finally:
+        _profile.reset(token)
+        seconds = time.perf_counter() - profile.started
+        slow = 0 < settings.slow_request_ms <= seconds * 1000
+        registry.finish(method, profile.route, profile.status, seconds, profile, slow)
+        if slow:
+            message = "%s %s -> %s in %.1f ms, %d queries, %.1f ms in the database"
+            args = [method, profile.route, profile.status, seconds * 1000, profile.queries, profile.db_seconds * 1000]
+            for ms, statement in profile.statements:
+                message += "\n  [%s ms] %s"
+                args += [ms, statement]
+            logger.warning(message, *args)
+
+
+def server_timing(profile: RequestProfile) -> str:
+    app_ms = (time.perf_counter() - profile.started) * 1000
+    return f'app;dur={app_ms:.1f}, db;dur={profile.db_seconds * 1000:.1f};desc="{profile.queries} queries"'
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _histogram_lines(name: str, histograms: dict) -> list:
+    lines = []
+    for (method, route), histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(method=method, route=route, le=bound)} {cumulative}")
+        lines.append(f"{name}_sum{_labels(method=method, route=route)} {histogram.total}")
+        lines.append(f"{name}_count{_labels(method=method, route=route)} {cumulative}")
+    return lines
+
+
+def render() -> str:
+    """Everything in the Prometheus text exposition format (0.0.4)."""
+    with registry._lock:
+        lines = [
+            "# HELP http_requests_in_flight Requests currently being served.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {registry.in_flight}",
+            "# HELP http_requests_total Requests served, by route template and status code.",
+            "# TYPE http_requests_total counter",
+        ]
+        lines += [
+            f"http_requests_total{_labels(method=m, route=r, status=s)} {count}"
+            for (m, r, s), count in sorted(registry.requests.items())
+        ]
+        lines += [
+            "# HELP http_request_duration_seconds Request latency.",
+            "# TYPE http_request_duration_seconds histogram",
+        ] + _histogram_lines("http_request_duration_seconds", registry.latency)
+        lines += [
+            "# HELP http_request_db_queries SQL statements run per request.",
+            "# TYPE http_request_db_queries histogram",
+        ] + _histogram_lines("http_request_db_queries", registry.queries)
+        lines += [
+            "# HELP http_request_db_seconds_total Time spent executing SQL, by route.",
+            "# TYPE http_request_db_seconds_total counter",
+        ] + [
+            f"http_request_db_seconds_total{_labels(method=m, route=r)} {seconds}"
+            for (m, r), seconds in sorted(registry.db_seconds.items())
+        ]
+        lines += [
+            "# HELP http_slow_requests_total Requests slower than SLOW_REQUEST_MS.",
+            "# TYPE http_slow_requests_total counter",
+            f"http_slow_requests_total {registry.slow_requests}",
+        ]
+
+    pools = pool_statuses()
+    for metric, key, kind, help_text in (
+        ("db_pool_checked_out", "checked_out", "gauge", "Connections currently checked out."),
+        ("db_pool_idle", "idle", "gauge", "Idle connections in the pool."),
+        ("db_pool_checkout_timeouts_total", "checkout_timeouts", "counter", "Checkouts that timed out waiting for a connection."),
+        ("db_pool_connections_opened_total", "connections_opened", "counter", "Connections the pool has opened."),
+    ):
+        samples = [(name, status[key]) for name, status in pools.items() if key in status]
+        if samples:
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+            lines += [f"{metric}{_labels(engine=name)} {value}" for name, value in samples]
+    return "\n".join(lines) + "\n"
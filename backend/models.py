@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Boolean, DateTime, JSON
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Boolean, Date, DateTime, Index, JSON, Table, func, select, true
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 class User(Base):
     __tablename__ = "users"
@@ -25,12 +26,128 @@ class Product(Base):
     fabric = Column(String, nullable=True)
     rating = Column(Float, default=0.0)
     category = Column(String, index=True) # Men, Women, Kids
-    tags = Column(String, index=True) # e.g. "New Arrival"
+    # Display copy of tag_list, e.g. "New Arrival, Trending"; the search index reads it.
+    # Filter through tag_list, which is indexed.
+    tags = Column(String)
     mrp = Column(Float, default=0.0)
     discount_percentage = Column(Float, default=0.0)
     discount_price = Column(Float)
-    photos = Column(JSON, default=list) # Array of Cloudflare R2 URLs
+    # What listings sort and filter on and checkout charges: discount_price,
+    # or the winning active price rule's price when lower. Maintained by pricing.py.
+    effective_price = Column(Float)
     stock = Column(Integer, default=0)
+    # Bumped on every write that changes the serialized product; feeds the catalog ETags
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # The product_facets row this product is counted in; see facets.py
+    facet_key = Column(String, nullable=True)
+
+    # Composite indexes backing the keyset listing in routers/products.py.
+    # Each sort key is paired with `id` as the tie-breaker so a cursor
+    # (sort_key, id) resumes with a single index range scan. The listing sorts
+    # on coalesce(key, 0), so the indexes are on that expression.
+    __table_args__ = (
+        Index("ix_products_effective_price_id", func.coalesce(effective_price, 0), "id"),
+        Index("ix_products_rating_id", func.coalesce(rating, 0), "id"),
+        Index("ix_products_category_id", "category", "id"),
+        Index("ix_products_category_effective_price_id", "category", func.coalesce(effective_price, 0), "id"),
+        Index("ix_products_category_rating_id", "category", func.coalesce(rating, 0), "id"),
+        Index("ix_products_color_effective_price_id", "color", func.coalesce(effective_price, 0), "id"),
+        Index("ix_products_fabric_effective_price_id", "fabric", func.coalesce(effective_price, 0), "id"),
+    )
+
+    tag_list = relationship("Tag", secondary="product_tags", order_by="Tag.name")
+    images = relationship("ProductPhoto", order_by="ProductPhoto.position", cascade="all, delete-orphan")
+
+    @property
+    def photos(self):
+        return [image.url for image in self.images]
+
+    @photos.setter
+    def photos(self, urls):
+        self.images = [ProductPhoto.from_url(url, position) for position, url in enumerate(urls or [])]
+
+    @property
+    def thumbnail(self):
+        return self.images[0].thumbnail_url if self.images else None
+
+    @property
+    def selling_price(self):
+        return self.effective_price if self.effective_price is not None else self.discount_price
+
+class Tag(Base):
+    __tablename__ = "tags"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    slug = Column(String, nullable=False, unique=True, index=True) # lower-cased name
+
+product_tags = Table(
+    "product_tags",
+    Base.metadata,
+    Column("product_id", Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True),
+    Column("tag_id", Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True),
+    # Tag filters look products up by tag
+    Index("ix_product_tags_tag_id_product_id", "tag_id", "product_id"),
+)
+
+def products_tagged(slug: str):
+    """Ids of the products carrying the tag with this slug, for `Product.id.in_(...)`."""
+    return select(product_tags.c.product_id).join(Tag).where(Tag.slug == slug)
+
+# Scheduled discounts. A rule applies to every product matching all of its
+# set selectors while starts_at <= now < ends_at; pricing.py folds the
+# winning rule into Product.effective_price.
+class PriceRule(Base):
+    __tablename__ = "price_rules"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    discount_percentage = Column(Float, nullable=False) # off mrp
+    category = Column(String, nullable=True)
+    tag_id = Column(Integer, ForeignKey("tags.id", ondelete="CASCADE"), nullable=True)
+    min_mrp = Column(Float, nullable=True)
+    max_mrp = Column(Float, nullable=True)
+    starts_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    ends_at = Column(DateTime, nullable=True) # open-ended when null
+    priority = Column(Integer, nullable=False, default=0) # highest wins, then newest
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    tag = relationship("Tag")
+
+    @property
+    def tag_name(self):
+        return self.tag.name if self.tag else None
+
+THUMBNAIL_WIDTH = 400
+MEDIUM_WIDTH = 800
+
+def _resized(url: str, width: int) -> str:
+    # Unsplash/imgix style URLs resize through the `w` query parameter; anything else is served as-is
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if not any(key == "w" and value.isdigit() and int(value) > width for key, value in query):
+        return url
+    query = [(key, str(width) if key == "w" else value) for key, value in query]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+class ProductPhoto(Base):
+    __tablename__ = "product_photos"
+
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    position = Column(Integer, nullable=False, default=0) # 0 is the primary photo
+    url = Column(String, nullable=False) # original upload (Cloudflare R2)
+    medium_url = Column(String, nullable=False)
+    thumbnail_url = Column(String, nullable=False)
+
+    __table_args__ = (
+        Index("ix_product_photos_product_id_position", "product_id", "position"),
+    )
+
+    @classmethod
+    def from_url(cls, url: str, position: int) -> "ProductPhoto":
+        return cls(url=url, position=position, medium_url=_resized(url, MEDIUM_WIDTH), thumbnail_url=_resized(url, THUMBNAIL_WIDTH))
 
 class Order(Base):
     __tablename__ = "orders"
@@ -41,10 +158,23 @@ class Order(Base):
     status = Column(String, default="Pending") # Pending, Processing, Shipped, Delivered
     shipping_address = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Bumped whenever the order changes; part of the invoice cache key
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # False from checkout until the order.placed job counts it in the revenue aggregates
+    stats_recorded = Column(Boolean, nullable=False, default=True, server_default=true())
 
     user = relationship("User", back_populates="orders")
     items = relationship("OrderItem", back_populates="order")
 
+    __table_args__ = (
+        # A customer's order history, read in the id order the listings use
+        Index("ix_orders_user_id_id", "user_id", "id"),
+        # Date-range exports and the admin order list, newest first
+        Index("ix_orders_created_at", "created_at"),
+        # The admin order list filtered by status
+        Index("ix_orders_status_created_at", "status", "created_at"),
+    )
+
 class OrderItem(Base):
     __tablename__ = "order_items"
 
@@ -56,3 +186,83 @@ class OrderItem(Base):
 
     order = relationship("Order", back_populates="items")
     product = relationship("Product")
+
+    __table_args__ = (
+        Index("ix_order_items_order_id", "order_id"),
+        # Also what a product delete checks the foreign key against
+        Index("ix_order_items_product_id", "product_id"),
+    )
+
+# Aggregates maintained by stats.py as orders are placed and change status,
+# so the admin dashboard never scans the orders table.
+class OrderStatsDaily(Base):
+    __tablename__ = "order_stats_daily"
+
+    day = Column(Date, primary_key=True)
+    status = Column(String, primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+
+class CategoryRevenueDaily(Base):
+    __tablename__ = "category_revenue_daily"
+
+    day = Column(Date, primary_key=True)
+    category = Column(String, primary_key=True) # "" when the product had no category
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+
+# Product counts per combination of the catalog filter values, kept in step
+# by facets.py so the filter sidebar never groups the products table.
+# Missing values are stored as "".
+class ProductFacet(Base):
+    __tablename__ = "product_facets"
+
+    category = Column(String, primary_key=True)
+    color = Column(String, primary_key=True)
+    fabric = Column(String, primary_key=True)
+    price_bucket = Column(Integer, primary_key=True) # index into facets.PRICE_BUCKETS; -1 without a price
+    tags = Column(String, primary_key=True) # the product's tags string, as written
+    product_count = Column(Integer, nullable=False, default=0)
+
+# Background work queue; see jobs.py
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False) # handler name, e.g. "order.placed"
+    payload = Column(JSON, nullable=False, default=dict)
+    status = Column(String, nullable=False, default="queued") # queued, running, done, failed
+    # Enqueueing a second job with the same key is a no-op
+    idempotency_key = Column(String, nullable=True, unique=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_at = Column(DateTime, nullable=False, default=datetime.utcnow) # not before; pushed back on retries
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    claimed_by = Column(String, nullable=True)
+    last_error = Column(String, nullable=True)
+
+    __table_args__ = (
+        # Workers look for due queued jobs in run_at order
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+    )
+
+# Idempotency-Key of a checkout request and the order it produced; see idempotency.py
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    key = Column(String, nullable=False)
+    request_hash = Column(String, nullable=False) # the key may only be reused for the same body
+    status = Column(String, nullable=False, default="in_progress") # in_progress, done
+    owner = Column(String, nullable=True) # token of the request currently holding the key
+    order_id = Column(Integer, ForeignKey("orders.id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_idempotency_keys_user_id_key", "user_id", "key", unique=True),
+        Index("ix_idempotency_keys_created_at", "created_at"),
+    )
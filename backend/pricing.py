@@ -0,0 +1,183 @@
+"""Scheduled price rules, precomputed into products.effective_price.
+
+A product's effective price is the price from the highest-priority price
+rule that matches it and is active now, or its own discount_price if that
+is lower (or no rule applies); a rule never raises a price.
+Listings sort and filter on the column and checkout charges it, so nothing
+evaluates rules per row at read time. refresh_effective_prices() recomputes
+it with one set-based UPDATE and must run after anything that changes
+prices, rules, or a product's category, tags or mrp (or color and fabric,
+which facets.sync(), run alongside, counts).
+
+Rules also start and end on their own. The app runs run_scheduler(), which
+refreshes when a rule boundary has passed; `python pricing.py` refreshes
+everything once, e.g. from cron.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from sqlalchemy import Float, Numeric, and_, case, cast, exists, func, or_, select, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+import facets, models
+from database import SessionLocal, settings
+
+logger = logging.getLogger(__name__)
+
+
+def product_selector(
+    category: Optional[str] = None,
+    tags: Optional[List[str]] = None,
+    min_mrp: Optional[float] = None,
+    max_mrp: Optional[float] = None,
+    ids: Optional[List[int]] = None,
+) -> list:
+    """WHERE conditions on products for the given selectors; every one that is set must match."""
+    product = models.Product
+    conditions = []
+    if category is not None:
+        conditions.append(product.category == category)
+    for tag in tags or []:
+        conditions.append(product.id.in_(models.products_tagged(tag.strip().lower())))
+    if min_mrp is not None:
+        conditions.append(product.mrp >= min_mrp)
+    if max_mrp is not None:
+        conditions.append(product.mrp <= max_mrp)
+    if ids is not None:
+        conditions.append(product.id.in_(ids))
+    return conditions
+
+
+def rule_scope(rule: models.PriceRule) -> list:
+    """The products a rule can apply to, for refreshing only those after it changes."""
+    product = models.Product
+    conditions = product_selector(category=rule.category, min_mrp=rule.min_mrp, max_mrp=rule.max_mrp)
+    if rule.tag_id is not None:
+        conditions.append(product.id.in_(
+            select(models.product_tags.c.product_id).where(models.product_tags.c.tag_id == rule.tag_id)
+        ))
+    return conditions
+
+
+def _rule_price(now: datetime):
+    # Correlated per product: the winning active rule's price, NULL when none applies
+    product, rule = models.Product, models.PriceRule
+    tagged = exists().where(
+        models.product_tags.c.product_id == product.id,
+        models.product_tags.c.tag_id == rule.tag_id,
+    ).correlate_except(models.product_tags)
+    return (
+        # Rounded to cents; round() needs numeric on Postgres
+        select(cast(func.round(cast(product.mrp * (1 - rule.discount_percentage / 100), Numeric), 2), Float))
+        .where(
+            rule.starts_at <= now,
+            or_(rule.ends_at.is_(None), rule.ends_at > now),
+            or_(rule.category.is_(None), rule.category == product.category),
+            or_(rule.tag_id.is_(None), tagged),
+            or_(rule.min_mrp.is_(None), product.mrp >= rule.min_mrp),
+            or_(rule.max_mrp.is_(None), product.mrp <= rule.max_mrp),
+        )
+        .order_by(rule.priority.desc(), rule.id.desc())
+        .limit(1)
+        .correlate(product)
+        .scalar_subquery()
+    )
+
+
+def refresh_effective_prices(db: Session, *where, now: Optional[datetime] = None) -> int:
+    """Recompute effective_price for the products matching `where` (all by default) without committing.
+
+    Only rows whose price actually changes are written, and those get their
+    version bumped so cached ETags move. The facet counts of the same
+    products are brought up to date too. Returns how many prices changed.
+    """
+    product = models.Product
+    rule_price = _rule_price(now or datetime.utcnow())
+    new_price = case(
+        (or_(product.discount_price.is_(None), rule_price < product.discount_price), rule_price),
+        else_=product.discount_price,
+    )
+    changed = db.execute(
+        update(product)
+        .where(*where, product.effective_price.is_distinct_from(new_price))
+        .values(effective_price=new_price, version=product.version + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    facets.sync(db, *where)
+    return changed
+
+
+def boundaries_between(db: Session, since: datetime, until: datetime) -> bool:
+    """Whether any rule started or ended in (since, until]."""
+    rule = models.PriceRule
+    return db.scalar(select(exists().where(or_(
+        and_(rule.starts_at > since, rule.starts_at <= until),
+        and_(rule.ends_at > since, rule.ends_at <= until),
+    ))))
+
+
+def next_boundary(db: Session, after: datetime) -> Optional[datetime]:
+    rule = models.PriceRule
+    starts = db.scalar(select(rule.starts_at).where(rule.starts_at > after).order_by(rule.starts_at).limit(1))
+    ends = db.scalar(select(rule.ends_at).where(rule.ends_at > after).order_by(rule.ends_at).limit(1))
+    return min((t for t in (starts, ends) if t is not None), default=None)
+
+
+def _tick(since: Optional[datetime]) -> tuple:
+    """One scheduler pass: refresh if a boundary passed since the last pass (always on the first).
+
+    Returns (now, whether it refreshed, next boundary).
+    """
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        passed = since is None or boundaries_between(db, since, now)
+        if passed:
+            changed = refresh_effective_prices(db, now=now)
+            db.commit()
+            logger.info("Refreshed effective prices at a rule boundary; %d changed", changed)
+        return now, passed, next_boundary(db, now)
+    finally:
+        db.close()
+
+
+async def run_scheduler(on_change: Callable[[], None], poll_seconds: Optional[float] = None):
+    """Refresh effective prices as rules open and close, calling on_change after each boundary.
+
+    Wakes at the next known boundary, or after poll_seconds at most so rules
+    added by other workers are picked up. Every worker can run this: the
+    refresh is idempotent and only the first one to run writes anything.
+    """
+    poll_seconds = poll_seconds or settings.price_rule_poll_seconds
+    # The first pass catches up on boundaries that passed while the app was down
+    since = None
+    while True:
+        delay = poll_seconds
+        try:
+            since, passed, upcoming = await run_in_threadpool(_tick, since)
+            if passed:
+                # Clear even if another worker wrote the prices: this worker's cache is still stale
+                on_change()
+            if upcoming is not None:
+                delay = min(poll_seconds, max((upcoming - datetime.utcnow()).total_seconds(), 0) + 0.05)
+        except Exception:
+            logger.exception("Price rule refresh failed")
+        await asyncio.sleep(delay)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Recompute every product's effective price from the active price rules.")
+    parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        changed = refresh_effective_prices(session)
+        session.commit()
+    finally:
+        session.close()
+    print(f"{changed} effective prices changed")
@@ -1,94 +1,154 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List
-from fastapi.responses import Response
-import io
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-
-import models, schemas, database
-from routers.auth import get_current_admin
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import select
+from typing import List, Optional
+from datetime import date, datetime
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+
+import models, schemas, database, invoices, jobs, stats, pricing, serialization, invalidation
+from routers.auth import get_current_admin, token_cache
+from routers.orders import fetch_order_page, load_order
+from routers.products import clear_catalog_cache, product_cache
 
 router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(get_current_admin)])
 
 @router.get("/orders", response_model=List[schemas.OrderResponse])
-def get_all_orders(skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db)):
-    orders = db.query(models.Order).offset(skip).limit(limit).all()
-    return orders
+async def get_all_orders(skip: int = 0, limit: int = 100, order_status: Optional[str] = Query(None, alias="status"), db=Depends(database.get_async_read_db)):
+    # Newest first, read straight off ix_orders_created_at (or ix_orders_status_created_at)
+    where = [models.Order.status == order_status] if order_status else []
+    newest_first = (models.Order.created_at.desc(), models.Order.id.desc())
+    return serialization.FastJSONResponse(await fetch_order_page(db, *where, order_by=newest_first, skip=skip, limit=limit))
 
 @router.get("/orders/{order_id}", response_model=schemas.OrderResponse)
 def view_order(order_id: int, db: Session = Depends(database.get_db)):
-    order = db.query(models.Order).filter(models.Order.id == order_id).first()
+    order = load_order(db, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    # Automatically trigger 'Processing' status when an admin views the order
+    # Automatically trigger 'Processing' status when an admin views the order.
+    # A worker makes the move, so this response still shows 'Pending'.
     if order.status == "Pending":
-        order.status = "Processing"
+        response = schemas.OrderResponse.model_validate(order, from_attributes=True)
+        jobs.enqueue(db, "order.mark_processing", {"order_id": order_id}, key=f"order-processing:{order_id}")
         db.commit()
-        db.refresh(order)
+        return response
         
     return order
 
 @router.get("/orders/{order_id}/invoice", response_class=Response)
 def generate_invoice(order_id: int, db: Session = Depends(database.get_db)):
-    order = db.query(models.Order).filter(models.Order.id == order_id).first()
+    order = db.scalars(
+        select(models.Order).options(*invoices.INVOICE_DETAIL_LOADER).where(models.Order.id == order_id)
+    ).unique().first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
-        
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
-    
-    p.setFont("Helvetica-Bold", 20)
-    p.drawString(50, 750, "INVOICE")
-    
-    p.setFont("Helvetica", 12)
-    p.drawString(50, 720, f"Order ID: {order.id}")
-    p.drawString(50, 700, f"Date: {order.created_at.strftime('%Y-%m-%d %H:%M:%S')}")
-    p.drawString(50, 680, f"Status: {order.status}")
-    p.drawString(50, 660, f"Customer Email: {order.user.email}")
-    
-    y = 620
-    p.setFont("Helvetica-Bold", 12)
-    p.drawString(50, y, "Item")
-    p.drawString(300, y, "Qty")
-    p.drawString(400, y, "Price")
-    p.drawString(500, y, "Total")
-    
-    y -= 20
-    p.setFont("Helvetica", 12)
-    for item in order.items:
-        p.drawString(50, y, item.product.name)
-        p.drawString(300, y, str(item.quantity))
-        p.drawString(400, y, f"${item.price:.2f}")
-        p.drawString(500, y, f"${(item.price * item.quantity):.2f}")
-        y -= 20
-        
-    y -= 20
-    p.setFont("Helvetica-Bold", 14)
-    p.drawString(400, y, "Total Amount:")
-    p.drawString(500, y, f"${order.total_amount:.2f}")
-    
-    p.showPage()
-    p.save()
-    
-    buffer.seek(0)
-    pdf_bytes = buffer.getvalue()
-    buffer.close()
-    
-    headers = {
-        'Content-Disposition': f'attachment; filename="invoice_{order.id}.pdf"'
-    }
-    return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
+
+    data = invoices.invoice_data(order)
+    digest = invoices.invoice_digest(data)
+    # Served from the content-addressed cache; a missing PDF is rendered by a worker
+    path = invoices.invoice_cache.get(digest)
+    if path is None:
+        # Queued again if it was rendered once but pruned from the cache since
+        job_id = jobs.enqueue(db, "invoice.render", {"order_id": order_id}, key=f"invoice:{digest}", rerun_finished=True)
+        db.commit()
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"detail": "Invoice is being rendered; try again shortly", "job_id": job_id},
+            headers={"Retry-After": "2"},
+        )
+    return FileResponse(path, media_type="application/pdf", filename=f"invoice_{order.id}.pdf", headers={"ETag": f'"{digest}"'})
+
+@router.post("/invoices/export")
+async def export_invoices(req: schemas.InvoiceExportRequest):
+    if not req.order_ids and not (req.start or req.end):
+        raise HTTPException(status_code=400, detail="Provide order_ids or a start/end date range")
+    if req.start and req.end and req.start > req.end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    headers = {"Content-Disposition": 'attachment; filename="invoices.zip"'}
+    return StreamingResponse(
+        invoices.stream_invoice_zip(req.order_ids, req.start, req.end),
+        media_type="application/zip",
+        headers=headers,
+    )
 
 @router.get("/stats", response_model=schemas.RevenueStats)
-def get_admin_stats(db: Session = Depends(database.get_db)):
-    total_sales = db.query(func.sum(models.Order.total_amount)).scalar() or 0.0
-    order_count = db.query(models.Order).count()
-    
-    # Aggregate status counts
-    status_query = db.query(models.Order.status, func.count(models.Order.id)).group_by(models.Order.status).all()
-    status_counts = {status: count for status, count in status_query}
-    
-    return schemas.RevenueStats(total_sales=total_sales, order_count=order_count, status_counts=status_counts)
+async def get_admin_stats(db=Depends(database.get_async_read_db)):
+    # Served from the maintained order_stats_daily aggregate (a row per day and status)
+    rows = await database.fetch_rows(db, stats.status_totals_query())
+    return schemas.RevenueStats(**stats.summarize_status_rows(rows))
+
+@router.get("/stats/revenue", response_model=schemas.RevenueReport)
+async def get_revenue_report(start: Optional[date] = None, end: Optional[date] = None, db=Depends(database.get_async_read_db)):
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    rows = await database.fetch_rows(db, stats.status_totals_query(start, end))
+    daily = await database.fetch_rows(db, stats.daily_totals_query(start, end))
+    categories = await database.fetch_rows(db, stats.category_totals_query(start, end))
+    return schemas.RevenueReport(
+        **stats.summarize_status_rows(rows),
+        start=start,
+        end=end,
+        daily=[{"day": day, "revenue": round(revenue or 0.0, 2), "order_count": count or 0} for day, revenue, count in daily if count],
+        categories=[{"category": category, "revenue": round(revenue or 0.0, 2), "units": units or 0} for category, revenue, units in categories],
+    )
+
+@router.post("/stats/reconcile")
+def reconcile_stats(repair: bool = False, db: Session = Depends(database.get_db)):
+    return stats.reconcile(db, repair=repair)
+
+@router.get("/cache")
+def get_cache_stats():
+    return {"products": product_cache.stats(), "auth": token_cache.stats(), "bus": invalidation.stats()}
+
+@router.get("/db-pool")
+def get_db_pool_stats():
+    return database.pool_statuses()
+
+@router.get("/jobs")
+def get_job_queue(db: Session = Depends(database.get_db)):
+    return jobs.queue_stats(db)
+
+@router.post("/jobs/{job_id}/retry")
+def retry_job(job_id: int, db: Session = Depends(database.get_db)):
+    if not jobs.retry(db, job_id):
+        raise HTTPException(status_code=404, detail="No failed job with that id")
+    return {"detail": "Job queued"}
+
+@router.get("/price-rules", response_model=List[schemas.PriceRuleResponse])
+def list_price_rules(db: Session = Depends(database.get_db)):
+    return db.scalars(
+        select(models.PriceRule).options(joinedload(models.PriceRule.tag))
+        .order_by(models.PriceRule.priority.desc(), models.PriceRule.id.desc())
+    ).all()
+
+@router.post("/price-rules", response_model=schemas.PriceRuleResponse, status_code=status.HTTP_201_CREATED)
+def create_price_rule(rule: schemas.PriceRuleCreate, db: Session = Depends(database.get_db)):
+    if rule.ends_at is not None and rule.ends_at <= (rule.starts_at or datetime.utcnow()):
+        raise HTTPException(status_code=400, detail="ends_at must be after starts_at")
+    tag = None
+    if rule.tag:
+        tag = db.scalar(select(models.Tag).where(models.Tag.slug == rule.tag.strip().lower()))
+        if tag is None:
+            raise HTTPException(status_code=400, detail=f"Unknown tag '{rule.tag}'")
+    db_rule = models.PriceRule(**rule.model_dump(exclude={"tag", "starts_at"}), tag=tag)
+    if rule.starts_at is not None:
+        db_rule.starts_at = rule.starts_at
+    db.add(db_rule)
+    db.flush()
+    pricing.refresh_effective_prices(db, *pricing.rule_scope(db_rule))
+    db.commit()
+    clear_catalog_cache()
+    return db_rule
+
+@router.delete("/price-rules/{rule_id}")
+def delete_price_rule(rule_id: int, db: Session = Depends(database.get_db)):
+    rule = db.get(models.PriceRule, rule_id)
+    if not rule:
+        raise HTTPException(status_code=404, detail="Price rule not found")
+    scope = pricing.rule_scope(rule)
+    db.delete(rule)
+    db.flush()
+    pricing.refresh_effective_prices(db, *scope)
+    db.commit()
+    clear_catalog_cache()
+    return {"detail": "Price rule deleted"}
@@ -1,11 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
+from sqlalchemy import func, select, update
 from datetime import datetime, timedelta
+from dataclasses import dataclass
+from typing import NamedTuple, Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import threading
+import time
 
-import models, schemas, database
+import models, schemas, database, invalidation
+from cache import TTLCache
 from database import settings
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
@@ -13,11 +21,41 @@ router = APIRouter(prefix="/auth", tags=["Authentication"])
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+class PasswordHashPool:
+    """Bounded worker pool for bcrypt so bursts of logins queue here rather than
+    in the request threadpool that catalog traffic needs.
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+    bcrypt releases the GIL while hashing, so threads give real parallelism
+    without the start-up and pickling cost of a process pool.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+
+    async def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many sign-in requests in progress, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return await asyncio.wrap_future(future)
+
+password_pool = PasswordHashPool(settings.password_hash_workers, settings.password_hash_queue_size)
+
+async def hash_password(password: str) -> str:
+    return await password_pool.run(pwd_context.hash, password)
+
+async def check_password(plain_password: str, hashed_password: str):
+    """Returns (valid, new_hash); new_hash is set when the stored hash uses outdated settings."""
+    return await password_pool.run(pwd_context.verify_and_update, plain_password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
@@ -29,48 +67,89 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
-    credentials_exception = HTTPException(
+@dataclass(frozen=True)
+class CurrentUser:
+    """Detached snapshot of the authenticated user, safe to share across requests."""
+    id: int
+    email: str
+    name: Optional[str]
+    phone: Optional[str]
+    is_admin: bool
+
+class CachedToken(NamedTuple):
+    claims: dict
+    user: Optional[CurrentUser] = None
+
+# Verified token claims plus the user they resolve to, keyed by the raw token.
+# Entries never outlive the token's own `exp`.
+token_cache = TTLCache(maxsize=settings.auth_cache_size, ttl=settings.auth_cache_ttl_seconds)
+
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _verified_token(token: str) -> CachedToken:
+    entry = token_cache.get(token)
+    if entry is not None:
+        if entry.claims.get("exp", 0) > time.time():
+            return entry
+        token_cache.pop(token)
+        raise _credentials_exception()
     try:
         payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        token_data = schemas.TokenData(email=email)
     except JWTError:
-        raise credentials_exception
+        raise _credentials_exception()
+    if payload.get("sub") is None:
+        raise _credentials_exception()
+    entry = CachedToken(payload)
+    token_cache.set(token, entry)
+    return entry
+
+def _resolve_user(token: str, entry: CachedToken, db: Session) -> CurrentUser:
+    if entry.user is not None:
+        return entry.user
+    token_data = schemas.TokenData(email=entry.claims["sub"])
     user = db.query(models.User).filter(models.User.email == token_data.email).first()
     if user is None:
-        raise credentials_exception
-    return user
+        raise _credentials_exception()
+    snapshot = CurrentUser(id=user.id, email=user.email, name=user.name, phone=user.phone, is_admin=bool(user.is_admin))
+    token_cache.set(token, entry._replace(user=snapshot))
+    return snapshot
 
-def get_current_admin(current_user: models.User = Depends(get_current_user)):
+@invalidation.handler("user")
+def _evict_users(ids: Optional[list], data: Optional[list]) -> int:
+    if ids is None:
+        return token_cache.clear()
+    ids = set(ids)
+    return token_cache.pop_where(lambda token, entry: entry.user is not None and entry.user.id in ids)
+
+def invalidate_user(user_id: int) -> int:
+    """Drop cached tokens of a user in every worker; call after changing their profile or role."""
+    return invalidation.publish("user", [user_id])
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)) -> CurrentUser:
+    return _resolve_user(token, _verified_token(token), db)
+
+def get_current_admin(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)) -> CurrentUser:
+    forbidden = HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="You do not have administrative privileges."
+    )
+    entry = _verified_token(token)
+    # `login` signs is_admin into the token, so non-admins are turned away
+    # without touching the database. Admins are confirmed against the cached
+    # user snapshot, which invalidate_user() drops when a role changes.
+    if not entry.claims.get("is_admin"):
+        raise forbidden
+    current_user = _resolve_user(token, entry, db)
     if not current_user.is_admin:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You do not have administrative privileges."
-        )
+        raise forbidden
     return current_user
 
-@router.post("/register", response_model=schemas.UserResponse)
-def register(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
-    db_user_email = db.query(models.User).filter(models.User.email == user.email).first()
-    if db_user_email:
-        raise HTTPException(status_code=400, detail="Email already registered")
-        
-    if user.phone:
-        db_user_phone = db.query(models.User).filter(models.User.phone == user.phone).first()
-        if db_user_phone:
-            raise HTTPException(status_code=400, detail="Phone number already registered")
-    
-    # First user is admin
-    is_admin = db.query(models.User).count() == 0
-    hashed_password = get_password_hash(user.password)
-    
+def _create_user(db: Session, user: schemas.UserCreate, hashed_password: str, is_admin: bool):
     new_user = models.User(
         email=user.email, 
         name=user.name,
@@ -83,15 +162,39 @@ def register(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
     db.refresh(new_user)
     return new_user
 
+def _store_password_hash(db: Session, user_id: int, hashed_password: str):
+    db.execute(update(models.User).where(models.User.id == user_id).values(hashed_password=hashed_password))
+    db.commit()
+
+@router.post("/register", response_model=schemas.UserResponse)
+async def register(user: schemas.UserCreate, db=Depends(database.get_async_db)):
+    db_user_email = await database.fetch_first(db, select(models.User).where(models.User.email == user.email))
+    if db_user_email:
+        raise HTTPException(status_code=400, detail="Email already registered")
+        
+    if user.phone:
+        db_user_phone = await database.fetch_first(db, select(models.User).where(models.User.phone == user.phone))
+        if db_user_phone:
+            raise HTTPException(status_code=400, detail="Phone number already registered")
+    
+    # First user is admin
+    is_admin = await database.fetch_scalar(db, select(func.count(models.User.id))) == 0
+    hashed_password = await hash_password(user.password)
+    return await database.run_sync(db, _create_user, user, hashed_password, is_admin)
+
 @router.post("/login", response_model=schemas.Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(database.get_db)):
-    user = db.query(models.User).filter(models.User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db=Depends(database.get_async_db)):
+    user = await database.fetch_first(db, select(models.User).where(models.User.email == form_data.username))
+    valid, new_hash = await check_password(form_data.password, user.hashed_password) if user else (False, None)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        # The stored hash predates the current cost factor; upgrade it while we have the password
+        await database.run_sync(db, _store_password_hash, user.id, new_hash)
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
     
     # Encode `is_admin` within the token for RBAC middleware parsing
@@ -102,11 +205,14 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     return {"access_token": access_token, "token_type": "bearer", "is_admin": user.is_admin}
 
 @router.get("/me", response_model=schemas.UserResponse)
-def read_users_me(current_user: models.User = Depends(get_current_user)):
+def read_users_me(current_user: CurrentUser = Depends(get_current_user)):
     return current_user
 
 @router.put("/me", response_model=schemas.UserResponse)
-def update_user_profile(user_update: schemas.UserUpdate, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_user)):
+def update_user_profile(user_update: schemas.UserUpdate, db: Session = Depends(database.get_db), authenticated: CurrentUser = Depends(get_current_user)):
+    current_user = db.get(models.User, authenticated.id)
+    if current_user is None:
+        raise _credentials_exception()
     # Check uniqueness if email or phone is being changed
     if user_update.email and user_update.email != current_user.email:
         email_check = db.query(models.User).filter(models.User.email == user_update.email).first()
@@ -125,4 +231,5 @@ def update_user_profile(user_update: schemas.UserUpdate, db: Session = Depends(d
 
     db.commit()
     db.refresh(current_user)
+    invalidate_user(current_user.id)
     return current_user
@@ -1,68 +1,172 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import case, select, update
+from typing import List, Optional
 
-import models, schemas, database
-from routers.auth import get_current_user
+import models, schemas, database, idempotency, jobs, serialization
+from routers.auth import CurrentUser, get_current_user
+from routers.products import PRIMARY_PHOTO, invalidate_product_ids, product_rows, serialize_product_rows
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
 
+# Single orders load the OrderResponse graph (order -> items -> product ->
+# primary photo) with joinedload in one round-trip. Pages skip the ORM: see
+# fetch_order_page.
+ORDER_DETAIL_LOADER = joinedload(models.Order.items).joinedload(models.OrderItem.product).joinedload(PRIMARY_PHOTO)
+
+def order_detail_query(order_id: int):
+    return select(models.Order).options(ORDER_DETAIL_LOADER).where(models.Order.id == order_id)
+
+def load_order(db: Session, order_id: int):
+    return db.scalars(order_detail_query(order_id)).unique().first()
+
+ORDER_FIELDS = tuple(f for f in schemas.OrderResponse.model_fields if f != "items")
+ITEM_FIELDS = tuple(f for f in schemas.OrderItemResponse.model_fields if f != "product")
+
+async def fetch_order_page(db, *where, order_by=(models.Order.id,), skip: int = 0, limit: int = 100) -> list:
+    """OrderResponse dicts for a page of orders, built from column rows.
+
+    Always four statements (orders, items, products, photos) whatever the page size.
+    """
+    orders = await database.fetch_rows(
+        db,
+        select(*(getattr(models.Order, f) for f in ORDER_FIELDS)).where(*where).order_by(*order_by).offset(skip).limit(limit),
+    )
+    if not orders:
+        return []
+    items = await database.fetch_rows(
+        db,
+        select(models.OrderItem.order_id, *(getattr(models.OrderItem, f) for f in ITEM_FIELDS))
+        .where(models.OrderItem.order_id.in_([o.id for o in orders]))
+        .order_by(models.OrderItem.id),
+    )
+    products = await database.fetch_rows(db, product_rows().where(models.Product.id.in_({i.product_id for i in items})))
+    by_id = {p["id"]: p for p in await serialize_product_rows(db, products, photo_limit=1)}
+
+    lines = {}
+    for item in items:
+        mapping = item._mapping
+        line = {f: mapping[f] for f in ITEM_FIELDS}
+        line["product"] = by_id[item.product_id]
+        lines.setdefault(item.order_id, []).append(line)
+    page = []
+    for order in orders:
+        mapping = order._mapping
+        entry = {f: mapping[f] for f in ORDER_FIELDS}
+        entry["items"] = lines.get(order.id, [])
+        page.append(entry)
+    return page
+
+def _stock_shortfalls(requested: dict, products) -> list:
+    return [
+        f"{p.name} (requested {requested[p.id]}, available {p.stock})"
+        for p in products
+        if p.stock is None or p.stock < requested[p.id]
+    ]
+
 @router.post("/checkout", response_model=schemas.OrderResponse)
-def checkout(request: schemas.CheckoutRequest, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_user)):
+def checkout(
+    request: schemas.CheckoutRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, min_length=1, max_length=255),
+    db: Session = Depends(database.get_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    if idempotency_key is None:
+        return load_order(db, _place_order(db, request, current_user))
+
+    # A retry with the same key gets the first attempt's order back (see idempotency.py)
+    request_hash = idempotency.fingerprint(request.model_dump(mode="json"))
+    owner, replayed = idempotency.begin(db, current_user.id, idempotency_key, request_hash)
+    if replayed is not None:
+        response.headers["Idempotent-Replayed"] = "true"
+        return load_order(db, replayed)
+    try:
+        order_id = _place_order(db, request, current_user, (idempotency_key, owner))
+    except Exception:
+        db.rollback()
+        idempotency.release(db, current_user.id, idempotency_key, owner)
+        raise
+    return load_order(db, order_id)
+
+def _place_order(db: Session, request: schemas.CheckoutRequest, current_user: CurrentUser, claim: Optional[tuple] = None) -> int:
+    """Reserve stock and create the order; returns its id. `claim` is the (key, owner) of an Idempotency-Key."""
     items = request.items
     if not items:
         raise HTTPException(status_code=400, detail="Order must contain at least one item")
-    
-    total_amount = 0.0
-    order_items = []
-    
+    if any(item.quantity <= 0 for item in items):
+        raise HTTPException(status_code=400, detail="Item quantities must be positive")
+
+    # Total quantity per product, so repeated cart lines reserve stock once
+    requested = {}
     for item in items:
-        product = db.query(models.Product).filter(models.Product.id == item.product_id).first()
-        if not product:
-            raise HTTPException(status_code=404, detail=f"Product {item.product_id} not found")
-        if product.stock < item.quantity:
-            raise HTTPException(status_code=400, detail=f"Not enough stock for product {product.name}")
-        
-        # Dummy payment gateway here: we just assume payment is successful and deduct stock.
-        product.stock -= item.quantity
-        
-        price = product.discount_price * item.quantity
-        total_amount += price
-        
-        order_item = models.OrderItem(
-            product_id=product.id,
-            quantity=item.quantity,
-            price=product.discount_price
-        )
-        order_items.append(order_item)
-    
+        requested[item.product_id] = requested.get(item.product_id, 0) + item.quantity
+
+    products = db.query(models.Product).filter(models.Product.id.in_(requested)).all()
+    by_id = {p.id: p for p in products}
+    missing = [str(pid) for pid in requested if pid not in by_id]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Product {', '.join(missing)} not found")
+
+    shortfalls = _stock_shortfalls(requested, products)
+    if shortfalls:
+        raise HTTPException(status_code=400, detail=f"Not enough stock for: {'; '.join(shortfalls)}")
+
+    # Dummy payment gateway here: we just assume payment is successful and deduct stock.
+    # A single conditional UPDATE reserves every line at once; the database only
+    # applies it to rows that still have enough stock, so concurrent checkouts
+    # can never drive stock negative.
+    quantity = case(requested, value=models.Product.id)
+    reserved = db.execute(
+        update(models.Product)
+        .where(models.Product.id.in_(requested), models.Product.stock >= quantity)
+        .values(stock=models.Product.stock - quantity, version=models.Product.version + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if reserved != len(requested):
+        # Another checkout won the race for at least one product
+        db.rollback()
+        current = db.query(models.Product).filter(models.Product.id.in_(requested)).populate_existing().all()
+        shortfalls = _stock_shortfalls(requested, current)
+        raise HTTPException(status_code=409, detail=f"Not enough stock for: {'; '.join(shortfalls) or 'one or more items'}")
+
+    total_amount = sum(by_id[item.product_id].selling_price * item.quantity for item in items)
     new_order = models.Order(
-        user_id=current_user.id, 
-        total_amount=total_amount, 
+        user_id=current_user.id,
+        total_amount=total_amount,
         status="Pending",
-        shipping_address=request.shipping_address
+        shipping_address=request.shipping_address,
+        stats_recorded=False,
+        items=[
+            models.OrderItem(product_id=item.product_id, quantity=item.quantity, price=by_id[item.product_id].selling_price)
+            for item in items
+        ],
     )
     db.add(new_order)
+    db.flush()
+    order_id = new_order.id
+    # Revenue aggregates and the invoice are done by a worker after the response
+    jobs.enqueue(db, "order.placed", {
+        "order_id": order_id,
+        "lines": [(by_id[item.product_id].category, item.quantity, by_id[item.product_id].selling_price) for item in items],
+    }, key=f"order-placed:{order_id}")
+    if claim is not None and not idempotency.complete(db, current_user.id, *claim, order_id):
+        # Our claim timed out and a retry took the key over; it places the order instead
+        db.rollback()
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still being processed")
     db.commit()
-    db.refresh(new_order)
-    
-    for order_item in order_items:
-        order_item.order_id = new_order.id
-        db.add(order_item)
-    
-    db.commit()
-    db.refresh(new_order)
-    
-    return new_order
+    # Cached catalog reads carry the old stock figures
+    invalidate_product_ids(requested)
+    return order_id
 
 @router.get("/my-orders", response_model=List[schemas.OrderResponse])
-def get_my_orders(skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_user)):
-    orders = db.query(models.Order).filter(models.Order.user_id == current_user.id).offset(skip).limit(limit).all()
-    return orders
+async def get_my_orders(skip: int = 0, limit: int = 100, db=Depends(database.get_async_read_db), current_user: CurrentUser = Depends(get_current_user)):
+    page = await fetch_order_page(db, models.Order.user_id == current_user.id, skip=skip, limit=limit)
+    return serialization.FastJSONResponse(page)
 
 @router.get("/{order_id}", response_model=schemas.OrderResponse)
-def get_order(order_id: int, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_user)):
-    order = db.query(models.Order).filter(models.Order.id == order_id).first()
+async def get_order(order_id: int, db=Depends(database.get_async_db), current_user: CurrentUser = Depends(get_current_user)):
+    order = await database.fetch_first(db, order_detail_query(order_id))
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     if order.user_id != current_user.id and not current_user.is_admin:
@@ -1,34 +1,414 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, UploadFile, status
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
-from pydantic import BaseModel
-from typing import List
+from sqlalchemy import func, select, tuple_, update
+from pydantic import BaseModel, Field
+from typing import List, NamedTuple, Optional
+from types import SimpleNamespace
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+import base64
+import hashlib
+import json
 
-import models, schemas, database
+import models, schemas, database, search, catalog, pricing, facets, serialization, invalidation
+from cache import TTLCache
+from database import settings
 from routers.auth import get_current_admin
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
+# Serialized JSON bodies of catalog reads. Entries remember which products
+# they contain and which filters produced them so admin mutations can evict
+# exactly the entries a change could affect.
+product_cache = TTLCache(maxsize=settings.product_cache_size, ttl=settings.product_cache_ttl_seconds)
+
+class CachedBody(NamedTuple):
+    body: bytes
+    product_ids: frozenset
+    etag: str
+    last_modified: Optional[str] = None
+    filters: Optional["ProductFilters"] = None
+    # Compressed copies of body by content encoding, made on first request
+    encoded: Optional[dict] = None
+
+# Listings ship the primary photo and the one product cards swap to on hover,
+# unless full_photos is set; single products get them all, order lines just the primary
+LISTING_PHOTOS = 2
+PRIMARY_PHOTO = models.Product.images.and_(models.ProductPhoto.position == 0)
+
+# Catalog reads select these columns and build ProductResponse dicts directly,
+# skipping the ORM identity map and a second validation pass. version and
+# updated_at feed the ETags.
+RESPONSE_FIELDS = tuple(f for f in schemas.ProductResponse.model_fields if f not in ("photos", "thumbnail"))
+
+def product_rows():
+    return select(*(getattr(models.Product, f) for f in RESPONSE_FIELDS), models.Product.version, models.Product.updated_at)
+
+async def serialize_product_rows(db, rows, full_photos: bool = False, photo_limit: int = LISTING_PHOTOS) -> list:
+    """ProductResponse dicts for product_rows() results, with their photos fetched in one query.
+
+    Each product gets its first `photo_limit` photos, or all of them with full_photos.
+    """
+    photos = {}
+    if rows:
+        photo = models.ProductPhoto
+        statement = select(photo.product_id, photo.url, photo.thumbnail_url).where(photo.product_id.in_({r.id for r in rows}))
+        if not full_photos:
+            statement = statement.where(photo.position < photo_limit)
+        for product_id, url, thumbnail in await database.fetch_rows(db, statement.order_by(photo.product_id, photo.position)):
+            photos.setdefault(product_id, []).append((url, thumbnail))
+    items = []
+    for row in rows:
+        mapping = row._mapping
+        item = {f: mapping[f] for f in RESPONSE_FIELDS}
+        urls = photos.get(row.id, [])
+        item["photos"] = [url for url, _ in urls]
+        item["thumbnail"] = urls[0][1] if urls else None
+        items.append(item)
+    return items
+
+# Sort keys accepted by the keyset listing; prefix with "-" for descending.
+# `id` is always appended as the tie-breaker so the order is total.
+SORT_KEYS = {
+    "id": models.Product.id,
+    "price": models.Product.effective_price,
+    "rating": models.Product.rating,
+}
+
+class ProductFilters:
+    def __init__(
+        self,
+        category: Optional[str] = None,
+        tags: Optional[str] = None,
+        color: Optional[str] = None,
+        fabric: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_rating: Optional[float] = None,
+    ):
+        self.category = category
+        self.tags = [t.strip() for t in tags.split(",") if t.strip()] if tags else []
+        self.color = color
+        self.fabric = fabric
+        self.min_price = min_price
+        self.max_price = max_price
+        self.min_rating = min_rating
+
+    def cache_key(self) -> tuple:
+        return (self.category, tuple(self.tags), self.color, self.fabric, self.min_price, self.max_price, self.min_rating)
+
+    def matches(self, product) -> bool:
+        """Python mirror of `apply`, used to decide whether a changed product can appear in a cached listing."""
+        price, rating = product.effective_price, product.rating
+        if self.category and product.category != self.category:
+            return False
+        if self.color and product.color != self.color:
+            return False
+        if self.fabric and product.fabric != self.fabric:
+            return False
+        if self.tags and not {t.lower() for t in self.tags} <= set(_split_tags(product.tags)):
+            return False
+        if self.min_price is not None and (price is None or price < self.min_price):
+            return False
+        if self.max_price is not None and (price is None or price > self.max_price):
+            return False
+        if self.min_rating is not None and (rating is None or rating < self.min_rating):
+            return False
+        return True
+
+    def apply(self, query):
+        if self.category:
+            query = query.filter(models.Product.category == self.category)
+        if self.color:
+            query = query.filter(models.Product.color == self.color)
+        if self.fabric:
+            query = query.filter(models.Product.fabric == self.fabric)
+        for tag in self.tags:
+            query = query.filter(models.Product.id.in_(models.products_tagged(tag.lower())))
+        if self.min_price is not None:
+            query = query.filter(models.Product.effective_price >= self.min_price)
+        if self.max_price is not None:
+            query = query.filter(models.Product.effective_price <= self.max_price)
+        if self.min_rating is not None:
+            query = query.filter(models.Product.rating >= self.min_rating)
+        return query
+
+def _split_tags(tags: Optional[str]) -> dict:
+    """Slug -> display name for a comma separated tag string, first spelling wins."""
+    names = {}
+    for name in (tags or "").split(","):
+        name = name.strip()
+        if name:
+            names.setdefault(name.lower(), name)
+    return names
+
+def _assign_tags(db: Session, product: models.Product, tags: Optional[str]):
+    """Point product.tag_list at the named tags, creating missing ones, and refresh the display string."""
+    names = _split_tags(tags)
+    existing = {t.slug: t for t in db.scalars(select(models.Tag).where(models.Tag.slug.in_(names)))} if names else {}
+    product.tag_list = [existing.get(slug) or models.Tag(name=name, slug=slug) for slug, name in names.items()]
+    product.tags = ", ".join(t.name for t in product.tag_list) or None
+    # New tags must be visible to the next lookup in this session (autoflush is off)
+    db.flush()
+
+def _sort_columns(sort: str):
+    key = SORT_KEYS.get(sort.lstrip("-"))
+    if key is None:
+        raise HTTPException(status_code=400, detail=f"Unsupported sort '{sort}'. Use one of: {', '.join(SORT_KEYS)}")
+    if key is models.Product.id:
+        return [key]
+    # A NULL never compares in the keyset tuple, so NULL prices and ratings sort as 0
+    return [func.coalesce(key, 0), models.Product.id]
+
+def _sort_values(product, sort: str) -> list:
+    """The cursor values _sort_columns() gives `product`."""
+    key = SORT_KEYS[sort.lstrip("-")]
+    if key is models.Product.id:
+        return [product.id]
+    value = getattr(product, key.key)
+    return [0 if value is None else value, product.id]
+
+def _encode_cursor(sort: str, values: list) -> str:
+    raw = json.dumps([sort, values], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_cursor(cursor: str, sort: str, width: int) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor_sort != sort or not isinstance(values, list) or len(values) != width:
+        raise HTTPException(status_code=400, detail="Cursor does not match the requested sort")
+    return values
+
+def _build_entry(payload, products, filters: Optional["ProductFilters"] = None) -> CachedBody:
+    if isinstance(payload, list) or filters is not None:
+        # Collection tag: changes only when a product on the page changes version,
+        # the page membership changes, or the cursor to the next page moves.
+        digest = hashlib.sha1()
+        for p in products:
+            digest.update(f"{p.id}:{p.version};".encode())
+        if isinstance(payload, dict):
+            digest.update(str(payload.get("next_cursor")).encode())
+        etag = f'"c{digest.hexdigest()}"'
+    else:
+        etag = f'"p{products[0].id}-v{products[0].version}"'
+
+    stamps = [p.updated_at for p in products if p.updated_at is not None]
+    last_modified = format_datetime(max(stamps).replace(tzinfo=timezone.utc, microsecond=0), usegmt=True) if stamps else None
+    return CachedBody(serialization.dumps(payload), frozenset(p.id for p in products), etag, last_modified, filters, {})
+
+def _not_modified(request: Request, entry: CachedBody) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return "*" in tags or any(t.removeprefix("W/") == entry.etag for t in tags)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and entry.last_modified:
+        try:
+            return parsedate_to_datetime(entry.last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def _json_response(request: Request, entry: CachedBody) -> Response:
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if entry.last_modified:
+        headers["Last-Modified"] = entry.last_modified
+    if _not_modified(request, entry):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    body = entry.body
+    encoding = serialization.negotiate(request.headers.get("accept-encoding"), len(body))
+    if encoding is not None:
+        if encoding not in entry.encoded:
+            entry.encoded[encoding] = serialization.compress(body, encoding)
+        body = entry.encoded[encoding]
+        # The encoded bytes differ from the identity body, so the tag is only weak
+        headers["ETag"] = f"W/{entry.etag}"
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def _snapshot(product) -> SimpleNamespace:
+    """Detached copy of the fields listing filters look at, taken before a mutation."""
+    return SimpleNamespace(
+        id=product.id,
+        category=product.category,
+        tags=product.tags,
+        color=product.color,
+        fabric=product.fabric,
+        effective_price=product.effective_price,
+        rating=product.rating,
+    )
+
+@invalidation.handler("product")
+def _evict_products(ids: Optional[list], snapshots: Optional[list]) -> int:
+    """Drop cached reads for a product event; this worker's and the other workers' alike.
+
+    With snapshots (catalog edits) entries whose filters match any of them go
+    too, and reads stay on the primary for a while; with only ids (stock) just
+    the entries containing those products; with neither, everything.
+    """
+    if ids is None:
+        database.read_from_primary()
+        return product_cache.clear()
+    ids = set(ids)
+    if snapshots is None:
+        return product_cache.pop_where(lambda key, entry: bool(entry.product_ids & ids))
+    products = [SimpleNamespace(**snapshot) for snapshot in snapshots]
+
+    def affected(key, entry: CachedBody) -> bool:
+        if entry.product_ids & ids:
+            return True
+        return entry.filters is not None and any(entry.filters.matches(p) for p in products)
+
+    database.read_from_primary()
+    return product_cache.pop_where(affected)
+
+def invalidate_products(*products) -> int:
+    """Evict cached reads, in every worker, that include or could now include any of the given product states.
+
+    Pass the pre-mutation snapshot as well as the new row on updates so listings
+    the product is leaving are dropped along with the ones it is joining.
+    """
+    snapshots = [vars(_snapshot(p)) for p in products]
+    return invalidation.publish("product", [p["id"] for p in snapshots], snapshots)
+
+def clear_catalog_cache():
+    """Drop every cached catalog read in every worker, for changes too broad to evict by product."""
+    invalidation.publish("product")
+
+def invalidate_product_ids(ids) -> int:
+    """Evict cached reads containing these products, for changes (like stock) that no listing filters on."""
+    return invalidation.publish("product", set(ids))
+
 @router.get("/", response_model=List[schemas.ProductResponse])
-def get_products(skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db)):
-    products = db.query(models.Product).offset(skip).limit(limit).all()
-    return products
+async def get_products(request: Request, skip: int = 0, limit: int = 100, full_photos: bool = False, filters: ProductFilters = Depends(), db=Depends(database.get_async_read_db)):
+    key = ("list", skip, limit, full_photos, filters.cache_key())
+    entry = product_cache.get(key)
+    if entry is None:
+        statement = filters.apply(product_rows()).order_by(models.Product.id).offset(skip).limit(limit)
+        products = await database.fetch_rows(db, statement)
+        entry = _build_entry(await serialize_product_rows(db, products, full_photos), products, filters)
+        product_cache.set(key, entry)
+    return _json_response(request, entry)
+
+@router.get("/page", response_model=schemas.ProductPage)
+async def get_products_page(
+    request: Request,
+    sort: str = "id",
+    cursor: Optional[str] = None,
+    limit: int = Query(24, ge=1, le=100),
+    full_photos: bool = False,
+    filters: ProductFilters = Depends(),
+    db=Depends(database.get_async_read_db),
+):
+    columns = _sort_columns(sort)
+    key = ("page", sort, cursor, limit, full_photos, filters.cache_key())
+    entry = product_cache.get(key)
+    if entry is not None:
+        return _json_response(request, entry)
+
+    descending = sort.startswith("-")
+    statement = filters.apply(product_rows())
+
+    if cursor:
+        values = _decode_cursor(cursor, sort, len(columns))
+        position = tuple_(*columns)
+        statement = statement.filter(position < tuple_(*values) if descending else position > tuple_(*values))
+
+    order_by = [c.desc() for c in columns] if descending else columns
+    # Fetch one extra row to know whether another page exists
+    products = await database.fetch_rows(db, statement.order_by(*order_by).limit(limit + 1))
+
+    next_cursor = None
+    if len(products) > limit:
+        products = products[:limit]
+        last = products[-1]
+        next_cursor = _encode_cursor(sort, _sort_values(last, sort))
+
+    items = await serialize_product_rows(db, products, full_photos)
+    entry = _build_entry({"items": items, "next_cursor": next_cursor}, products, filters)
+    product_cache.set(key, entry)
+    return _json_response(request, entry)
+
+@router.get("/search", response_model=schemas.ProductSearchPage)
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(24, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000),
+    facets: bool = True,
+    full_photos: bool = False,
+    filters: ProductFilters = Depends(),
+    db=Depends(database.get_async_read_db),
+):
+    terms = search.search_terms(q)
+    if not terms:
+        raise HTTPException(status_code=400, detail="Search query has no searchable words")
+
+    matched, rank = search.apply_search(filters.apply(product_rows()), db.get_bind().dialect.name, terms)
+    products = await database.fetch_rows(db, matched.order_by(rank, models.Product.id).offset(offset).limit(limit))
+
+    facet_counts = {}
+    if facets:
+        total, facet_counts = search.count_facets(await database.fetch_rows(db, search.facet_query(matched)))
+    elif len(products) < limit and (products or not offset):
+        total = offset + len(products)
+    else:
+        total = await database.fetch_scalar(db, matched.with_only_columns(func.count()))
+    items = await serialize_product_rows(db, products, full_photos)
+    return serialization.FastJSONResponse({"items": items, "total": total, "facets": facet_counts})
+
+@router.get("/facets", response_model=schemas.ProductFacets)
+async def get_facets(filters: ProductFilters = Depends(), db=Depends(database.get_async_read_db)):
+    """Product counts per filter value among the products matching `filters`, from the facet index."""
+    if filters.min_rating is not None:
+        raise HTTPException(status_code=400, detail="min_rating is not supported here")
+    buckets = facets.buckets_between(filters.min_price, filters.max_price)
+    if buckets is None:
+        bounds = ", ".join(str(b) for b in facets.PRICE_BUCKETS)
+        raise HTTPException(status_code=400, detail=f"min_price and max_price must be price bucket bounds: {bounds}")
+    unbounded = filters.min_price is None and filters.max_price is None
+    statement = facets.facet_rows(filters.category, filters.color, filters.fabric, None if unbounded else buckets)
+    rows = await database.fetch_rows(db, statement)
+    return serialization.FastJSONResponse(facets.counts(rows, filters.tags))
+
+@router.post("/bulk/import", response_model=schemas.BulkImportResult, dependencies=[Depends(get_current_admin)])
+def import_products(file: UploadFile = File(...), fmt: Optional[str] = Query(None, alias="format"), db: Session = Depends(database.get_db)):
+    """Create or update products from a CSV or NDJSON upload; rows with an `id` update that product."""
+    detected = catalog.detect_format(fmt, file.filename)
+    if detected is None:
+        raise HTTPException(status_code=400, detail=f"Unsupported format. Use one of: {', '.join(catalog.FORMATS)}")
+    result = catalog.import_products(db, file.file, detected)
+    if result["created"] or result["updated"]:
+        clear_catalog_cache()
+    return result
+
+@router.get("/bulk/export", dependencies=[Depends(get_current_admin)])
+def export_products(fmt: str = Query("csv", alias="format")):
+    if fmt not in catalog.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format. Use one of: {', '.join(catalog.FORMATS)}")
+    return StreamingResponse(
+        catalog.export_products(fmt),
+        media_type=catalog.FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="products.{fmt}"'},
+    )
 
 @router.get("/{product_id}", response_model=schemas.ProductResponse)
-def get_product(product_id: int, db: Session = Depends(database.get_db)):
-    product = db.query(models.Product).filter(models.Product.id == product_id).first()
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return product
+async def get_product(request: Request, product_id: int, db=Depends(database.get_async_read_db)):
+    key = ("product", product_id)
+    entry = product_cache.get(key)
+    if entry is None:
+        products = await database.fetch_rows(db, product_rows().where(models.Product.id == product_id))
+        if not products:
+            raise HTTPException(status_code=404, detail="Product not found")
+        entry = _build_entry((await serialize_product_rows(db, products, full_photos=True))[0], products)
+        product_cache.set(key, entry)
+    return _json_response(request, entry)
 
 @router.post("/", response_model=schemas.ProductResponse, dependencies=[Depends(get_current_admin)])
 def create_product(product: schemas.ProductCreate, db: Session = Depends(database.get_db)):
-    # Auto calc discount_price if discount_percentage is provided but price is 0
-    dp = product.discount_price
-    if dp == 0 and product.discount_percentage > 0:
-        dp = product.mrp * (1 - (product.discount_percentage / 100))
-    elif dp == 0:
-        dp = product.mrp
-
     db_product = models.Product(
         name=product.name,
         description=product.description,
@@ -36,16 +416,18 @@ def create_product(product: schemas.ProductCreate, db: Session = Depends(databas
         fabric=product.fabric,
         rating=product.rating,
         category=product.category,
-        tags=product.tags,
         mrp=product.mrp,
         discount_percentage=product.discount_percentage,
-        discount_price=dp,
+        discount_price=product.resolved_discount_price(),
         photos=product.photos,
         stock=product.stock
     )
     db.add(db_product)
+    _assign_tags(db, db_product, product.tags)
+    pricing.refresh_effective_prices(db, models.Product.id == db_product.id)
     db.commit()
     db.refresh(db_product)
+    invalidate_products(db_product)
     return db_product
 
 @router.put("/{product_id}", response_model=schemas.ProductResponse, dependencies=[Depends(get_current_admin)])
@@ -53,12 +435,7 @@ def update_product(product_id: int, product: schemas.ProductCreate, db: Session
     db_product = db.query(models.Product).filter(models.Product.id == product_id).first()
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
-
-    dp = product.discount_price
-    if dp == 0 and product.discount_percentage > 0:
-        dp = product.mrp * (1 - (product.discount_percentage / 100))
-    elif dp == 0:
-        dp = product.mrp
+    before = _snapshot(db_product)
 
     db_product.name = product.name
     db_product.description = product.description
@@ -66,15 +443,19 @@ def update_product(product_id: int, product: schemas.ProductCreate, db: Session
     db_product.fabric = product.fabric
     db_product.rating = product.rating
     db_product.category = product.category
-    db_product.tags = product.tags
+    _assign_tags(db, db_product, product.tags)
     db_product.mrp = product.mrp
     db_product.discount_percentage = product.discount_percentage
-    db_product.discount_price = dp
+    db_product.discount_price = product.resolved_discount_price()
     db_product.photos = product.photos
     db_product.stock = product.stock
+    db_product.version += 1
+    db.flush()
+    pricing.refresh_effective_prices(db, models.Product.id == product_id)
 
     db.commit()
     db.refresh(db_product)
+    invalidate_products(before, db_product)
     return db_product
 
 @router.delete("/{product_id}", dependencies=[Depends(get_current_admin)])
@@ -82,24 +463,44 @@ def delete_product(product_id: int, db: Session = Depends(database.get_db)):
     product = db.query(models.Product).filter(models.Product.id == product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
+    before = _snapshot(product)
+    facets.remove(db, product)
     db.delete(product)
     db.commit()
+    invalidate_products(before)
     return {"detail": "Product deleted successfully"}
 
 class BulkDiscountRequest(BaseModel):
-    category: str
-    discount_percentage: float
+    discount_percentage: float = Field(..., ge=0, le=100)
+    # Selectors; every one given must match and at least one is required
+    category: Optional[str] = None
+    tags: Optional[List[str]] = None
+    min_mrp: Optional[float] = None
+    max_mrp: Optional[float] = None
+    ids: Optional[List[int]] = None
 
 @router.post("/bulk-discount", dependencies=[Depends(get_current_admin)])
 def apply_bulk_discount(req: BulkDiscountRequest, db: Session = Depends(database.get_db)):
-    products = db.query(models.Product).filter(models.Product.category == req.category).all()
-    updated_count = 0
-    for p in products:
-        p.discount_percentage = req.discount_percentage
-        p.discount_price = p.mrp * (1 - (req.discount_percentage / 100))
-        updated_count += 1
+    selector = pricing.product_selector(
+        category=req.category, tags=req.tags, min_mrp=req.min_mrp, max_mrp=req.max_mrp, ids=req.ids,
+    )
+    if not selector:
+        raise HTTPException(status_code=400, detail="Select products by category, tags, mrp range or ids")
+    updated_count = db.execute(
+        update(models.Product)
+        .where(*selector)
+        .values(
+            discount_percentage=req.discount_percentage,
+            discount_price=models.Product.mrp * (1 - req.discount_percentage / 100),
+            version=models.Product.version + 1,
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    pricing.refresh_effective_prices(db, *selector)
     db.commit()
-    return {"detail": f"Updated {updated_count} products in category '{req.category}'"}
+    # Prices feed listing filters and sort order, so any cached listing may have changed
+    clear_catalog_cache()
+    return {"detail": f"Updated {updated_count} products", "updated": updated_count}
 
 @router.post("/seed")
 def seed_dummy_data(db: Session = Depends(database.get_db)):
@@ -123,8 +524,8 @@ def seed_dummy_data(db: Session = Depends(database.get_db)):
         "https://images.unsplash.com/photo-1620799140408-edc6dcb6d633?auto=format&fit=crop&q=80&w=800"
     ]
 
-    for d in dummies:
-        p = models.Product(
+    catalog.save_products(db, [
+        (None, schemas.ProductCreate(
             name=d["name"],
             description=f"Premium quality {d['name']} tailored for comfort and durability.",
             category=d["cat"],
@@ -137,7 +538,9 @@ def seed_dummy_data(db: Session = Depends(database.get_db)):
             color=d.get("color"),
             fabric=d.get("fabric"),
             rating=d.get("rating")
-        )
-        db.add(p)
+        ))
+        for d in dummies
+    ])
     db.commit()
+    clear_catalog_cache()
     return {"detail": "Dummy data seeded"}
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field, field_validator
 from typing import List, Optional, Dict
-from datetime import datetime
+from datetime import date, datetime, timezone
 
 class UserBase(BaseModel):
     email: EmailStr
@@ -49,14 +49,49 @@ class ProductBase(BaseModel):
     stock: int
 
 class ProductCreate(ProductBase):
-    pass
+    def resolved_discount_price(self) -> float:
+        # A discount_price of 0 means "derive it": from discount_percentage if set, else the MRP
+        if self.discount_price == 0 and self.discount_percentage > 0:
+            return self.mrp * (1 - (self.discount_percentage / 100))
+        if self.discount_price == 0:
+            return self.mrp
+        return self.discount_price
 
 class ProductResponse(ProductBase):
     id: int
+    thumbnail: Optional[str] = None
+    # discount_price, or the active price rule's price when one applies
+    effective_price: Optional[float] = None
 
     class Config:
         orm_mode = True
 
+class ProductPage(BaseModel):
+    items: List[ProductResponse]
+    next_cursor: Optional[str] = None
+
+class ProductSearchPage(BaseModel):
+    items: List[ProductResponse]
+    total: int
+    # field -> value -> number of matching products
+    facets: Dict[str, Dict[str, int]] = {}
+
+class ProductFacets(BaseModel):
+    total: int
+    # category, color, fabric, tags and price (bucket label) -> value -> number of matching products
+    facets: Dict[str, Dict[str, int]] = {}
+
+class BulkRowError(BaseModel):
+    row: int
+    error: str
+
+class BulkImportResult(BaseModel):
+    created: int
+    updated: int
+    failed: int
+    errors: List[BulkRowError] = []
+    errors_truncated: bool = False
+
 class OrderItemBase(BaseModel):
     product_id: int
     quantity: int
@@ -87,7 +122,57 @@ class OrderResponse(BaseModel):
     class Config:
         orm_mode = True
 
+class InvoiceExportRequest(BaseModel):
+    order_ids: Optional[List[int]] = None
+    start: Optional[date] = None
+    end: Optional[date] = None
+
 class RevenueStats(BaseModel):
     total_sales: float
     order_count: int
     status_counts: Dict[str, int] = {}
+
+class DailyRevenue(BaseModel):
+    day: date
+    revenue: float
+    order_count: int
+
+class CategoryRevenue(BaseModel):
+    category: str
+    revenue: float
+    units: int
+
+class RevenueReport(RevenueStats):
+    start: Optional[date] = None
+    end: Optional[date] = None
+    daily: List[DailyRevenue] = []
+    categories: List[CategoryRevenue] = []
+
+class PriceRuleBase(BaseModel):
+    name: str
+    discount_percentage: float = Field(..., gt=0, le=100)
+    category: Optional[str] = None
+    min_mrp: Optional[float] = None
+    max_mrp: Optional[float] = None
+    starts_at: Optional[datetime] = None
+    ends_at: Optional[datetime] = None
+    priority: int = 0
+
+    @field_validator("starts_at", "ends_at")
+    @classmethod
+    def naive_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        # Stored naive in UTC like every other timestamp
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+class PriceRuleCreate(PriceRuleBase):
+    tag: Optional[str] = None
+
+class PriceRuleResponse(PriceRuleBase):
+    id: int
+    tag: Optional[str] = Field(None, validation_alias="tag_name")
+    created_at: datetime
+
+    class Config:
+        orm_mode = True
@@ -0,0 +1,154 @@
+"""Full-text product search.
+
+Postgres keeps a weighted `products.search_vector` tsvector (a generated
+column with a GIN index); SQLite keeps an external-content FTS5 table,
+`products_fts`, in step through triggers. Both are created by the
+`product_search` migration, and ensure_search_index() creates them on
+databases that were built with create_all. Neither object lives on the ORM
+model, so alembic/env.py skips them when comparing schemas.
+
+Every search term is matched as a prefix and all terms must match. Results are
+ranked by field weight: name, then category and tags, then colour and fabric,
+then description.
+"""
+import re
+
+from sqlalchemy import case, column, func, inspect, literal, literal_column, or_, select, table, text
+
+import models
+
+FTS_TABLE = "products_fts"
+SEARCH_COLUMN = "search_vector"
+SEARCH_INDEX = "ix_products_search_vector"
+MAX_TERMS = 8
+FACET_FIELDS = ("category", "color", "fabric", "tags")
+
+# bm25() weights in FTS_COLUMNS order
+FTS_COLUMNS = ("name", "description", "category", "tags", "color", "fabric")
+FTS_WEIGHTS = (10.0, 1.0, 4.0, 4.0, 2.0, 2.0)
+
+_SQLITE_DDL = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        {", ".join(FTS_COLUMNS)},
+        content='products', content_rowid='id', tokenize='porter unicode61', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON products BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {", ".join(FTS_COLUMNS)})
+        VALUES (new.id, {", ".join("new." + c for c in FTS_COLUMNS)});
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON products BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {", ".join(FTS_COLUMNS)})
+        VALUES ('delete', old.id, {", ".join("old." + c for c in FTS_COLUMNS)});
+    END""",
+    # Only the indexed columns, so stock and price updates never touch the index
+    f"""CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF {", ".join(FTS_COLUMNS)} ON products BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {", ".join(FTS_COLUMNS)})
+        VALUES ('delete', old.id, {", ".join("old." + c for c in FTS_COLUMNS)});
+        INSERT INTO {FTS_TABLE}(rowid, {", ".join(FTS_COLUMNS)})
+        VALUES (new.id, {", ".join("new." + c for c in FTS_COLUMNS)});
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+_POSTGRES_DDL = [
+    f"""ALTER TABLE products ADD COLUMN {SEARCH_COLUMN} tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(category, '') || ' ' || coalesce(tags, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(color, '') || ' ' || coalesce(fabric, '')), 'C') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'D')
+    ) STORED""",
+    f"CREATE INDEX {SEARCH_INDEX} ON products USING gin ({SEARCH_COLUMN})",
+]
+
+
+def is_search_object(name: str, type_: str) -> bool:
+    """True for the hand-managed search objects autogenerate should not try to drop."""
+    if type_ == "table":
+        return name == FTS_TABLE or name.startswith(FTS_TABLE + "_")
+    if type_ == "column":
+        return name == SEARCH_COLUMN
+    if type_ == "index":
+        return name == SEARCH_INDEX
+    return False
+
+
+def ensure_search_index(bind) -> bool:
+    """Create the search index if this database lacks it; returns True when it was created."""
+    dialect = bind.dialect.name
+    with bind.begin() as conn:
+        if dialect == "sqlite":
+            if inspect(conn).has_table(FTS_TABLE):
+                return False
+            statements = _SQLITE_DDL
+        elif dialect == "postgresql":
+            if any(c["name"] == SEARCH_COLUMN for c in inspect(conn).get_columns("products")):
+                return False
+            statements = _POSTGRES_DDL
+        else:
+            return False
+        for statement in statements:
+            conn.execute(text(statement))
+    return True
+
+
+def search_terms(q: str) -> list:
+    """Lower-cased word tokens of `q`; anything else is dropped, so terms are safe to splice into match syntax."""
+    return re.findall(r"\w+", q.lower())[:MAX_TERMS]
+
+
+def apply_search(statement, dialect: str, terms: list):
+    """Restrict a select over products to rows matching every term; returns (statement, rank).
+
+    Lower rank sorts first.
+    """
+    product = models.Product
+    if dialect == "postgresql":
+        query = func.to_tsquery(literal("english"), " & ".join(f"{t}:*" for t in terms))
+        vector = literal_column(f"products.{SEARCH_COLUMN}")
+        return statement.where(vector.op("@@")(query)), -func.ts_rank_cd(vector, query)
+
+    if dialect == "sqlite":
+        # Materialized so the FTS index always drives the plan; otherwise SQLite
+        # may walk a products index for the filters and run MATCH once per row.
+        fts = table(FTS_TABLE, column("rowid"))
+        matches = (
+            select(fts.c.rowid.label("id"), func.bm25(literal_column(FTS_TABLE), *FTS_WEIGHTS).label("rank"))
+            .where(literal_column(FTS_TABLE).op("MATCH")(" ".join(f'"{t}"*' for t in terms)))
+            .cte("search_matches")
+            .prefix_with("MATERIALIZED")
+        )
+        return statement.join(matches, matches.c.id == product.id), matches.c.rank
+
+    # No full-text support: substring match, names first
+    fields = [getattr(product, c) for c in FTS_COLUMNS]
+    for term in terms:
+        statement = statement.where(or_(*(f.ilike(f"%{term}%") for f in fields)))
+    return statement, case((product.name.ilike(f"%{terms[0]}%"), 0), else_=1)
+
+
+def facet_query(matched):
+    """A single GROUP BY over every facet field of the matched (and filtered) products."""
+    fields = [getattr(models.Product, field) for field in FACET_FIELDS]
+    return matched.with_only_columns(*fields, func.count()).group_by(*fields)
+
+
+def count_facets(rows):
+    """Fold facet_query() rows into (total, {field: {value: count}}), most common values first.
+
+    Tags are comma separated, so each tag gets its own bucket.
+    """
+    total = 0
+    facets = {field: {} for field in FACET_FIELDS}
+    for row in rows:
+        count = row[-1]
+        total += count
+        for field, value in zip(FACET_FIELDS, row):
+            if value is None:
+                continue
+            values = [v.strip() for v in value.split(",") if v.strip()] if field == "tags" else [value]
+            for v in values:
+                facets[field][v] = facets[field].get(v, 0) + count
+    return total, {
+        field: dict(sorted(counts.items(), key=lambda item: (-item[1], item[0])))
+        for field, counts in facets.items()
+    }
@@ -0,0 +1,69 @@
+"""JSON encoding and response compression for the hot read endpoints.
+
+Listing handlers build plain dicts from column rows and encode them here,
+skipping the ORM identity map and a second round of Pydantic validation.
+orjson is used when installed, the json module otherwise; brotli is used
+for compression when installed and the client accepts it, gzip otherwise.
+"""
+import gzip
+import json
+from datetime import date, datetime
+from typing import Optional
+
+from fastapi.responses import JSONResponse
+
+from database import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded with dumps(); the content must already be plain JSON types."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def negotiate(accept_encoding: Optional[str], size: int) -> Optional[str]:
+    """The encoding to compress a `size` byte body with, or None to send it as-is."""
+    if not settings.compression_min_bytes or size < settings.compression_min_bytes or not accept_encoding:
+        return None
+    accepted = {
+        part.split(";")[0].strip().lower()
+        for part in accept_encoding.split(",")
+        if not part.strip().endswith(";q=0")
+    }
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
@@ -0,0 +1,152 @@
+"""Cold start: schema setup at import, then warm-up and readiness for GET /ready.
+
+A database that Alembic manages (`alembic upgrade head` runs on deploy) has
+an alembic_version table. For one of those, ensure_schema() issues that one
+query and skips create_all(), which would otherwise reflect every table on
+every worker start. Other databases, such as a fresh local SQLite file, still
+get their tables created here.
+
+warm_up() runs in the background once the app is serving. It does the work
+the first visitors would otherwise pay for: it opens pool connections,
+requests WARMUP_PATHS through the app so the catalog cache fills, and checks
+the schema revision against the migration scripts (an import kept off the
+startup path). GET /ready answers 503 until warm_up() has finished, so a
+health check or load balancer can hold traffic back until then.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+from sqlalchemy import inspect, text
+from starlette.concurrency import run_in_threadpool
+
+import search
+from database import Base, async_engine, engine, settings
+
+logger = logging.getLogger(__name__)
+
+IMPORTED_AT = time.monotonic()
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+
+_state = {"ready": False, "schema_revision": None, "schema_at_head": None, "connections": 0, "paths": {}, "warmup_seconds": None}
+
+
+def _alembic_revision(bind) -> Optional[str]:
+    with bind.connect() as conn:
+        if not inspect(conn).has_table("alembic_version"):
+            return None
+        return conn.execute(text("SELECT version_num FROM alembic_version")).scalar()
+
+
+def ensure_schema(bind) -> bool:
+    """Create tables and the search index unless Alembic manages this database; returns True if it ran DDL."""
+    revision = _alembic_revision(bind)
+    _state["schema_revision"] = revision
+    if revision is not None:
+        return False
+    Base.metadata.create_all(bind=bind)
+    search.ensure_search_index(bind)
+    return True
+
+
+def _schema_at_head() -> Optional[bool]:
+    if _state["schema_revision"] is None:
+        return None
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    heads = ScriptDirectory.from_config(Config(ALEMBIC_INI)).get_heads()
+    return _state["schema_revision"] in heads
+
+
+def _open_connections(count: int) -> int:
+    # Hold them all at once so the pool has to open `count` distinct connections
+    connections = []
+    try:
+        for _ in range(count):
+            connections.append(engine.connect())
+        connections[0].execute(text("SELECT 1"))
+    finally:
+        for conn in connections:
+            conn.close()
+    return len(connections)
+
+
+async def _open_async_connections(count: int):
+    connections = []
+    try:
+        for _ in range(count):
+            connections.append(await async_engine.connect())
+    finally:
+        for conn in connections:
+            await conn.close()
+
+
+async def _get(app, path: str) -> int:
+    """Run GET `path` through the whole middleware stack in-process, as a first visitor would; returns the status."""
+    url = urlsplit(path)
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": url.path,
+        "raw_path": url.path.encode(),
+        "query_string": url.query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"warmup"), (b"accept-encoding", b"gzip, deflate, br"), (b"user-agent", b"qmexai-warmup")],
+        "client": ("127.0.0.1", 0),
+        "server": ("warmup", 80),
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def warm_up(app):
+    """Get this worker ready for traffic, then mark it ready; retries until the database answers."""
+    started = time.monotonic()
+    count = max(1, min(settings.warmup_connections, settings.db_pool_size))
+    while True:
+        try:
+            _state["connections"] = await run_in_threadpool(_open_connections, count)
+            if async_engine is not None:
+                await _open_async_connections(count)
+            break
+        except Exception:
+            logger.warning("Warm-up could not reach the database; retrying", exc_info=True)
+            await asyncio.sleep(1)
+
+    for path in filter(None, (p.strip() for p in settings.warmup_paths.split(","))):
+        try:
+            _state["paths"][path] = await _get(app, path)
+        except Exception:
+            logger.exception("Warm-up request for %s failed", path)
+            _state["paths"][path] = None
+
+    try:
+        _state["schema_at_head"] = await run_in_threadpool(_schema_at_head)
+        if _state["schema_at_head"] is False:
+            logger.warning("Database schema %s is not at the migration head; run `alembic upgrade head`", _state["schema_revision"])
+    except Exception:
+        logger.exception("Could not compare the schema revision with the migration scripts")
+
+    _state["warmup_seconds"] = round(time.monotonic() - started, 3)
+    _state["ready"] = True
+
+
+def readiness() -> dict:
+    return {**_state, "paths": dict(_state["paths"]), "uptime_seconds": round(time.monotonic() - IMPORTED_AT, 3)}
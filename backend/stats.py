@@ -0,0 +1,203 @@
+"""Incrementally maintained revenue aggregates for the admin dashboard.
+
+Status transitions made by an admin call the record_* helpers inside their
+own transaction, so the aggregates commit or roll back together with the
+order. Checkout and the automatic Pending -> Processing move leave it to a
+job enqueued in that transaction (see jobs.py). An order counts once its
+order.placed job has set orders.stats_recorded; a status change made before
+that moves nothing, and the job counts the order under its status by then.
+rebuild() and reconcile() only look at recorded orders, so orders whose job
+is still waiting are neither double counted nor reported as drift.
+reconcile() recomputes everything from the raw tables and reports (or
+repairs) any drift; run it from cron with `python stats.py [--repair]`.
+"""
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+import models
+
+REVENUE_TOLERANCE = 0.01
+
+
+def increment(db: Session, model, keys: dict, **deltas):
+    """Add `deltas` to the aggregate row identified by `keys`, creating it if needed."""
+    table = model.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert_fn = pg_insert if dialect == "postgresql" else sqlite_insert
+        statement = insert_fn(table).values(**keys, **deltas)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={column: table.c[column] + statement.excluded[column] for column in deltas},
+        )
+        db.execute(statement)
+        return
+    conditions = [table.c[column] == value for column, value in keys.items()]
+    updated = db.execute(
+        update(table).where(*conditions).values({column: table.c[column] + value for column, value in deltas.items()})
+    ).rowcount
+    if not updated:
+        db.execute(insert(table).values(**keys, **deltas))
+
+
+def record_order(db: Session, order: models.Order, lines, status: Optional[str] = None):
+    """Count a newly placed order. `lines` is an iterable of (category, quantity, unit_price).
+
+    `status` is the order's current one, when `order` may be stale.
+    """
+    day = order.created_at.date()
+    increment(db, models.OrderStatsDaily, {"day": day, "status": status or order.status}, order_count=1, revenue=order.total_amount)
+    for category, quantity, price in lines:
+        increment(
+            db, models.CategoryRevenueDaily, {"day": day, "category": category or ""},
+            units=quantity, revenue=price * quantity,
+        )
+
+
+def record_status_change(db: Session, order: models.Order, old_status: str):
+    """Move an order between status buckets; call after setting order.status, before committing."""
+    if old_status == order.status:
+        return
+    day = order.created_at.date()
+    increment(db, models.OrderStatsDaily, {"day": day, "status": old_status}, order_count=-1, revenue=-order.total_amount)
+    increment(db, models.OrderStatsDaily, {"day": day, "status": order.status}, order_count=1, revenue=order.total_amount)
+
+
+def _in_range(statement, column, start: Optional[date], end: Optional[date]):
+    if start is not None:
+        statement = statement.where(column >= start)
+    if end is not None:
+        statement = statement.where(column <= end)
+    return statement
+
+
+def status_totals_query(start: Optional[date] = None, end: Optional[date] = None):
+    stats = models.OrderStatsDaily
+    statement = select(stats.status, func.sum(stats.order_count), func.sum(stats.revenue)).group_by(stats.status)
+    return _in_range(statement, stats.day, start, end)
+
+
+def daily_totals_query(start: Optional[date] = None, end: Optional[date] = None):
+    stats = models.OrderStatsDaily
+    statement = select(stats.day, func.sum(stats.revenue), func.sum(stats.order_count)).group_by(stats.day).order_by(stats.day)
+    return _in_range(statement, stats.day, start, end)
+
+
+def category_totals_query(start: Optional[date] = None, end: Optional[date] = None):
+    stats = models.CategoryRevenueDaily
+    statement = (
+        select(stats.category, func.sum(stats.revenue), func.sum(stats.units))
+        .group_by(stats.category)
+        .order_by(func.sum(stats.revenue).desc())
+    )
+    return _in_range(statement, stats.day, start, end)
+
+
+def summarize_status_rows(rows) -> dict:
+    status_counts = {status: int(count) for status, count, _ in rows if count}
+    return {
+        "total_sales": round(sum(revenue or 0.0 for _, _, revenue in rows), 2),
+        "order_count": sum(status_counts.values()),
+        "status_counts": status_counts,
+    }
+
+
+def _raw_order_buckets():
+    order = models.Order
+    day = func.date(order.created_at)
+    return (
+        select(day, order.status, func.count(order.id), func.sum(order.total_amount))
+        .where(order.stats_recorded)
+        .group_by(day, order.status)
+    )
+
+
+def _raw_category_buckets():
+    order, item, product = models.Order, models.OrderItem, models.Product
+    day = func.date(order.created_at)
+    category = func.coalesce(product.category, "")
+    return (
+        select(day, category, func.sum(item.quantity), func.sum(item.price * item.quantity))
+        .select_from(item)
+        .join(order, item.order_id == order.id)
+        .join(product, item.product_id == product.id)
+        .where(order.stats_recorded)
+        .group_by(day, category)
+    )
+
+
+def rebuild(db: Session):
+    """Recompute both aggregate tables from the recorded orders and their order_items."""
+    db.execute(delete(models.OrderStatsDaily))
+    db.execute(delete(models.CategoryRevenueDaily))
+    stats, categories = models.OrderStatsDaily.__table__, models.CategoryRevenueDaily.__table__
+    db.execute(insert(stats).from_select(["day", "status", "order_count", "revenue"], _raw_order_buckets()))
+    db.execute(insert(categories).from_select(["day", "category", "units", "revenue"], _raw_category_buckets()))
+    db.commit()
+
+
+def _compare(expected: dict, actual: dict, kind: str) -> list:
+    mismatches = []
+    for key in sorted(set(expected) | set(actual)):
+        want_count, want_revenue = expected.get(key, (0, 0.0))
+        have_count, have_revenue = actual.get(key, (0, 0.0))
+        if want_count != have_count or abs(want_revenue - have_revenue) > REVENUE_TOLERANCE:
+            mismatches.append({
+                "kind": kind,
+                "day": key[0],
+                "bucket": key[1],
+                "expected": {"count": want_count, "revenue": round(want_revenue, 2)},
+                "actual": {"count": have_count, "revenue": round(have_revenue, 2)},
+            })
+    return mismatches
+
+
+def reconcile(db: Session, repair: bool = False) -> dict:
+    """Verify the aggregates against the raw tables; rebuild them when `repair` is set and they drifted.
+
+    Category buckets are checked against each product's current category, so
+    recategorised products show up as drift until the next repair.
+    """
+    def bucket(rows):
+        return {(str(day)[:10], name): (int(count or 0), float(revenue or 0.0)) for day, name, count, revenue in rows}
+
+    stats, categories = models.OrderStatsDaily, models.CategoryRevenueDaily
+    mismatches = _compare(
+        bucket(db.execute(_raw_order_buckets()).all()),
+        {k: v for k, v in bucket(db.execute(select(stats.day, stats.status, stats.order_count, stats.revenue)).all()).items() if v[0]},
+        "status",
+    )
+    mismatches += _compare(
+        bucket(db.execute(_raw_category_buckets()).all()),
+        bucket(db.execute(select(categories.day, categories.category, categories.units, categories.revenue)).all()),
+        "category",
+    )
+    repaired = False
+    if mismatches and repair:
+        rebuild(db)
+        repaired = True
+    return {"consistent": not mismatches, "mismatches": mismatches, "repaired": repaired}
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Check the revenue aggregates against orders and order_items.")
+    parser.add_argument("--repair", action="store_true", help="rebuild the aggregates if they have drifted")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        report = reconcile(session, repair=args.repair)
+    finally:
+        session.close()
+    print(json.dumps(report, indent=2))
+    raise SystemExit(0 if report["consistent"] or report["repaired"] else 1)
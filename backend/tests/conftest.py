@@ -0,0 +1,65 @@
+"""Shared fixtures: the app on a throwaway database, plus admin, customer and product helpers.
+
+Tests run against a fresh SQLite file, or against TEST_DATABASE_URL (e.g. a
+disposable Postgres with the migrations applied). From backend/:
+
+    python -m pytest -q tests
+"""
+import itertools
+import os
+import sys
+import tempfile
+
+# Settings are read when `database` is imported, so point it at the test database first
+os.environ["DATABASE_URL"] = os.environ.get("TEST_DATABASE_URL") or f"sqlite:///{tempfile.mkdtemp()}/test.db"
+os.environ["CACHE_BUS"] = "local"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+PASSWORD = "test-password"
+_emails = itertools.count()
+
+
+def _login(client, email: str) -> dict:
+    client.post("/auth/register", json={"email": email, "password": PASSWORD})
+    token = client.post("/auth/login", data={"username": email, "password": PASSWORD}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture(scope="session")
+def client():
+    # Not entered as a context manager: no lifespan, so no background workers or warm-up
+    client = TestClient(main.app)
+    # The first account registered becomes the admin
+    client.admin_headers = _login(client, "admin@qmexai-test.com")
+    return client
+
+
+@pytest.fixture(scope="session")
+def admin_headers(client) -> dict:
+    return client.admin_headers
+
+
+@pytest.fixture
+def customer(client):
+    """Headers for a newly registered customer."""
+    return _login(client, f"customer-{next(_emails)}@qmexai-test.com")
+
+
+@pytest.fixture
+def make_product(client, admin_headers):
+    def make(**fields) -> dict:
+        body = {
+            "name": "Test product", "description": "A product for tests", "category": "Men",
+            "mrp": 100.0, "discount_price": 0, "stock": 10, "tags": "New Arrival",
+            "photos": ["https://example.com/a.jpg", "https://example.com/b.jpg"],
+        }
+        body.update(fields)
+        response = client.post("/products/", json=body, headers=admin_headers)
+        assert response.status_code == 200, response.text
+        return response.json()
+    return make
@@ -0,0 +1,27 @@
+"""Bulk import: a product listed twice in one batch is written once, from its last row."""
+import json
+
+
+def _ndjson(rows: list) -> bytes:
+    return "".join(json.dumps(row) + "\n" for row in rows).encode()
+
+
+def test_repeated_id_in_a_batch_keeps_the_last_row(client, admin_headers, make_product):
+    product = make_product(name="Imported", category="Imports")
+    base = {"id": product["id"], "description": "Imported", "category": "Imports", "mrp": 100.0, "stock": 5}
+    rows = [
+        {**base, "name": "First edit", "tags": "Sale", "photos": ["https://example.com/first.jpg"]},
+        {"name": "Brand new", "description": "New", "category": "Imports", "mrp": 50.0, "stock": 1},
+        {**base, "name": "Last edit", "tags": "Sale, Trending", "photos": ["https://example.com/last.jpg"]},
+    ]
+    response = client.post(
+        "/products/bulk/import", headers=admin_headers,
+        files={"file": ("products.ndjson", _ndjson(rows), "application/x-ndjson")},
+    )
+    assert response.status_code == 200, response.text
+    assert response.json() == {"created": 1, "updated": 1, "failed": 0, "errors": [], "errors_truncated": False}
+
+    saved = client.get(f"/products/{product['id']}").json()
+    assert saved["name"] == "Last edit"
+    assert saved["tags"] == "Sale, Trending"
+    assert saved["photos"] == ["https://example.com/last.jpg"]
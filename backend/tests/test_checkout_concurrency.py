@@ -0,0 +1,25 @@
+"""Concurrent checkouts never sell more than the stock on hand."""
+from concurrent.futures import ThreadPoolExecutor
+
+import models
+from database import SessionLocal
+
+STOCK = 5
+BUYERS = 20
+
+
+def test_concurrent_checkouts_do_not_oversell(client, customer, make_product):
+    product = make_product(name="Contested", stock=STOCK)
+    body = {"items": [{"product_id": product["id"], "quantity": 1}], "shipping_address": "1 Test Street"}
+
+    def attempt(_):
+        return client.post("/orders/checkout", json=body, headers=customer).status_code
+
+    with ThreadPoolExecutor(max_workers=BUYERS) as pool:
+        codes = list(pool.map(attempt, range(BUYERS)))
+
+    assert codes.count(200) == STOCK
+    assert all(code in (400, 409) for code in codes if code != 200), codes
+    with SessionLocal() as db:
+        assert db.get(models.Product, product["id"]).stock == 0
+        assert db.query(models.OrderItem).filter(models.OrderItem.product_id == product["id"]).count() == STOCK
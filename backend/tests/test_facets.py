@@ -0,0 +1,42 @@
+"""Facet counts stay exact when two writers sync the same product at once."""
+from sqlalchemy import event, select, update
+
+import facets, models
+from database import SessionLocal, engine
+
+
+def facet_counts(category: str) -> dict:
+    facet = models.ProductFacet
+    with SessionLocal() as db:
+        return dict(db.execute(select(facet.color, facet.product_count).where(facet.category == category)).all())
+
+
+def test_concurrent_syncs_move_a_product_once(make_product):
+    product_id = make_product(category="FacetRace", color="Red")["id"]
+    assert facet_counts("FacetRace") == {"Red": 1}
+    with SessionLocal() as db:
+        # A colour change whose facet sync has not run yet
+        db.execute(update(models.Product).where(models.Product.id == product_id).values(color="Blue"))
+        db.commit()
+
+    raced = []
+
+    def other_writer(conn, cursor, statement, parameters, context, executemany):
+        # After the first sync has read the stale key, a second sync moves the product and commits
+        if raced or not (statement.startswith("UPDATE products SET") and "facet_key" in statement):
+            return
+        raced.append(True)
+        with SessionLocal() as other:
+            assert facets.sync(other, models.Product.id == product_id) == 1
+            other.commit()
+
+    event.listen(engine, "before_cursor_execute", other_writer)
+    try:
+        with SessionLocal() as db:
+            moved = facets.sync(db, models.Product.id == product_id)
+            db.commit()
+    finally:
+        event.remove(engine, "before_cursor_execute", other_writer)
+
+    assert raced and moved == 0
+    assert facet_counts("FacetRace") == {"Blue": 1}
@@ -0,0 +1,37 @@
+"""Checkout retries with an Idempotency-Key replay the first order, or are told to come back later."""
+import time
+from datetime import datetime
+
+from sqlalchemy import update
+
+import models
+from database import SessionLocal
+
+
+def test_retry_while_the_original_runs_gets_409_at_once(client, customer, make_product):
+    product = make_product(name="Keyed")
+    body = {"items": [{"product_id": product["id"], "quantity": 1}], "shipping_address": "1 Key Street"}
+    headers = {**customer, "Idempotency-Key": "retry-while-running"}
+    first = client.post("/orders/checkout", json=body, headers=headers)
+    assert first.status_code == 200, first.text
+
+    # As if the first request had claimed the key and were still placing the order
+    with SessionLocal() as db:
+        db.execute(
+            update(models.IdempotencyKey)
+            .where(models.IdempotencyKey.key == "retry-while-running")
+            .values(status="in_progress", locked_at=datetime.utcnow())
+        )
+        db.commit()
+    started = time.monotonic()
+    retry = client.post("/orders/checkout", json=body, headers=headers)
+    assert retry.status_code == 409
+    assert retry.headers["Retry-After"] == "1"
+    assert time.monotonic() - started < 1
+
+    with SessionLocal() as db:
+        db.execute(update(models.IdempotencyKey).where(models.IdempotencyKey.key == "retry-while-running").values(status="done"))
+        db.commit()
+    replayed = client.post("/orders/checkout", json=body, headers=headers)
+    assert replayed.headers["Idempotent-Replayed"] == "true"
+    assert replayed.json()["id"] == first.json()["id"]
@@ -0,0 +1,15 @@
+"""/metrics answers only scrapes that send METRICS_TOKEN."""
+from database import settings
+
+
+def test_metrics_needs_the_token(client, monkeypatch):
+    assert client.get("/metrics").status_code == 404
+
+    monkeypatch.setattr(settings, "metrics_token", "scrape-secret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get("/metrics", headers=client.admin_headers).status_code == 401
+
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert response.status_code == 200
+    assert "http_requests_total" in response.text
@@ -0,0 +1,48 @@
+"""The order endpoints run a fixed number of SQL statements, however many orders or items there are."""
+from database import assert_max_queries
+
+# orders, items, products, photos
+PAGE_QUERIES = 4
+# one joined query for the order, its items, their products and primary photos
+DETAIL_QUERIES = 1
+
+
+def checkout(client, headers, product_ids) -> int:
+    body = {"items": [{"product_id": pid, "quantity": 1} for pid in product_ids], "shipping_address": "1 Test Street"}
+    response = client.post("/orders/checkout", json=body, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def count(client, url, headers) -> int:
+    # First call resolves and caches the token's user, which is not the endpoint's cost
+    assert client.get(url, headers=headers).status_code == 200
+    with assert_max_queries(PAGE_QUERIES + DETAIL_QUERIES) as statements:
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200, response.text
+    return len(statements)
+
+
+def test_statement_counts_do_not_grow_with_orders(client, admin_headers, customer, make_product):
+    product_ids = [make_product(name=f"Counted {i}", stock=1000)["id"] for i in range(3)]
+    first = checkout(client, customer, product_ids[:1])
+
+    before = {
+        "my_orders": count(client, "/orders/my-orders", customer),
+        "admin_orders": count(client, "/admin/orders?limit=100", admin_headers),
+        "order_detail": count(client, f"/orders/{first}", customer),
+    }
+    for _ in range(99):
+        last = checkout(client, customer, product_ids)
+    assert len(client.get("/orders/my-orders", headers=customer).json()) == 100
+
+    with assert_max_queries(before["my_orders"]):
+        client.get("/orders/my-orders", headers=customer)
+    with assert_max_queries(before["admin_orders"]):
+        client.get("/admin/orders?limit=100", headers=admin_headers)
+    with assert_max_queries(before["order_detail"]):
+        client.get(f"/orders/{last}", headers=customer)
+
+    assert before["my_orders"] <= PAGE_QUERIES
+    assert before["admin_orders"] <= PAGE_QUERIES
+    assert before["order_detail"] <= DETAIL_QUERIES
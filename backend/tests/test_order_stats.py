@@ -0,0 +1,82 @@
+"""The revenue aggregates count every order exactly once, whenever its order.placed job runs."""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, update
+
+import jobs, models, stats
+from database import SessionLocal
+
+
+def _drain():
+    while jobs.work_batch("tests"):
+        pass
+
+
+def _status_bucket(db, order: dict, status: str) -> tuple:
+    row = db.execute(
+        select(models.OrderStatsDaily.order_count, models.OrderStatsDaily.revenue)
+        .where(models.OrderStatsDaily.day == datetime.fromisoformat(order["created_at"]).date(), models.OrderStatsDaily.status == status)
+    ).first()
+    return tuple(row) if row else (0, 0.0)
+
+
+@pytest.fixture
+def settled(client):
+    """Run what other tests left queued and start from consistent aggregates."""
+    _drain()
+    with SessionLocal() as db:
+        stats.reconcile(db, repair=True)
+
+
+@pytest.fixture
+def place_order(client, customer, make_product):
+    def place() -> dict:
+        product = make_product(name="Counted", category="Stats", mrp=250.0)
+        body = {"items": [{"product_id": product["id"], "quantity": 2}], "shipping_address": "1 Stats Street"}
+        response = client.post("/orders/checkout", json=body, headers=customer)
+        assert response.status_code == 200, response.text
+        return response.json()
+    return place
+
+
+def test_reconcile_ignores_orders_waiting_for_their_job(settled, place_order):
+    order = place_order()
+    with SessionLocal() as db:
+        before = _status_bucket(db, order, "Pending")
+        report = stats.reconcile(db)
+        assert report["consistent"], report["mismatches"]
+        # A rebuild while the job waits must not count the order as well
+        stats.rebuild(db)
+
+    _drain()
+    with SessionLocal() as db:
+        assert stats.reconcile(db)["consistent"]
+        count, revenue = _status_bucket(db, order, "Pending")
+        assert (count - before[0], round(revenue - before[1], 2)) == (1, 500.0)
+
+
+def test_status_change_before_the_job_is_counted_once(client, admin_headers, settled, place_order):
+    order = place_order()
+    # Hold order.placed back so the move to Processing runs first
+    with SessionLocal() as db:
+        db.execute(
+            update(models.Job)
+            .where(models.Job.idempotency_key == f"order-placed:{order['id']}")
+            .values(run_at=datetime.utcnow() + timedelta(hours=1))
+        )
+        db.commit()
+        before = {status: _status_bucket(db, order, status) for status in ("Pending", "Processing")}
+    assert client.get(f"/admin/orders/{order['id']}", headers=admin_headers).status_code == 200
+    _drain()
+    with SessionLocal() as db:
+        assert db.get(models.Order, order["id"]).status == "Processing"
+        assert stats.reconcile(db, repair=True)["consistent"]
+        db.execute(update(models.Job).where(models.Job.idempotency_key == f"order-placed:{order['id']}").values(run_at=datetime.utcnow()))
+        db.commit()
+
+    _drain()
+    with SessionLocal() as db:
+        assert stats.reconcile(db)["consistent"]
+        assert _status_bucket(db, order, "Pending") == before["Pending"]
+        assert _status_bucket(db, order, "Processing")[0] == before["Processing"][0] + 1
@@ -0,0 +1,25 @@
+"""Price rules only ever lower a product's price."""
+
+
+def _rule(client, admin_headers, percentage: float, category: str) -> int:
+    body = {"name": f"{percentage}% off {category}", "discount_percentage": percentage, "category": category}
+    response = client.post("/admin/price-rules", json=body, headers=admin_headers)
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+def _price(client, product: dict) -> float:
+    return client.get(f"/products/{product['id']}").json()["effective_price"]
+
+
+def test_weaker_rule_keeps_the_discount_price(client, admin_headers, make_product):
+    product = make_product(name="Discounted", category="Rules", mrp=100.0, discount_price=60.0)
+
+    _rule(client, admin_headers, 10, "Rules")
+    assert _price(client, product) == 60.0
+
+    stronger = _rule(client, admin_headers, 50, "Rules")
+    assert _price(client, product) == 50.0
+
+    client.delete(f"/admin/price-rules/{stronger}", headers=admin_headers)
+    assert _price(client, product) == 60.0
@@ -0,0 +1,53 @@
+"""Keyset pages over sort keys that can be NULL return every product exactly once."""
+import pytest
+from sqlalchemy import update
+
+import models
+from database import SessionLocal
+
+RATINGS = [4.5, None, 3.0, None, 4.5, 1.0]
+NO_PRICE = 2
+
+
+def _page_through(client, sort: str) -> list:
+    ids, cursor = [], None
+    while True:
+        params = {"sort": sort, "limit": 2, "category": "Paging"}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/products/page", params=params).json()
+        ids += [p["id"] for p in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+@pytest.fixture(scope="module")
+def catalog(client, admin_headers):
+    ids = []
+    for i, rating in enumerate(RATINGS):
+        body = {
+            "name": f"Paged {i}", "description": "Paged", "category": "Paging", "rating": rating or 0,
+            "mrp": 100.0 + i, "discount_price": 0, "stock": 1, "photos": [],
+        }
+        response = client.post("/products/", json=body, headers=admin_headers)
+        assert response.status_code == 200, response.text
+        ids.append(response.json()["id"])
+    # As a product saved with a null rating or imported without a price has them
+    with SessionLocal() as db:
+        null_ratings = [product_id for product_id, rating in zip(ids, RATINGS) if rating is None]
+        db.execute(update(models.Product).where(models.Product.id.in_(null_ratings)).values(rating=None))
+        db.execute(update(models.Product).where(models.Product.id.in_(ids[:NO_PRICE])).values(effective_price=None))
+        db.commit()
+    return ids
+
+
+@pytest.mark.parametrize("sort", ["rating", "-rating", "price", "-price"])
+def test_every_product_is_paged_once(client, catalog, sort):
+    ids = _page_through(client, sort)
+    assert sorted(ids) == sorted(catalog)
+
+
+def test_null_ratings_sort_as_zero(client, catalog):
+    ids = _page_through(client, "rating")
+    assert set(ids[:2]) == {catalog[1], catalog[3]}
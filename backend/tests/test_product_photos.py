@@ -0,0 +1,12 @@
+"""Listings carry the photo product cards swap to on hover; product detail carries them all."""
+
+PHOTOS = [f"https://example.com/photo-{i}.jpg" for i in range(4)]
+
+
+def test_listing_includes_hover_photo(client, make_product):
+    product = make_product(name="Photographed", category="Photos", photos=PHOTOS)
+
+    listed = {p["id"]: p for p in client.get("/products/?category=Photos").json()}
+    assert listed[product["id"]]["photos"] == PHOTOS[:2]
+    assert client.get("/products/?category=Photos&full_photos=true").json()[0]["photos"] == PHOTOS
+    assert client.get(f"/products/{product['id']}").json()["photos"] == PHOTOS
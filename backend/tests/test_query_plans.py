@@ -0,0 +1,193 @@
+"""EXPLAIN the SQL the hot order paths send and fail on full table scans.
+
+Each scenario runs the real app code while capturing its statements, then
+EXPLAINs every one with its parameters. On SQLite a bare `SCAN <table>` is a
+full scan, while `SCAN <table> USING INDEX` walks an index in order (what a
+LIMITed newest-first page should do). On Postgres a Seq Scan is a full scan.
+Seq scans are switched off first, so a small seeded table does not make the
+planner prefer one.
+"""
+import asyncio
+import random
+import re
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import event, insert, select, text
+
+import invoices, jobs, models
+from database import SessionLocal, engine
+from routers.admin import get_all_orders
+from routers.orders import fetch_order_page, load_order
+
+# Big enough that fetching a page's worth of rows by key beats scanning, as in production
+PRODUCTS = 2000
+ORDERS = 3000
+USERS = 30
+JOBS = 2000
+ORDER_TABLES = {"orders", "order_items", "products", "product_photos"}
+
+
+@pytest.fixture(scope="module")
+def seeded(client):
+    """A catalog, users with a few thousand orders spread over 90 days, and a finished job history.
+
+    Returns (user_id, order_id).
+    """
+    random.seed(21)
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        user_ids = db.scalars(insert(models.User).returning(models.User.id, sort_by_parameter_order=True), [
+            {"email": f"plans-{i}@qmexai-test.com", "hashed_password": "x", "is_admin": False} for i in range(USERS)
+        ]).all()
+        product_ids = db.scalars(insert(models.Product).returning(models.Product.id, sort_by_parameter_order=True), [
+            {"name": f"Planned {i}", "category": "Plans", "mrp": 100.0, "discount_price": 90.0, "effective_price": 90.0, "stock": 100}
+            for i in range(PRODUCTS)
+        ]).all()
+        statuses = ["Pending", "Processing", "Shipped", "Delivered"]
+        order_ids = db.scalars(insert(models.Order).returning(models.Order.id, sort_by_parameter_order=True), [
+            {
+                "user_id": random.choice(user_ids), "total_amount": 180.0, "status": random.choice(statuses),
+                "shipping_address": "1 Plan Street", "created_at": now - timedelta(days=90) + timedelta(minutes=43 * i),
+            }
+            for i in range(ORDERS)
+        ]).all()
+        db.execute(insert(models.OrderItem), [
+            {"order_id": order_id, "product_id": random.choice(product_ids), "quantity": 1, "price": 90.0}
+            for order_id in order_ids for _ in range(2)
+        ])
+        # Mostly finished, with a few waiting and failed, as the worker leaves it
+        db.execute(insert(models.Job), [
+            {"kind": "order.placed", "payload": {}, "status": status, "attempts": 1, "run_at": now, "created_at": now}
+            for status in random.choices(["done", "failed", "queued"], weights=[95, 3, 2], k=JOBS)
+        ])
+        db.commit()
+        # Planner statistics, as a database that has been running for a while would have
+        db.execute(text("ANALYZE"))
+        db.commit()
+        user_id = db.scalar(select(models.Order.user_id).where(models.Order.id == order_ids[-1]))
+    return user_id, order_ids[-1]
+
+
+def capture(fn) -> list:
+    """The (statement, parameters) pairs `fn` sends through the engine."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return statements
+
+
+def _base_table(name: str) -> str:
+    # SQLAlchemy aliases joined tables as <table>_<n>
+    return re.sub(r"_\d+$", "", name)
+
+
+def _sqlite_plan(cursor, statement: str, parameters) -> tuple:
+    cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+    scanned, indexes = set(), set()
+    for line in (row[3] for row in cursor.fetchall()):
+        match = re.match(r"(SCAN|SEARCH) (\w+)(?: AS \w+)?(?: USING (?:COVERING )?INDEX (\w+))?", line)
+        if not match:
+            continue
+        if match.group(3):
+            indexes.add(match.group(3))
+        elif match.group(1) == "SCAN":
+            scanned.add(_base_table(match.group(2)))
+    return scanned, indexes
+
+
+def _postgres_nodes(node: dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _postgres_nodes(child)
+
+
+def _postgres_plan(cursor, statement: str, parameters) -> tuple:
+    cursor.execute(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+    scanned, indexes = set(), set()
+    for node in _postgres_nodes(cursor.fetchone()[0][0]["Plan"]):
+        if node["Node Type"] == "Seq Scan":
+            scanned.add(node["Relation Name"])
+        if "Index Name" in node:
+            indexes.add(node["Index Name"])
+    return scanned, indexes
+
+
+def explain(fn) -> tuple:
+    """Run `fn`; return (tables fully scanned, indexes used) over every query it sent."""
+    statements = capture(fn)
+    postgres = engine.dialect.name == "postgresql"
+    scanned, indexes = set(), set()
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        if postgres:
+            cursor.execute("SET enable_seqscan = off")
+        for statement, parameters in statements:
+            if not statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+                continue
+            table_scans, used = (_postgres_plan if postgres else _sqlite_plan)(cursor, statement, parameters)
+            scanned |= table_scans
+            indexes |= used
+    finally:
+        raw.rollback()
+        raw.close()
+    return scanned, indexes
+
+
+def test_my_orders_uses_customer_index(seeded):
+    user_id, _ = seeded
+
+    def my_orders():
+        with SessionLocal() as db:
+            asyncio.run(fetch_order_page(db, models.Order.user_id == user_id, limit=50))
+
+    scanned, indexes = explain(my_orders)
+    assert not scanned & ORDER_TABLES
+    assert "ix_orders_user_id_id" in indexes
+    assert "ix_order_items_order_id" in indexes
+
+
+@pytest.mark.parametrize("status, index", [(None, "ix_orders_created_at"), ("Shipped", "ix_orders_status_created_at")])
+def test_admin_order_list_reads_newest_first_off_an_index(seeded, status, index):
+    def admin_list():
+        with SessionLocal() as db:
+            asyncio.run(get_all_orders(skip=0, limit=50, order_status=status, db=db))
+
+    scanned, indexes = explain(admin_list)
+    assert not scanned & ORDER_TABLES
+    assert index in indexes
+
+
+def test_order_detail_does_not_scan(seeded):
+    _, order_id = seeded
+
+    def order_detail():
+        with SessionLocal() as db:
+            load_order(db, order_id)
+
+    scanned, _ = explain(order_detail)
+    assert not scanned & ORDER_TABLES
+
+
+def test_invoice_export_range_uses_created_at_index(seeded):
+    today = date.today()
+    scanned, indexes = explain(lambda: invoices._load_batch(None, today - timedelta(days=7), today, 0, 50))
+    assert not scanned & {"orders", "order_items", "products"}
+    assert "ix_orders_created_at" in indexes
+
+
+def test_job_claim_does_not_scan(seeded):
+    def job_claim():
+        with SessionLocal() as db:
+            jobs.claim(db, "query-plans", 10)
+
+    scanned, _ = explain(job_claim)
+    assert "jobs" not in scanned
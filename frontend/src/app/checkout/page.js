@@ -95,7 +95,7 @@ export default function Checkout() {
                     {cartItems.map((item) => (
                         <div key={item.product_id} className={styles.summaryItem}>
                             <span>{item.quantity} x {item.product.name}</span>
-                            <span>${((item.product.discount_price || 0) * item.quantity).toFixed(2)}</span>
+                            <span>${((item.product.effective_price ?? item.product.discount_price ?? 0) * item.quantity).toFixed(2)}</span>
                         </div>
                     ))}
                     <div className={styles.summaryItem}>
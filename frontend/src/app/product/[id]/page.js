@@ -144,7 +144,7 @@ export default function ProductDetail() {
 
             <div className="flex flex-col">
                 <h1 className={styles.title}>{product.name}</h1>
-                <div className={styles.priceTag}>${product.discount_price?.toFixed(2)}</div>
+                <div className={styles.priceTag}>${(product.effective_price ?? product.discount_price)?.toFixed(2)}</div>
 
                 <div className="mt-6">
                     <h3 className="text-lg font-semibold mb-2">Description</h3>
@@ -111,7 +111,7 @@ export default function ProductCard({ product }) {
                         )}
                     </div>
                     <div className={styles.priceContainer}>
-                        <p className={styles.price} style={{ color: '#1A1A1A' }}>${product.discount_price?.toFixed(2)}</p>
+                        <p className={styles.price} style={{ color: '#1A1A1A' }}>${(product.effective_price ?? product.discount_price)?.toFixed(2)}</p>
                         {product.discount_percentage > 0 && (
                             <p className={styles.mrp} style={{ color: '#A89ACD' }}>${product.mrp?.toFixed(2)}</p>
                         )}
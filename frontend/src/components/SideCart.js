@@ -26,7 +26,7 @@ export default function SideCart() {
                                 <div className={styles.itemImage} style={{ backgroundImage: `url(${item.product.photos && item.product.photos.length > 0 ? item.product.photos[0] : 'https://images.unsplash.com/photo-1523381210434-271e8be1f52b?auto=format&fit=crop&q=80&w=800'})` }}></div>
                                 <div className={styles.itemDetails}>
                                     <h4>{item.product.name}</h4>
-                                    <p className={styles.price}>${(item.product.discount_price || 0).toFixed(2)}</p>
+                                    <p className={styles.price}>${(item.product.effective_price ?? item.product.discount_price ?? 0).toFixed(2)}</p>
                                     <div className={styles.qtyControl}>
                                         <button onClick={() => updateQuantity(item.product_id, item.quantity - 1)}>-</button>
                                         <span>{item.quantity}</span>
@@ -80,7 +80,7 @@ export function CartProvider({ children }) {
     const toggleCart = () => setIsCartOpen(!isCartOpen);
     const closeCart = () => setIsCartOpen(false);
 
-    const cartTotal = cartItems.reduce((total, item) => total + ((item.product.discount_price || 0) * item.quantity), 0);
+    const cartTotal = cartItems.reduce((total, item) => total + ((item.product.effective_price ?? item.product.discount_price ?? 0) * item.quantity), 0);
 
     return (
         <CartContext.Provider value={{